@@ -0,0 +1,73 @@
+"""
+  Per-run cache of the metadata of the copied tables (existence, engine, row estimate, primary
+  key, triggers and foreign keys, create statement), prefetched for all tables with a couple of
+  information_schema queries per host (see MySQLHost.prefetch_catalog) instead of a round trip per
+  table per check. The cache is a module global filled in before the workers are forked, so every
+  worker starts from it. Entries are invalidated after DDL the tool issues itself (see
+  MySQLHost), changes made to the tables by others during the run are not seen.
+"""
+import multiprocessing
+
+logger = multiprocessing.get_logger()
+
+class TableCatalog(object):
+    """
+        Metadata of tables per host and database, as dicts of field name to value. Tables that were
+        not prefetched, or were invalidated since, have no entry and are looked up live.
+    """
+    def __init__(self):
+        self.entries = dict()
+
+    def store(self, host, database, table, metadata):
+        """
+            Stores the metadata of a table, replacing its previous entry.
+        """
+        self.entries[(host, database, table.lower())] = metadata
+
+    def lookup(self, host, database, table, field):
+        """
+            Looks up a field of the cached metadata of a table.
+
+            Keyword arguments:
+                host -- the host the table is on
+                database -- the database the table is in
+                table -- name of the table
+                field -- name of the field to look up
+
+            returns -- a (found, value) tuple, found is False if the field is not cached
+        """
+        entry = self.entries.get((host, database, table.lower()))
+        if entry is None or field not in entry:
+            return (False, None)
+        return (True, entry[field])
+
+    def update(self, host, database, table, field, value):
+        """
+            Caches one more field of a table that has an entry, tables without an entry are left
+            uncached.
+        """
+        entry = self.entries.get((host, database, table.lower()))
+        if entry is not None:
+            entry[field] = value
+
+    def invalidate(self, host, database, table, fields=None):
+        """
+            Forgets the cached metadata of a table.
+
+            Keyword arguments:
+                host -- the host the table is on
+                database -- the database the table is in
+                table -- name of the table
+                fields -- list of the fields to forget (defaults to None, the whole entry)
+        """
+        key = (host, database, table.lower())
+        if fields is None:
+            self.entries.pop(key, None)
+        elif key in self.entries:
+            for field in fields:
+                self.entries[key].pop(field, None)
+
+    def clear(self):
+        self.entries.clear()
+
+catalog = TableCatalog()
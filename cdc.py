@@ -0,0 +1,285 @@
+"""
+  Continuous change capture: tails the row based binary log of the source and applies the
+  inserts, updates and deletes of the copied tables to the target in batches. Needs the
+  python-mysql-replication package (pymysqlreplication) and binlog_format=ROW on the source.
+"""
+import time
+import multiprocessing
+import jsonstore
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    OrderedDict = dict
+
+try:
+    from pymysqlreplication import BinLogStreamReader
+    from pymysqlreplication.row_event import WriteRowsEvent, UpdateRowsEvent, DeleteRowsEvent
+    from pymysqlreplication.event import XidEvent, QueryEvent, HeartbeatLogEvent
+except ImportError:
+    BinLogStreamReader = None
+
+logger = multiprocessing.get_logger()
+
+def load_position(filename):
+    """
+        Loads the binary log position changes were applied up to, saved by save_position.
+
+        Keyword arguments:
+            filename -- path of the position file
+
+        returns -- a (log file, log position) tuple, None if there is no (readable) position file
+    """
+    stored = jsonstore.load(filename, 'change capture position file')
+    if stored is None:
+        return None
+    try:
+        return (str(stored['log_file']), int(stored['log_pos']))
+    except (TypeError, ValueError, KeyError):
+        logger.warn("Ignoring unreadable change capture position file %s" % filename)
+        return None
+
+def save_position(filename, position, metrics=None):
+    """
+        Saves the binary log position changes were applied up to, along with the latest metrics, so
+        that the change capture can resume from it after a restart. The file is replaced atomically.
+
+        Keyword arguments:
+            filename -- path of the position file
+            position -- a (log file, log position) tuple
+            metrics -- ChangeMetrics to store with the position (defaults to None)
+    """
+    stored = { 'log_file' : position[0], 'log_pos' : position[1] }
+    if metrics is not None:
+        stored['metrics'] = metrics.as_dict()
+
+    jsonstore.save(filename, stored)
+
+class ChangeMetrics(object):
+    """
+        Replication lag (seconds between an event being written to the binary log of the source and
+        being applied to the target) and apply throughput of a change capture.
+    """
+    def __init__(self):
+        self.applied_rows = 0
+        self.batches = 0
+        self.lag_seconds = None
+        self.rows_per_second = 0.0
+        self.apply_seconds = 0.0
+
+    def record(self, rows, elapsed, timestamp):
+        """
+            Records an applied batch.
+
+            Keyword arguments:
+                rows -- the number of rows changed by the batch
+                elapsed -- the seconds it took to apply the batch
+                timestamp -- the binary log timestamp of the last event of the batch
+        """
+        self.applied_rows += rows
+        self.batches += 1
+        self.apply_seconds += elapsed
+        self.rows_per_second = rows / elapsed if elapsed > 0 else 0.0
+        if timestamp is not None:
+            self.lag_seconds = max(0, time.time() - timestamp)
+
+    def as_dict(self):
+        return { 'applied_rows' : self.applied_rows,
+                 'batches' : self.batches,
+                 'lag_seconds' : self.lag_seconds,
+                 'rows_per_second' : self.rows_per_second,
+                 'average_rows_per_second' : self.applied_rows / self.apply_seconds if self.apply_seconds > 0 else 0.0 }
+
+class ChangeBatch(object):
+    """
+        The changes of a batch of binary log events, coalesced per table and primary key so that
+        only the last change of each row is applied. Position is the binary log position just after
+        the last transaction the batch holds all of (see ends_transaction), None if it holds none.
+    """
+    def __init__(self):
+        self.tables = dict()
+        self.rows = 0
+        self.position = None
+        self.timestamp = None
+
+    def upsert(self, table, key, values):
+        self.__changes(table)[key] = values
+        self.rows += 1
+
+    def delete(self, table, key):
+        self.__changes(table)[key] = None
+        self.rows += 1
+
+    def __changes(self, table):
+        if table not in self.tables:
+            self.tables[table] = OrderedDict()
+        return self.tables[table]
+
+    def __len__(self):
+        return self.rows
+
+class ChangeApplier(object):
+    """
+        Applies ChangeBatches to the target: upserts with replace into and deletes by primary key,
+        in a single transaction per batch. Applying a batch twice is harmless, so a batch applied
+        just before a crash (and before its position was saved) is simply applied again.
+    """
+    def __init__(self, dest_host):
+        self.dest_host = dest_host
+        self.key_columns = dict()
+
+    def key_of(self, table, values):
+        """
+            returns -- the primary key tuple of a row of the table given as a dict of column values
+        """
+        if table not in self.key_columns:
+            self.key_columns[table] = self.dest_host.get_primary_key_columns(table)
+            if len(self.key_columns[table]) == 0:
+                raise ValueError("Table %s has no primary key, its changes can not be applied" % table)
+        return tuple(values[column] for column in self.key_columns[table])
+
+    def add_event(self, batch, event):
+        """
+            Adds the rows of a row event of the binary log to a batch, other events (such as the
+        BEGIN query event of a transaction) are ignored.
+        """
+        kind = event.__class__.__name__
+        if kind not in ('WriteRowsEvent', 'UpdateRowsEvent', 'DeleteRowsEvent'):
+            return
+        for row in event.rows:
+            if kind == 'DeleteRowsEvent':
+                batch.delete(event.table, self.key_of(event.table, row['values']))
+            elif kind == 'UpdateRowsEvent':
+                before_key = self.key_of(event.table, row['before_values'])
+                after_key = self.key_of(event.table, row['after_values'])
+                if before_key != after_key:
+                    batch.delete(event.table, before_key)
+                batch.upsert(event.table, after_key, row['after_values'])
+            elif kind == 'WriteRowsEvent':
+                batch.upsert(event.table, self.key_of(event.table, row['values']), row['values'])
+        batch.timestamp = event.timestamp
+
+    def apply(self, batch):
+        """
+            Applies a batch of changes to the target and commits them.
+
+            returns -- the number of rows changed
+        """
+        for table, changes in batch.tables.items():
+            deleted_keys = [key for key, values in changes.items() if values is None]
+            upserted_rows = [values for values in changes.values() if values is not None]
+            if deleted_keys:
+                self.dest_host.delete_keys(table, self.key_columns[table], deleted_keys, commit=False)
+            if upserted_rows:
+                self.dest_host.replace_rows(table, upserted_rows, commit=False)
+        self.dest_host.commit()
+        return sum(len(changes) for changes in batch.tables.values())
+
+def ends_transaction(event):
+    """
+        returns -- True if a binary log event ends a transaction: an XID event, or the COMMIT 
+                   query event ending the statements of a non transactional table
+    """
+    kind = event.__class__.__name__
+    return kind == 'XidEvent' or (kind == 'QueryEvent' and event.query.strip().upper() == 'COMMIT')
+
+def is_heartbeat(event):
+    """
+        returns -- True if a binary log event is a heartbeat, sent by the source while it has no
+                   events to send (see open_binlog_stream)
+    """
+    return event.__class__.__name__ == 'HeartbeatLogEvent'
+
+def open_binlog_stream(connection_settings, server_id, database, tables, position, blocking=True, heartbeat_seconds=None):
+    """
+        Opens a stream of the row events of the specified tables in the binary log of the source,
+        along with the events ending transactions (see ends_transaction) and heartbeats.
+
+        Keyword arguments:
+            connection_settings -- a dict with the host, port, user and passwd of the source
+            server_id -- a replication server id unique among the replicas of the source
+            database -- the source database
+            tables -- list of the names of the tables to capture
+            position -- a (log file, log position) tuple to start from
+            blocking -- wait for new events at the end of the binary log (defaults to True), if
+                        False the stream ends once it is caught up
+            heartbeat_seconds -- the seconds after which the source sends a heartbeat when it has
+                                 no events to send, so a waiting batch is applied (defaults to 
+                                 None, the server default)
+
+        returns -- a pymysqlreplication BinLogStreamReader
+    """
+    if BinLogStreamReader is None:
+        raise ImportError("Change capture needs the python-mysql-replication package")
+    return BinLogStreamReader(connection_settings=connection_settings,
+                              server_id=server_id,
+                              only_schemas=[database],
+                              only_tables=list(tables),
+                              only_events=[WriteRowsEvent, UpdateRowsEvent, DeleteRowsEvent, XidEvent, QueryEvent, \
+                                           HeartbeatLogEvent],
+                              log_file=position[0],
+                              log_pos=position[1],
+                              resume_stream=True,
+                              blocking=blocking,
+                              slave_heartbeat=heartbeat_seconds)
+
+def apply_changes(stream, applier, position_file, batch_rows=1000, batch_seconds=1.0, metrics=None):
+    """
+        Applies the events of a binary log stream to the target in batches of about batch_rows
+        rows or batch_seconds seconds of events. Batches end with transactions (see 
+        ends_transaction), a single transaction can make a larger batch. The position after each
+        applied batch is saved in the position file along with the metrics, and the metrics are 
+        logged. A position within a transaction is never saved: resuming from it would skip the
+        table map events of its remaining row events, so their rows would be lost. The age of a
+        batch is checked on heartbeats too, so the last transactions before a quiet period are
+        applied within about batch_seconds. Rows of an incomplete transaction at the end of the
+        stream are applied but the position of the last complete one is saved, the upserts of the
+        transaction are replayed on resume.
+
+        Keyword arguments:
+            stream -- an iterable of row events with log_file and log_pos attributes, see
+                      open_binlog_stream
+            applier -- ChangeApplier for the target
+            position_file -- path of the file to save the position to (see save_position)
+            batch_rows -- the maximum number of rows in a batch (defaults to 1,000)
+            batch_seconds -- the maximum number of seconds a batch is collected for (defaults to 1)
+            metrics -- ChangeMetrics to record the batches in (defaults to a new one)
+
+        returns -- the ChangeMetrics
+    """
+    metrics = metrics or ChangeMetrics()
+    batch = ChangeBatch()
+    batch_started = time.time()
+    in_transaction = False
+    for event in stream:
+        if is_heartbeat(event):
+            # nothing to apply unless a transaction ended since the last batch
+            if in_transaction or (len(batch) == 0 and batch.position is None):
+                continue
+        elif not ends_transaction(event):
+            applier.add_event(batch, event)
+            in_transaction = True
+            continue
+        else:
+            batch.position = (stream.log_file, stream.log_pos)
+            in_transaction = False
+        if len(batch) >= batch_rows or time.time() - batch_started >= batch_seconds:
+            apply_batch(batch, applier, position_file, metrics)
+            batch = ChangeBatch()
+            batch_started = time.time()
+    if len(batch) > 0 or batch.position is not None:
+        apply_batch(batch, applier, position_file, metrics)
+    return metrics
+
+def apply_batch(batch, applier, position_file, metrics):
+    """
+        Applies a single batch (see apply_changes), saves its position and records its metrics.
+    """
+    start = time.time()
+    rows = applier.apply(batch)
+    metrics.record(rows, time.time() - start, batch.timestamp)
+    if batch.position is not None:
+        save_position(position_file, batch.position, metrics)
+    logger.info("Applied %d changed rows up to %s (lag %s seconds, %.0f rows/s)" % \
+                (rows, "%s:%d" % batch.position if batch.position is not None else "an incomplete transaction", \
+                 "%.1f" % metrics.lag_seconds if metrics.lag_seconds is not None else "unknown", metrics.rows_per_second))
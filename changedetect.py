@@ -0,0 +1,127 @@
+"""
+  Cheap detection of tables that did not change since their last copy, from fingerprints of
+  their information_schema metadata stored after every run.
+"""
+import multiprocessing
+import jsonstore
+
+logger = multiprocessing.get_logger()
+
+# the metadata making up a fingerprint, see MySQLHost.get_table_fingerprints. taken_at is the
+# time of the server when the fingerprint was taken, it is not compared
+FINGERPRINT_FIELDS = ('create_time', 'update_time', 'data_length', 'index_length', 'auto_increment')
+
+def load_fingerprints(filename, prefix):
+    """
+        Loads the fingerprints stored by save_fingerprints.
+
+        Keyword arguments:
+            filename -- path of the fingerprint file
+            prefix -- the prefix the tables of interest are stored under (see save_fingerprints)
+
+        returns -- a dict of table name to a dict with the source and target fingerprints, empty if
+                   there is no (readable) fingerprint file
+    """
+    return jsonstore.load_prefixed(filename, prefix, 'fingerprint file')
+
+def save_fingerprints(filename, prefix, fingerprints):
+    """
+        Stores the fingerprints of the tables copied (or found unchanged) by this run, keeping the
+        fingerprints stored for other tables (and other prefixes). The file is replaced atomically.
+
+        Keyword arguments:
+            filename -- path of the fingerprint file
+            prefix -- a prefix to store the tables under, identifying the source and target
+            fingerprints -- a dict of table name to a dict with the source and target fingerprints
+    """
+    if not filename or len(fingerprints) == 0:
+        return
+    jsonstore.save_prefixed(filename, prefix, fingerprints, 'fingerprint file')
+
+def normalize(fingerprint):
+    """
+        Turns the metadata of a table into a fingerprint that can be stored as JSON and compared
+        with a stored one.
+
+        Keyword arguments:
+            fingerprint -- a dict of the FINGERPRINT_FIELDS, or None
+
+        returns -- a dict of field name to string (or None), or None
+    """
+    if fingerprint is None:
+        return None
+    return dict((field, None if fingerprint.get(field) is None else str(fingerprint[field])) \
+                for field in FINGERPRINT_FIELDS + ('taken_at',))
+
+def same_fingerprint(first, second):
+    """
+        returns -- True if the two fingerprints (see normalize) have the same metadata
+    """
+    if first is None or second is None:
+        return False
+    return all(first.get(field) == second.get(field) for field in FINGERPRINT_FIELDS)
+
+def has_reliable_update_time(fingerprint):
+    """
+        Update times only have a resolution of a second: a table updated in the same second as its
+        fingerprint was taken may be updated again within that second without its update time 
+        changing.
+
+        returns -- True if the fingerprint has an update time from before the second it was taken in
+    """
+    update_time = fingerprint.get('update_time')
+    taken_at = fingerprint.get('taken_at')
+    return update_time is not None and taken_at is not None and update_time < taken_at
+
+def compare_metadata(stored, source, target):
+    """
+        First tier of change detection: compares the current fingerprints of the source and target
+        tables with the ones stored after the last copy.
+
+        Keyword arguments:
+            stored -- the stored dict with the source and target fingerprints, or None
+            source -- the current fingerprint of the source table (see normalize)
+            target -- the current fingerprint of the target table (see normalize)
+
+        returns -- False if either table changed since the last copy, True if neither did and both
+                   keep an update time, reliable on the source which is written to while its
+                   fingerprint is taken (so an unchanged fingerprint means unchanged rows),
+                   None if the metadata can not tell (no stored fingerprint, or no update time as
+                   with InnoDB before MySQL 5.7)
+    """
+    if stored is None or source is None or target is None:
+        return None
+    if not same_fingerprint(stored.get('source'), source) or not same_fingerprint(stored.get('target'), target):
+        return False
+    if not has_reliable_update_time(stored['source']) or stored['target'].get('update_time') is None:
+        return None
+    return True
+
+def source_unchanged_since(planned, current):
+    """
+        Tells whether the rows of a source table may have changed since a fingerprint was taken,
+        as when a checkpointed copy is resumed: the chunks loaded by the failed run hold the rows
+        of that time.
+
+        Keyword arguments:
+            planned -- the fingerprint of the source table taken earlier (see normalize), or None
+            current -- the current fingerprint of the source table (see normalize), or None
+
+        returns -- True only if the fingerprints have the same metadata and the earlier one has a
+                   reliable update time (see has_reliable_update_time)
+    """
+    if not same_fingerprint(planned, current):
+        return False
+    return has_reliable_update_time(planned)
+
+def compare_checksums(source_checksum, target_checksum):
+    """
+        Second tier of change detection: compares the live checksums of the source and target
+        tables (see MySQLHost.get_quick_checksum).
+
+        returns -- True if the checksums are equal, False if they differ, None if either table keeps
+                   no live checksum
+    """
+    if source_checksum is None or target_checksum is None:
+        return None
+    return source_checksum == target_checksum
@@ -0,0 +1,187 @@
+"""
+  Checkpoint manifest of chunked full copies: the plan of each chunked copy in progress, the
+  chunks already loaded and the dumps already transferred but not loaded yet, with the checksums
+  of their dump files. A run restarted with --resume picks a failed copy up from it instead of
+  starting the table over. The manifest is shared by the worker processes, every change is made
+  under an exclusive lock of the manifest and written atomically.
+"""
+import os
+import fcntl
+import hashlib
+import time
+import multiprocessing
+import jsonstore
+
+logger = multiprocessing.get_logger()
+
+def file_checksum(filename):
+    """
+        returns -- the hex SHA-1 digest of the contents of a file
+    """
+    digest = hashlib.sha1()
+    f = open(filename, 'rb')
+    try:
+        block = f.read(1048576)
+        while block:
+            digest.update(block)
+            block = f.read(1048576)
+    finally:
+        f.close()
+    return digest.hexdigest()
+
+def structure_checksum(structure):
+    """
+        returns -- the hex SHA-1 digest of a table structure, see MySQLHost.get_table_structure
+    """
+    return hashlib.sha1(structure).hexdigest()
+
+class CheckpointManifest(object):
+    """
+        The checkpoints of the tables copied between a source and a target, stored in a JSON file
+        under a prefix identifying them. The checkpoint of a table is a dict of:
+
+          plan -- the plan of the chunked copy: the primary key column, the chunk bounds, the
+                  shadow table name and keys or the deferred secondary keys, and the checksum of
+                  the source table structure
+          chunks -- the chunks loaded, by index, with their rows, dump checksum and time
+          staged -- the dumps transferred but not loaded yet, by chunk index, with their local
+                    file name and checksum
+    """
+    def __init__(self, filename, prefix):
+        self.filename = filename
+        self.prefix = prefix
+
+    def load(self):
+        """
+            returns -- the stored checkpoints of all prefixes, empty if there is no (readable)
+                       manifest
+        """
+        stored = jsonstore.load(self.filename, 'checkpoint manifest')
+        return stored if isinstance(stored, dict) else dict()
+
+    def update(self, table, change):
+        """
+            Changes the checkpoint of a table under the lock of the manifest.
+
+            Keyword arguments:
+                table -- name of the table
+                change -- a function of the checkpoint of the table (None if there is none)
+                          returning its new checkpoint (None to remove it)
+        """
+        def change_stored(stored):
+            checkpoint = change(stored.get(self.prefix + table))
+            if checkpoint is None:
+                stored.pop(self.prefix + table, None)
+            else:
+                stored[self.prefix + table] = checkpoint
+        self.__update(change_stored)
+
+    def __update(self, change_stored):
+        """
+            Applies a change to the stored checkpoints of all prefixes under the lock of the 
+            manifest, and writes them to a temporary file renamed over the manifest.
+        """
+        lock = open("%s.lock" % self.filename, 'a')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            stored = self.load()
+            change_stored(stored)
+            jsonstore.save(self.filename, stored)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+            lock.close()
+
+    def get_table(self, table):
+        """
+            returns -- the checkpoint of a table, None if there is none
+        """
+        return self.load().get(self.prefix + table)
+
+    def start_table(self, table, plan):
+        """
+            Starts the checkpoint of a chunked copy of a table, replacing any previous one.
+        """
+        self.update(table, lambda checkpoint: { 'plan' : plan, 'chunks' : dict(), 'staged' : dict() })
+
+    def clear_table(self, table):
+        """
+            Removes the checkpoint of a table, once it is copied or is to be copied from scratch.
+        """
+        self.update(table, lambda checkpoint: None)
+
+    def clear_tables(self, tables):
+        """
+            Removes the checkpoints of several tables at once.
+        """
+        def change_stored(stored):
+            for table in tables:
+                stored.pop(self.prefix + table, None)
+        self.__update(change_stored)
+
+    def is_resumable(self, table):
+        """
+            returns -- True if a checkpoint of the table records loaded or transferred chunks
+        """
+        checkpoint = self.get_table(table)
+        return checkpoint is not None and (len(checkpoint['chunks']) > 0 or len(checkpoint['staged']) > 0)
+
+    def stage_chunk(self, table, index, filename, checksum):
+        """
+            Records the dump of a chunk transferred to the local file name.
+        """
+        def change(checkpoint):
+            if checkpoint is not None:
+                checkpoint['staged'][str(index)] = { 'filename' : filename, 'checksum' : checksum }
+            return checkpoint
+        self.update(table, change)
+
+    def complete_chunk(self, table, index, rows, checksum):
+        """
+            Records a chunk loaded into the destination table.
+        """
+        def change(checkpoint):
+            if checkpoint is not None:
+                checkpoint['staged'].pop(str(index), None)
+                checkpoint['chunks'][str(index)] = { 'rows' : rows, 'checksum' : checksum, 'completed_at' : time.time() }
+            return checkpoint
+        self.update(table, change)
+
+class ChunkCheckpoint(object):
+    """
+        The checkpoint of a single chunk, handed to the copy of the chunk (see pydbcopy.copy_rows).
+    """
+    def __init__(self, manifest, table, index):
+        self.manifest = manifest
+        self.table = table
+        self.index = index
+        self.checksum = None
+
+    def staged_file(self):
+        """
+            Finds the dump of the chunk transferred by a previous run, if it is still there and
+            unchanged.
+
+            returns -- the local file name of the dump, None if there is no valid dump
+        """
+        checkpoint = self.manifest.get_table(self.table)
+        if checkpoint is None or str(self.index) not in checkpoint['staged']:
+            return None
+        staged = checkpoint['staged'][str(self.index)]
+        if not os.path.isfile(staged['filename']) or file_checksum(staged['filename']) != staged['checksum']:
+            logger.info("Staged dump %s of chunk %d of %s is gone or changed" % (staged['filename'], self.index + 1, self.table))
+            return None
+        self.checksum = staged['checksum']
+        return staged['filename']
+
+    def stage(self, filename):
+        """
+            Records the dump of the chunk as transferred.
+        """
+        self.checksum = file_checksum(filename)
+        self.manifest.stage_chunk(self.table, self.index, filename, self.checksum)
+
+    def complete(self, rows):
+        """
+            Records the chunk as loaded.
+        """
+        self.manifest.complete_chunk(self.table, self.index, rows, self.checksum)
@@ -37,6 +37,117 @@ class Settings:
         
         self.debug = False
         
+        # split full copies of large tables into this many primary key ranges (0 or 1 = off)
+        self.chunks = 0
+        self.chunk_min_rows = 1000000
+        
+        # 'outfile' = select into outfile + scp + load data infile, 'stream' = no dump files
+        self.copy_method = 'outfile'
+        self.stream_batch_rows = 10000
+        
+        # pipelined copy: threads per stage and seconds between queue depth reports
+        self.pipeline = False
+        self.export_workers = 2
+        self.transfer_workers = 2
+        self.load_workers = 2
+        self.pipeline_report_interval = 60
+        
+        # copy the longest tables first, by size and by the durations kept in history_file
+        # (defaults to pydbcopy_history.json in the dump dir)
+        self.schedule_longest_first = True
+        self.history_file = ''
+        
+        # how incremental copies diff the fieldHash columns, see hashdiff.diff_methods
+        self.diff_method = 'set'
+        
+        # how incremental copies delete rows, see dbutils.delete_strategies
+        self.delete_strategy = 'auto'
+        
+        # load full copies into a shadow table and swap it in with rename table
+        self.shadow_load = False
+        
+        # bulk load profile: session variables set around target loads, deferred secondary keys
+        # for full loads and exports in primary key order
+        self.bulk_load = False
+        self.bulk_load_skip_binlog = False
+        self.bulk_load_defer_keys = False
+        self.export_ordered = False
+        
+        # watermark incremental copies of tables without a fieldHash column, reconcile deletes
+        # on every run rather than only when the target has more rows than the source
+        self.watermark_copy = False
+        self.reconcile = False
+        
+        # change capture from the binary log of the source: position file (defaults to 
+        # pydbcopy_cdc_position.json in the dump dir), replication server id, batch size and 
+        # whether to keep waiting for new events once caught up
+        self.cdc = False
+        self.cdc_position_file = ''
+        self.cdc_server_id = 8193
+        self.cdc_batch_rows = 1000
+        self.cdc_batch_seconds = 1
+        self.cdc_blocking = True
+        
+        # detect unchanged tables from metadata fingerprints kept in fingerprint_file (defaults
+        # to pydbcopy_fingerprints.json in the dump dir) and live checksums
+        self.change_detection = True
+        self.fingerprint_file = ''
+        
+        # prefetch the metadata of all tables at startup instead of querying it per table and check
+        self.catalog_cache = True
+        
+        # idle connections to each host kept open per process and reused across tables
+        self.connection_pool_size = 2
+        
+        # how rows are counted (exact, estimate, parallel or auto, see counts), the relative error
+        # assumed for InnoDB estimates, the estimated rows from which tables are counted in
+        # parallel rather than exactly, and the number of parallel counts
+        self.count_strategy = 'auto'
+        self.count_error_bound = 0.5
+        self.count_min_rows = 1000000
+        self.count_workers = 4
+        
+        # how dump files are transferred from a remote source (auto, ssh or stream, see transport),
+        # the parallel streams and compressor (zstd or lz4) of the stream transport, and the ssh 
+        # cipher (empty for the ssh default)
+        self.transfer_method = 'auto'
+        self.transfer_streams = 4
+        self.transfer_compression = 'zstd'
+        self.transfer_ssh_cipher = ''
+        
+        # keep the dumps of full copies in delta_spool_dir (defaults to spool in the dump dir) and
+        # transfer only the differences of the next dumps with them (see delta)
+        self.delta_transfer = False
+        self.delta_spool_dir = ''
+        
+        # checkpoint chunked full copies in checkpoint_file (defaults to pydbcopy_checkpoint.json in
+        # the dump dir, see checkpoint) and resume the ones left unfinished by a failed run
+        self.resume = False
+        self.checkpoint_file = ''
+        
+        # keep gzipped dumps of full copies in dump_spool_dir (defaults to dumps in the dump dir), 
+        # within dump_spool_budget_mb, and load tables unchanged since from them (see spool)
+        self.dump_spool = False
+        self.dump_spool_dir = ''
+        self.dump_spool_budget_mb = 10240
+        
+        # fan-out copy: copy to every one of these host/database targets instead of to the target
+        # host, exporting each table once (see fanout). The targets share the target user and 
+        # password, a target without a database gets the target database
+        self.targets = []
+        
+        # verify every table up front on verify_workers threads of the main process, before the
+        # tables to copy are handed to the worker processes
+        self.concurrent_verify = False
+        self.verify_workers = 16
+        
+        # write the metrics of every table (see metrics) to metrics_file as JSON lines, to the 
+        # Prometheus textfile metrics_prometheus_file and to the StatsD server at metrics_statsd
+        # (host:port), each left out if empty
+        self.metrics_file = ''
+        self.metrics_prometheus_file = ''
+        self.metrics_statsd = ''
+        
     def read_properties(self, propFileLoc):
         propFile= file( propFileLoc, "rU" )
         propDict= dict()
@@ -111,4 +222,174 @@ class Settings:
         if propDict.has_key('pydbcopy_debug'):
             self.debug = propDict['pydbcopy_debug']
 
+        if propDict.has_key('pydbcopy_chunks'):
+            if propDict['pydbcopy_chunks'] is not None and propDict['pydbcopy_chunks'] != '':
+                self.chunks = int(propDict['pydbcopy_chunks'])
+
+        if propDict.has_key('pydbcopy_chunk_min_rows'):
+            if propDict['pydbcopy_chunk_min_rows'] is not None and propDict['pydbcopy_chunk_min_rows'] != '':
+                self.chunk_min_rows = int(propDict['pydbcopy_chunk_min_rows'])
+
+        if propDict.has_key('pydbcopy_copy_method'):
+            self.copy_method = propDict['pydbcopy_copy_method'].lower()
+
+        if propDict.has_key('pydbcopy_stream_batch_rows'):
+            if propDict['pydbcopy_stream_batch_rows'] is not None and propDict['pydbcopy_stream_batch_rows'] != '':
+                self.stream_batch_rows = int(propDict['pydbcopy_stream_batch_rows'])
+
+        if propDict.has_key('pydbcopy_pipeline'):
+            self.pipeline = propDict['pydbcopy_pipeline'].lower() == 'true'
+
+        if propDict.has_key('pydbcopy_export_workers'):
+            if propDict['pydbcopy_export_workers'] is not None and propDict['pydbcopy_export_workers'] != '':
+                self.export_workers = int(propDict['pydbcopy_export_workers'])
+
+        if propDict.has_key('pydbcopy_transfer_workers'):
+            if propDict['pydbcopy_transfer_workers'] is not None and propDict['pydbcopy_transfer_workers'] != '':
+                self.transfer_workers = int(propDict['pydbcopy_transfer_workers'])
+
+        if propDict.has_key('pydbcopy_load_workers'):
+            if propDict['pydbcopy_load_workers'] is not None and propDict['pydbcopy_load_workers'] != '':
+                self.load_workers = int(propDict['pydbcopy_load_workers'])
+
+        if propDict.has_key('pydbcopy_pipeline_report_interval'):
+            if propDict['pydbcopy_pipeline_report_interval'] is not None and propDict['pydbcopy_pipeline_report_interval'] != '':
+                self.pipeline_report_interval = int(propDict['pydbcopy_pipeline_report_interval'])
+
+        if propDict.has_key('pydbcopy_schedule_longest_first'):
+            self.schedule_longest_first = propDict['pydbcopy_schedule_longest_first'].lower() == 'true'
+
+        if propDict.has_key('pydbcopy_history_file'):
+            self.history_file = propDict['pydbcopy_history_file']
+
+        if propDict.has_key('pydbcopy_diff_method'):
+            self.diff_method = propDict['pydbcopy_diff_method'].lower()
+
+        if propDict.has_key('pydbcopy_delete_strategy'):
+            self.delete_strategy = propDict['pydbcopy_delete_strategy'].lower()
+
+        if propDict.has_key('pydbcopy_shadow_load'):
+            self.shadow_load = propDict['pydbcopy_shadow_load'].lower() == 'true'
+
+        if propDict.has_key('pydbcopy_bulk_load'):
+            self.bulk_load = propDict['pydbcopy_bulk_load'].lower() == 'true'
+
+        if propDict.has_key('pydbcopy_bulk_load_skip_binlog'):
+            self.bulk_load_skip_binlog = propDict['pydbcopy_bulk_load_skip_binlog'].lower() == 'true'
+
+        if propDict.has_key('pydbcopy_bulk_load_defer_keys'):
+            self.bulk_load_defer_keys = propDict['pydbcopy_bulk_load_defer_keys'].lower() == 'true'
+
+        if propDict.has_key('pydbcopy_export_ordered'):
+            self.export_ordered = propDict['pydbcopy_export_ordered'].lower() == 'true'
+
+        if propDict.has_key('pydbcopy_watermark_copy'):
+            self.watermark_copy = propDict['pydbcopy_watermark_copy'].lower() == 'true'
+
+        if propDict.has_key('pydbcopy_reconcile'):
+            self.reconcile = propDict['pydbcopy_reconcile'].lower() == 'true'
+
+        if propDict.has_key('pydbcopy_cdc'):
+            self.cdc = propDict['pydbcopy_cdc'].lower() == 'true'
+
+        if propDict.has_key('pydbcopy_cdc_position_file'):
+            self.cdc_position_file = propDict['pydbcopy_cdc_position_file']
+
+        if propDict.has_key('pydbcopy_cdc_server_id'):
+            if propDict['pydbcopy_cdc_server_id'] is not None and propDict['pydbcopy_cdc_server_id'] != '':
+                self.cdc_server_id = int(propDict['pydbcopy_cdc_server_id'])
+
+        if propDict.has_key('pydbcopy_cdc_batch_rows'):
+            if propDict['pydbcopy_cdc_batch_rows'] is not None and propDict['pydbcopy_cdc_batch_rows'] != '':
+                self.cdc_batch_rows = int(propDict['pydbcopy_cdc_batch_rows'])
+
+        if propDict.has_key('pydbcopy_cdc_batch_seconds'):
+            if propDict['pydbcopy_cdc_batch_seconds'] is not None and propDict['pydbcopy_cdc_batch_seconds'] != '':
+                self.cdc_batch_seconds = int(propDict['pydbcopy_cdc_batch_seconds'])
+
+        if propDict.has_key('pydbcopy_cdc_blocking'):
+            self.cdc_blocking = propDict['pydbcopy_cdc_blocking'].lower() == 'true'
+
+        if propDict.has_key('pydbcopy_change_detection'):
+            self.change_detection = propDict['pydbcopy_change_detection'].lower() == 'true'
+
+        if propDict.has_key('pydbcopy_fingerprint_file'):
+            self.fingerprint_file = propDict['pydbcopy_fingerprint_file']
+
+        if propDict.has_key('pydbcopy_catalog_cache'):
+            self.catalog_cache = propDict['pydbcopy_catalog_cache'].lower() == 'true'
+
+        if propDict.has_key('pydbcopy_connection_pool_size'):
+            if propDict['pydbcopy_connection_pool_size'] is not None and propDict['pydbcopy_connection_pool_size'] != '':
+                self.connection_pool_size = int(propDict['pydbcopy_connection_pool_size'])
+
+        if propDict.has_key('pydbcopy_count_strategy'):
+            self.count_strategy = propDict['pydbcopy_count_strategy']
+
+        if propDict.has_key('pydbcopy_count_error_bound'):
+            if propDict['pydbcopy_count_error_bound'] is not None and propDict['pydbcopy_count_error_bound'] != '':
+                self.count_error_bound = float(propDict['pydbcopy_count_error_bound'])
+
+        if propDict.has_key('pydbcopy_count_min_rows'):
+            if propDict['pydbcopy_count_min_rows'] is not None and propDict['pydbcopy_count_min_rows'] != '':
+                self.count_min_rows = int(propDict['pydbcopy_count_min_rows'])
+
+        if propDict.has_key('pydbcopy_count_workers'):
+            if propDict['pydbcopy_count_workers'] is not None and propDict['pydbcopy_count_workers'] != '':
+                self.count_workers = int(propDict['pydbcopy_count_workers'])
+
+        if propDict.has_key('pydbcopy_transfer_method'):
+            self.transfer_method = propDict['pydbcopy_transfer_method']
+
+        if propDict.has_key('pydbcopy_transfer_streams'):
+            if propDict['pydbcopy_transfer_streams'] is not None and propDict['pydbcopy_transfer_streams'] != '':
+                self.transfer_streams = int(propDict['pydbcopy_transfer_streams'])
+
+        if propDict.has_key('pydbcopy_transfer_compression'):
+            self.transfer_compression = propDict['pydbcopy_transfer_compression']
+
+        if propDict.has_key('pydbcopy_transfer_ssh_cipher'):
+            self.transfer_ssh_cipher = propDict['pydbcopy_transfer_ssh_cipher']
+
+        if propDict.has_key('pydbcopy_delta_transfer'):
+            self.delta_transfer = propDict['pydbcopy_delta_transfer'].lower() == 'true'
+
+        if propDict.has_key('pydbcopy_delta_spool_dir'):
+            self.delta_spool_dir = propDict['pydbcopy_delta_spool_dir']
+
+        if propDict.has_key('pydbcopy_resume'):
+            self.resume = propDict['pydbcopy_resume'].lower() == 'true'
+
+        if propDict.has_key('pydbcopy_checkpoint_file'):
+            self.checkpoint_file = propDict['pydbcopy_checkpoint_file']
+
+        if propDict.has_key('pydbcopy_dump_spool'):
+            self.dump_spool = propDict['pydbcopy_dump_spool'].lower() == 'true'
+
+        if propDict.has_key('pydbcopy_dump_spool_dir'):
+            self.dump_spool_dir = propDict['pydbcopy_dump_spool_dir']
+
+        if propDict.has_key('pydbcopy_dump_spool_budget_mb'):
+            if propDict['pydbcopy_dump_spool_budget_mb'] is not None and propDict['pydbcopy_dump_spool_budget_mb'] != '':
+                self.dump_spool_budget_mb = int(propDict['pydbcopy_dump_spool_budget_mb'])
+
+        if propDict.has_key('pydbcopy_targets'):
+            self.targets = propDict['pydbcopy_targets'].split()
+
+        if propDict.has_key('pydbcopy_concurrent_verify'):
+            self.concurrent_verify = propDict['pydbcopy_concurrent_verify'].lower() == 'true'
+
+        if propDict.has_key('pydbcopy_verify_workers'):
+            if propDict['pydbcopy_verify_workers'] is not None and propDict['pydbcopy_verify_workers'] != '':
+                self.verify_workers = int(propDict['pydbcopy_verify_workers'])
+
+        if propDict.has_key('pydbcopy_metrics_file'):
+            self.metrics_file = propDict['pydbcopy_metrics_file']
+
+        if propDict.has_key('pydbcopy_metrics_prometheus_file'):
+            self.metrics_prometheus_file = propDict['pydbcopy_metrics_prometheus_file']
+
+        if propDict.has_key('pydbcopy_metrics_statsd'):
+            self.metrics_statsd = propDict['pydbcopy_metrics_statsd']
+
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,115 @@
+"""
+  Connections to the source and target kept open and reused across tables, instead of connecting
+  (and authenticating) again for every table. Each worker process has its own pool, opened by
+  the multiprocessing pool initializer (see pydbcopy.init_worker); connections are never shared
+  across processes.
+"""
+import os
+import threading
+import multiprocessing
+from dbutils import MySQLHost
+
+logger = multiprocessing.get_logger()
+
+class ConnectionPool(object):
+    """
+        Idle MySQLHosts per role ('source' or 'target'). A checked out host is used by a single
+        thread until it is checked in; connections that fail their health check are replaced by
+        new ones. Stages that need more than one connection to a host at a time simply check out
+        more, the pool grows as needed and keeps up to max_idle idle connections per role.
+    """
+    def __init__(self, connect_args, max_idle=2):
+        """
+            Keyword arguments:
+                connect_args -- a dict of role to the (host, user, password, database) tuple to
+                                connect with
+                max_idle -- the number of idle connections kept per role (defaults to 2), with 0
+                            every connection is closed when checked in
+        """
+        self.connect_args = connect_args
+        self.max_idle = max_idle
+        self.idle = dict((role, []) for role in connect_args)
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.connects = 0
+        self.reuses = 0
+
+    def checkout(self, role):
+        """
+            Checks out a connection, reusing an idle one that is still alive if there is one.
+
+            Keyword arguments:
+                role -- 'source' or 'target'
+
+            returns -- a connected MySQLHost
+        """
+        while True:
+            self.lock.acquire()
+            try:
+                host = self.idle[role].pop() if self.idle[role] else None
+            finally:
+                self.lock.release()
+            if host is None:
+                break
+            if host.ping():
+                self.reuses += 1
+                return host
+            logger.debug("Dropping a dead connection to %s" % host.host)
+
+        self.connects += 1
+        return MySQLHost(*self.connect_args[role])
+
+    def checkin(self, role, host):
+        """
+            Returns a connection to the pool once its user is done with it. Uncommitted work is
+            rolled back and the session is reset (see MySQLHost.reset_session), a connection that
+            can not be reset is closed.
+
+            Keyword arguments:
+                role -- 'source' or 'target'
+                host -- the MySQLHost checked out
+        """
+        if host is None or host.conn is None:
+            return
+        try:
+            host.reset_session()
+        except:
+            logger.debug("Closing a connection to %s that can not be reset" % host.host, exc_info=1)
+            return
+
+        self.lock.acquire()
+        try:
+            if len(self.idle[role]) < self.max_idle:
+                self.idle[role].append(host)
+        finally:
+            self.lock.release()
+
+    def abandon(self):
+        """
+            Forgets the idle connections without closing them, for a pool inherited by a forked
+            process: closing them there would close them for the parent too.
+        """
+        for hosts in self.idle.values():
+            for host in hosts:
+                host.conn = None
+            del hosts[:]
+
+# the pool of the current process, see get_pool
+pool = None
+
+def get_pool(connect_args, max_idle=2):
+    """
+        Gets the connection pool of the current process, creating it on first use in the process.
+
+        Keyword arguments:
+            connect_args -- see ConnectionPool
+            max_idle -- see ConnectionPool (defaults to 2)
+
+        returns -- a ConnectionPool
+    """
+    global pool
+    if pool is None or pool.pid != os.getpid():
+        if pool is not None:
+            pool.abandon()
+        pool = ConnectionPool(connect_args, max_idle)
+    return pool
@@ -0,0 +1,125 @@
+"""
+  Row count strategies for the validity check: table statistics estimates with an error bound,
+  exact counts split over primary key ranges counted on parallel connections, and plain exact
+  counts.
+"""
+import threading
+import multiprocessing
+
+logger = multiprocessing.get_logger()
+
+# exact -- select count(*)
+# estimate -- the estimates of the table statistics only
+# parallel -- select count(*) over primary key ranges on parallel connections
+# auto -- the estimates when they decide the check, parallel or exact counts when they do not
+count_strategies = ('exact', 'estimate', 'parallel', 'auto')
+
+def passes_threshold(source_count, dest_count, threshold):
+    """
+        returns -- True if the source is not short of the destination by threshold percent or more
+                   (see pydbcopy.perform_validity_check)
+    """
+    if source_count >= dest_count:
+        return True
+    return 100 - (float(source_count) / float(dest_count)) * 100 < threshold
+
+def check_threshold(source_bounds, dest_bounds, threshold):
+    """
+        Decides the validity check from bounds on the row counts.
+
+        Keyword arguments:
+            source_bounds -- a (lower, upper) tuple bounding the source row count
+            dest_bounds -- a (lower, upper) tuple bounding the destination row count
+            threshold -- the percent threshold of the check
+
+        returns -- True if the check passes for any counts within the bounds, False if it fails for
+                   any of them, None if it depends on the actual counts
+    """
+    if passes_threshold(source_bounds[0], dest_bounds[1], threshold):
+        return True
+    if not passes_threshold(source_bounds[1], dest_bounds[0], threshold):
+        return False
+    return None
+
+def estimate_bounds(host, table, error_bound):
+    """
+        Bounds the row count of a table from the estimate of its table statistics. The estimate
+        of a MyISAM table is exact, an InnoDB estimate is assumed to be off by at most error_bound.
+
+        Keyword arguments:
+            host -- MySQLHost the table is on
+            table -- name of the table
+            error_bound -- the relative error of an estimate, 0.5 for off by at most 50%
+
+        returns -- a (lower, upper, estimate) tuple, None if the table does not exist
+    """
+    estimate = host.get_row_estimate(table)
+    if estimate is None:
+        return None
+    if host.get_table_engine_info(table)[0] == 'MyISAM':
+        error_bound = 0
+    return (int(estimate * (1 - error_bound)), int(estimate * (1 + error_bound)) + 1, estimate)
+
+def split_key_range(lower, upper, parts):
+    """
+        Splits an integer key range into parts of roughly equal width.
+
+        Keyword arguments:
+            lower -- the smallest key
+            upper -- the largest key
+            parts -- the number of parts
+
+        returns -- a list of the parts + 1 bounds of the parts, the first and last being None
+                   (open ended) so that keys outside the range fall in the first or last part
+    """
+    parts = int(min(parts, upper - lower + 1))
+    return [None] + [lower + (upper - lower + 1) * i // parts for i in range(1, parts)] + [None]
+
+def parallel_row_count(host, table, connections, role, workers):
+    """
+        Counts the rows of a table with select count(*) over ranges of its single column integer
+        primary key, each counted by its own thread on a connection checked out of the pool.
+        Tables that can not be split are counted with a single select count(*).
+
+        Keyword arguments:
+            host -- MySQLHost the table is on
+            table -- name of the table
+            connections -- connpool.ConnectionPool to check out the extra connections from
+            role -- the role of the host in the pool, 'source' or 'target'
+            workers -- the number of ranges counted in parallel
+
+        returns -- the number of rows, None if the table does not exist
+    """
+    columns = host.get_primary_key_columns(table)
+    if len(columns) != 1 or workers < 2:
+        return host.get_row_count(table)
+    lower, upper = host.get_key_range(table, columns[0])
+    if not isinstance(lower, (int, long)) or not isinstance(upper, (int, long)) or upper <= lower:
+        return host.get_row_count(table)
+
+    bounds = split_key_range(lower, upper, workers)
+    counts = [None] * (len(bounds) - 1)
+    errors = []
+
+    def count_range(index):
+        range_host = None
+        try:
+            range_host = connections.checkout(role)
+            counts[index] = range_host.get_row_count(table, (columns[0], bounds[index], bounds[index + 1]))
+        except Exception, e:
+            errors.append(e)
+        finally:
+            connections.checkin(role, range_host)
+
+    threads = [threading.Thread(target=count_range, args=(index,)) for index in range(len(counts))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors or None in counts:
+        logger.warn("Parallel count of %s on %s failed (%s), counting it in one go" % \
+                    (table, host.host, errors[0] if errors else "missing range"))
+        return host.get_row_count(table)
+    logger.debug("Counted %d rows of %s on %s over %d ranges" % (sum(counts), table, host.host, len(counts)))
+    return sum(counts)
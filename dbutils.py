@@ -6,8 +6,12 @@
 import re
 import tempfile
 import os
+import stat
+import time
 import MySQLdb as Database
+from MySQLdb.cursors import SSCursor
 import multiprocessing
+from catalog import catalog
 
 logger = multiprocessing.get_logger()
         
@@ -71,6 +75,10 @@ class MySQLHost(object):
                 
             returns -- True if the table exists, false otherwise
         """
+        cached, found = catalog.lookup(self.host, self.database, table, 'exists')
+        if cached:
+            return found
+        
         found = False
 
         logger.debug("Checking if %s exists on host..." % (table))
@@ -83,7 +91,58 @@ class MySQLHost(object):
 
         return found
 
-    def select_into_outfile(self, table, hash_set, dump_dir):
+    def prefetch_catalog(self, tables):
+        """
+            Fetches the metadata of the specified tables into the catalog (see catalog) with two
+            information_schema queries, so that table_exists, get_table_engine_info, 
+            get_primary_key_columns and get_row_estimate are answered without a round trip for
+            these tables. Create statements are cached on their first use by get_table_structure.
+
+            Keyword arguments:
+                tables -- list of names of the tables
+                
+            returns -- the number of the tables that exist
+        """
+        if len(tables) == 0:
+            return 0
+        
+        c = self.conn.cursor()
+        logger.debug('Prefetching the metadata of %d tables in %s on %s' % (len(tables), self.database, self.host))
+        in_tables = ','.join(['%s'] * len(tables))
+        c.execute("select t.table_name, t.engine, t.table_rows, " \
+                  "(select count(*) from information_schema.triggers g " \
+                  "where g.event_object_schema = t.table_schema and g.event_object_table = t.table_name), " \
+                  "(select count(*) from information_schema.referential_constraints r " \
+                  "where r.constraint_schema = t.table_schema and (r.table_name = t.table_name or r.referenced_table_name = t.table_name)) " \
+                  "from information_schema.tables t where t.table_schema = %%s and t.table_name in (%s)" % in_tables, \
+                  [self.database] + list(tables))
+        found = dict((row[0].lower(), row) for row in c.fetchall())
+        
+        c.execute("select table_name, column_name from information_schema.statistics " \
+                  "where table_schema = %%s and index_name = 'PRIMARY' and table_name in (%s) " \
+                  "order by table_name, seq_in_index" % in_tables, [self.database] + list(tables))
+        primary_keys = dict()
+        for row in c.fetchall():
+            primary_keys.setdefault(row[0].lower(), []).append(row[1])
+        c.close()
+        
+        for table in tables:
+            row = found.get(table.lower())
+            if row is None:
+                catalog.store(self.host, self.database, table, { 'exists' : False })
+            else:
+                catalog.store(self.host, self.database, table, { 'exists' : True, 'engine' : row[1], 'table_rows' : row[2], 
+                                                                 'can_rebuild' : row[3] == 0 and row[4] == 0, 
+                                                                 'primary_key' : primary_keys.get(table.lower(), []) })
+        return len(found)
+
+    def __invalidate(self, table, fields=None):
+        """
+            Forgets the cached metadata of a table after changing it, see TableCatalog.invalidate.
+        """
+        catalog.invalidate(self.host, self.database, table, fields)
+
+    def select_into_outfile(self, table, hash_set, dump_dir, key_range=None, order_by_key=False):
         """ 
             Use select into outfile to dump a database table into a CSV file.
             
@@ -93,6 +152,11 @@ class MySQLHost(object):
                            if None all records are selected
                dump_dir -- the file system path to the dir to dump the file to 
                            (attempts to make th dir if not exists).
+               key_range -- a (column, lower, upper) tuple restricting the dump to rows where
+                            lower <= column < upper, a bound of None is open ended. Only
+                            used when hash_set is None (defaults to None, all rows).
+               order_by_key -- dump the rows in primary key order (defaults to False), so that 
+                               loading them appends to the primary key instead of splitting pages
             
             returns -- a string containing the full path to the file
         """
@@ -110,86 +174,295 @@ class MySQLHost(object):
         csv_file.close()
 
         if hash_set is not None:
-            ''' Then we must select into a temp table first
-                Before we drop suppress warnings 
-            '''
-            from warnings import filterwarnings
-            filterwarnings( 'ignore', category = Warning )
-
-            c.execute("drop table if exists %s.tmp_pydbcopy_%s" % (self.database, table))
-
-            from warnings import resetwarnings
-            resetwarnings()
-            
-            c.execute("create table %s.tmp_pydbcopy_%s like %s.%s" % (self.database, table, self.database, table))
-            
+            ''' Then we must load the hashes into a temp table first and join on it '''
+            staging_table = self.stage_hashes(table, hash_set)
             try:
-                batch_size = 20000
-                batch = set()
-                batches_complete = False
-                while not batches_complete:
-                    batch.add(hash_set.pop())
-                    batches_complete = len(hash_set) == 0
-                    
-                    if len(batch) == batch_size or batches_complete:
-                        query = "insert into %s.tmp_pydbcopy_%s (select * from %s.%s where fieldHash in ('%s'))" % \
-                                (self.database, table, self.database, table, "','".join(str(hash) for hash in batch))
-                        logger.debug(query);
-                        c.execute(query)
-                        batch.clear()
-    
                 logger.debug("Executing select into outfile command...")
-                c.execute("select * from %s.tmp_pydbcopy_%s into outfile '%s'" % (self.database, table, csvfilename))
-                
+                c.execute("%s%s into outfile '%s'" % \
+                          (self.__staged_rows_query(table, staging_table), self.__order_by_key_clause(table, order_by_key, 't.'), csvfilename))
             finally:
                 logger.debug("Cleaning up temp table...")
-                c.execute("drop table %s.tmp_pydbcopy_%s" % (self.database, table))
+                self.drop_staged_hashes(staging_table)
         else:
             logger.debug("Executing select into outfile command...")
-            c.execute("select * from %s.%s into outfile '%s'" % (self.database, table, csvfilename))
+            c.execute("select * from %s.%s%s%s into outfile '%s'" % \
+                      (self.database, table, self.__key_range_clause(key_range), \
+                       self.__order_by_key_clause(table, order_by_key), csvfilename))
         
         c.close()
     
         return csvfilename
     
-    def load_data_in_file(self, table, filename):
+    def stage_hashes(self, table, hash_set):
+        """
+            Loads a set of hashes into a temporary table holding nothing but a fieldHash primary 
+            key, so the rows with those hashes can be selected with a single indexed join. The 
+            hashes are bulk loaded with LOAD DATA LOCAL INFILE, or with extended inserts if the 
+            server does not allow it. The temporary table only exists for this connection.
+            
+            Keyword arguments:
+               table -- name of the table the hashes are from, the temporary table gets the 
+                        same type and collation for its fieldHash column
+               hash_set -- an iterable of hashes
+               
+            returns -- a string containing the name of the temporary table
+        """
+        staging_table = "tmp_pydbcopy_hashes_%s" % table
+        c = self.conn.cursor()
+        c.execute("show full columns from %s.%s like 'fieldHash'" % (self.database, table))
+        column = c.fetchone()
+        collation = column[2] and " collate %s" % column[2] or ""
+        
+        from warnings import filterwarnings
+        filterwarnings( 'ignore', category = Warning )
+        
+        c.execute("drop temporary table if exists %s" % staging_table)
+        
+        from warnings import resetwarnings
+        resetwarnings()
+        
+        c.execute("create temporary table %s (fieldHash %s%s not null, primary key (fieldHash))" % \
+                  (staging_table, column[1], collation))
+        
+        hash_file = tempfile.NamedTemporaryFile(prefix='pydbcopy_hashes_')
+        try:
+            for batch in hash_batches(hash_set, 20000):
+                hash_file.write(''.join(str(hash).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n') + '\n' \
+                                        for hash in batch))
+            hash_file.flush()
+            
+            try:
+                c.execute("load data local infile '%s' ignore into table %s" % (hash_file.name, staging_table))
+            except Database.Error, e:
+                logger.info("Could not bulk load the hashes of %s on %s (%s), inserting them instead" % \
+                            (table, self.host, e))
+                c.execute("truncate table %s" % staging_table)
+                for batch in hash_batches(hash_set, 20000):
+                    c.executemany("insert ignore into " + staging_table + " (fieldHash) values (%s)", batch)
+        finally:
+            hash_file.close()
+        
+        c.execute("select count(*) from %s" % staging_table)
+        logger.debug("Staged %d hashes of %s in %s" % (c.fetchone()[0], table, staging_table))
+        c.close()
+        return staging_table
+    
+    def drop_staged_hashes(self, staging_table):
+        """
+            Drops a temporary table created by stage_hashes.
+            
+            Keyword arguments:
+               staging_table -- name of the temporary table
+        """
+        c = self.conn.cursor()
+        c.execute("drop temporary table if exists %s" % staging_table)
+        c.close()
+    
+    def __staged_rows_query(self, table, staging_table):
+        """
+            Builds the query selecting the rows of a table whose hashes were staged with stage_hashes.
+        """
+        return "select t.* from %s.%s t join %s h on h.fieldHash = t.fieldHash" % (self.database, table, staging_table)
+    
+    def __key_range_clause(self, key_range):
+        """
+            Builds the where clause restricting a select to a primary key range.
+
+            Keyword arguments:
+               key_range -- a (column, lower, upper) tuple, see select_into_outfile, or None
+
+            returns -- a string containing the where clause (with a leading space), empty
+                       if there is no range to restrict to
+        """
+        if key_range is None:
+            return ''
+        column, lower, upper = key_range
+        conditions = []
+        if lower is not None:
+            conditions.append("%s >= %s" % (column, self.conn.literal(lower)))
+        if upper is not None:
+            conditions.append("%s < %s" % (column, self.conn.literal(upper)))
+        if len(conditions) == 0:
+            return ''
+        return " where %s" % " and ".join(conditions)
+
+    def __order_by_key_clause(self, table, order_by_key, prefix=''):
+        """
+            Builds the order by clause sorting the rows of a table by its primary key.
+
+            Keyword arguments:
+               table -- name of the table
+               order_by_key -- False to not sort the rows
+               prefix -- prefix for the column names, the table alias followed by a dot (defaults
+                         to no prefix)
+
+            returns -- a string containing the order by clause (with a leading space), empty
+                       if the rows are not to be sorted or the table has no primary key
+        """
+        if not order_by_key:
+            return ''
+        columns = self.get_primary_key_columns(table)
+        if len(columns) == 0:
+            return ''
+        return " order by %s" % ", ".join("%s`%s`" % (prefix, column) for column in columns)
+
+    def load_data_in_file(self, table, filename, commit=True, session_variables=None, replace=False):
         """
             Load the specified file into the specified table using the LOAD DATA INFILE SQL statement.
 
             Keyword arguments:
                 table -- Table to load the data into.
-                filename -- The full path to the CSV file to be loaded
+                filename -- The full path to the CSV file (or named pipe) to be loaded
+                commit -- commit the load when done (defaults to True), if False it is up to the 
+                          caller to commit or rollback
+                session_variables -- a dict of session variables (such as unique_checks) to set for
+                                     the load, they are restored afterwards (defaults to None)
+                replace -- replace existing rows with the same primary or unique key instead of
+                           failing on them (defaults to False)
+                
+            returns -- the number of rows loaded
         """
         logger.debug("Loading %s into %s.%s.%s..." % (filename, self.host, self.database, table))
         
-        file = open(filename, 'r')
-        file.seek(0)
-        max_lines = 5
-        i = 0
-        for line in file:
-            if i < max_lines:
-                logger.debug(re.sub(r'\n', '', line))
-                i += 1
+        # a named pipe can only be read once, by the load itself
+        if stat.S_ISREG(os.stat(filename).st_mode):
+            file = open(filename, 'r')
+            file.seek(0)
+            max_lines = 5
+            i = 0
+            for line in file:
+                if i < max_lines:
+                    logger.debug(re.sub(r'\n', '', line))
+                    i += 1
+                else:
+                    break
+            file.close()
+    
+            # get the size of the file in human friendly format
+            bytes = os.stat(file.name).st_size
+            if bytes < 1024:
+                file_size = "%f bytes" % bytes
+            elif bytes < 1048576: # 1024^2
+                file_size = "%.2f Kb" % (bytes / 1024.0)
             else:
-                break
-
-        # get the size of the file in human friendly format
-        bytes = os.stat(file.name).st_size
-        if bytes < 1024:
-            file_size = "%f bytes" % bytes
-        elif bytes < 1048576: # 1024^2
-            file_size = "%.2f Kb" % (bytes / 1024.0)
+                file_size = "%.2f Mb" % (bytes / 1048576.0)
+    
+            logger.debug("----------------------------------------------------")
+            logger.debug("The first %s lines of the CSV to be loaded are shown above" % max_lines)
+            logger.debug("loading %s CSV file into %s.%s on %s..." % (file_size, self.database, table, self.host))
         else:
-            file_size = "%.2f Mb" % (bytes / 1048576.0)
+            logger.debug("loading stream from %s into %s.%s on %s..." % (filename, self.database, table, self.host))
 
-        logger.debug("----------------------------------------------------")
-        logger.debug("The first %s lines of the CSV to be loaded are shown above" % max_lines)
-        logger.debug("loading %s CSV file into %s.%s on %s..." % (file_size, self.database, table, self.host))
+        c = self.conn.cursor()
+        previous_variables = self.set_session_variables(session_variables)
+        try:
+            start = time.time()
+            c.execute("load data local infile '%s'%s into table %s.%s" % \
+                      (filename, " replace" if replace else "", self.database, table))
+            rows = c.rowcount
+            if commit:
+                self.conn.commit()
+            elapsed = time.time() - start
+        finally:
+            self.set_session_variables(previous_variables)
+        c.close()
+        self.__invalidate(table, ['table_rows'])
+        
+        logger.info("Loaded %d rows into %s.%s on %s in %.1f seconds (%.0f rows/s, session %s)" % \
+                    (rows, self.database, table, self.host, elapsed, rows / elapsed if elapsed > 0 else 0, \
+                     ", ".join("%s=%s" % item for item in sorted((session_variables or dict()).items())) or "defaults"))
+        return rows
+
+    def set_session_variables(self, session_variables):
+        """
+            Sets session variables on this connection.
 
+            Keyword arguments:
+                session_variables -- a dict of variable name to value, may be None or empty
+
+            returns -- a dict of the previous values of the variables, to restore them with
+        """
+        if not session_variables:
+            return None
+        names = sorted(session_variables.keys())
         c = self.conn.cursor()
-        c.execute("load data local infile '%s' into table %s.%s" % (filename, self.database, table))
-        self.conn.commit()
+        c.execute("select %s" % ", ".join("@@session.%s" % name for name in names))
+        previous_variables = dict(zip(names, c.fetchone()))
+        c.execute("set %s" % ", ".join("session %s = %%s" % name for name in names), \
+                  [session_variables[name] for name in names])
         c.close()
+        return previous_variables
+
+    def iter_row_batches(self, table, hash_set=None, key_range=None, batch_size=10000, order_by_key=False):
+        """
+            Reads rows of the specified table with a server side (unbuffered) cursor so that only
+            one batch of rows is held in memory at a time. The connection can not be used for
+            anything else until the generator is exhausted or closed.
+
+            Keyword arguments:
+                table -- name of the table to read
+                hash_set -- a set of hashes of the rows to read (from the fieldHash column), 
+                            if None all records are read
+                key_range -- see select_into_outfile, only used when hash_set is None
+                batch_size -- the maximum number of rows per batch (defaults to 10,000)
+                order_by_key -- see select_into_outfile
+
+            returns -- a generator of lists of row tuples
+        """
+        staging_table = None
+        if hash_set is None:
+            query = "select * from %s.%s%s%s" % (self.database, table, self.__key_range_clause(key_range), \
+                                                 self.__order_by_key_clause(table, order_by_key))
+        else:
+            staging_table = self.stage_hashes(table, hash_set)
+            query = self.__staged_rows_query(table, staging_table) + self.__order_by_key_clause(table, order_by_key, 't.')
+        
+        try:
+            c = self.conn.cursor(SSCursor)
+            try:
+                logger.debug("Streaming rows of %s.%s from %s..." % (self.database, table, self.host))
+                c.execute(query)
+                rows = c.fetchmany(batch_size)
+                while rows:
+                    yield rows
+                    rows = c.fetchmany(batch_size)
+            finally:
+                c.close()
+        finally:
+            if staging_table is not None:
+                self.drop_staged_hashes(staging_table)
+
+    def commit(self):
+        """
+            Commits the current transaction on this host.
+        """
+        self.conn.commit()
+
+    def rollback(self):
+        """
+            Rolls back the current transaction on this host.
+        """
+        self.conn.rollback()
+
+    def ping(self):
+        """
+            Checks that the connection to the MySQL server is still alive.
+            
+            returns -- True if it is
+        """
+        try:
+            self.conn.ping()
+            return True
+        except Database.Error:
+            return False
+
+    def reset_session(self):
+        """
+            Rolls back the current transaction and turns autocommit back off, as on a new 
+            connection, so the connection can be reused (see connpool).
+        """
+        self.conn.rollback()
+        self.conn.autocommit(False)
 
     def truncate_table(self, table):
         """ 
@@ -202,6 +475,7 @@ class MySQLHost(object):
         c.execute("truncate table %s.%s" % (self.database, table))
         self.conn.commit()
         c.close()
+        self.__invalidate(table, ['table_rows'])
         
     def get_table_structure(self, table):
         """ 
@@ -214,6 +488,10 @@ class MySQLHost(object):
             returns -- a string representing the table schema, suitable SQL to be used to 
                        recreate the schema for this table
         """
+        cached, struct = catalog.lookup(self.host, self.database, table, 'structure')
+        if cached:
+            return struct
+        
         c = self.conn.cursor()
         logger.debug('Determining the structure of %s.%s on %s' % (self.database, table, self.host))
         c.execute("show create table %s" % (table))
@@ -221,6 +499,7 @@ class MySQLHost(object):
         struct = re.sub('AUTO\_INCREMENT=\d+ ', '', rows[1])
         c.close()
         
+        catalog.update(self.host, self.database, table, 'structure', struct)
         return struct
     
     def get_table_max_modified(self, table):
@@ -257,6 +536,110 @@ class MySQLHost(object):
         c.execute(schema)
         self.conn.commit()
         c.close()
+        self.__invalidate(table)
+    
+    def drop_table(self, table):
+        """ 
+            Drops the specified table if it exists.
+            
+            Keyword arguments:
+               table -- name of the table to drop
+        """
+        from warnings import filterwarnings
+        filterwarnings( 'ignore', category = Warning )
+        
+        c = self.conn.cursor()
+        c.execute("drop table if exists %s.%s" % (self.database, table))
+        c.close()
+        self.__invalidate(table)
+        
+        from warnings import resetwarnings
+        resetwarnings()
+    
+    def create_shadow_table(self, table, shadow_table, schema):
+        """ 
+            Drops and then recreates a shadow table to be loaded in place of the specified table,
+            with the specified schema minus its secondary keys (see split_secondary_keys) so the
+            load only has to maintain the primary key.
+            
+            Keyword arguments:
+               table -- name of the table the schema is for
+               shadow_table -- name of the shadow table to create
+               schema -- SQL statement creating the table, as returned by get_table_structure
+               
+            returns -- a list of the secondary key definitions left out, see add_secondary_keys
+        """
+        schema, keys = split_secondary_keys(schema)
+        schema = re.sub(r'^CREATE TABLE `[^`]+`', 'CREATE TABLE `%s`' % shadow_table, schema, 1)
+        
+        logger.debug('Creating shadow table %s.%s on %s for %s' % (self.database, shadow_table, self.host, table))
+        self.drop_table(shadow_table)
+        c = self.conn.cursor()
+        c.execute(schema)
+        c.close()
+        self.__invalidate(shadow_table)
+        return keys
+    
+    def drop_secondary_keys(self, table):
+        """ 
+            Drops the secondary keys of the specified table with a single alter table, so a bulk
+            load only has to maintain the primary key (see add_secondary_keys).
+            
+            Keyword arguments:
+               table -- name of the table
+               
+            returns -- a list of the definitions of the keys dropped
+        """
+        keys = split_secondary_keys(self.get_table_structure(table))[1]
+        if keys:
+            c = self.conn.cursor()
+            logger.debug('Dropping %d secondary keys of %s.%s on %s' % (len(keys), self.database, table, self.host))
+            c.execute("alter table %s.%s %s" % (self.database, table, \
+                      ", ".join("drop key `%s`" % re.search(r'KEY `([^`]+)`', key).group(1) for key in keys)))
+            c.close()
+            self.__invalidate(table)
+        return keys
+    
+    def add_secondary_keys(self, table, keys):
+        """ 
+            Adds keys to the specified table with a single alter table, so all of them are built
+            in one pass over the rows.
+            
+            Keyword arguments:
+               table -- name of the table
+               keys -- a list of key definitions as found in show create table
+        """
+        if not keys:
+            return
+        c = self.conn.cursor()
+        logger.debug('Building %d secondary keys of %s.%s on %s' % (len(keys), self.database, table, self.host))
+        c.execute("alter table %s.%s %s" % (self.database, table, ", ".join("add %s" % key for key in keys)))
+        c.close()
+        self.__invalidate(table)
+    
+    def swap_in_table(self, table, new_table):
+        """ 
+            Atomically replaces the specified table by another one with a single rename table, 
+            readers see either the old or the new table. The old table is dropped afterwards.
+            
+            Keyword arguments:
+               table -- name of the table to replace, it is created if it does not exist
+               new_table -- name of the table to put in its place
+        """
+        # the table may have been created by another worker since the catalog was prefetched
+        self.__invalidate(table)
+        self.__invalidate(new_table)
+        c = self.conn.cursor()
+        if self.table_exists(table):
+            old_table = "%s__pydbcopy_old" % table
+            self.drop_table(old_table)
+            c.execute("rename table %s.%s to %s.%s, %s.%s to %s.%s" % \
+                      (self.database, table, self.database, old_table, self.database, new_table, self.database, table))
+            c.execute("drop table %s.%s" % (self.database, old_table))
+        else:
+            c.execute("rename table %s.%s to %s.%s" % (self.database, new_table, self.database, table))
+        logger.debug('Swapped %s.%s in for %s on %s' % (self.database, new_table, table, self.host))
+        c.close()
     
     def get_current_hash_set(self, table):
         """ 
@@ -280,50 +663,516 @@ class MySQLHost(object):
         c.close()
         return hashSet
     
-    def delete_records(self, table, hashSet):
+    def iter_hash_batches(self, table, batch_size=100000, ordered=False, binary=False):
+        """ 
+            Reads the values of the fieldHash column in the table with a server side (unbuffered) 
+            cursor so that only one batch of hashes is held in memory at a time. NULL hashes are
+            left out.
+            
+            Keyword arguments:
+               table -- name of the table from which to read the values of fieldHash
+               batch_size -- the maximum number of hashes per batch (defaults to 100,000)
+               ordered -- read the hashes ordered by fieldHash (defaults to False), which walks
+                          the fieldHash index in the order of the column's collation
+               binary -- order by the bytes of the hashes rather than by the collation (defaults
+                         to False), this needs a sort on the server
+               
+            returns -- a generator of lists of 1-tuples of hashes
+        """
+        query = "select fieldHash from %s where fieldHash is not null" % (table)
+        if ordered:
+            query += " order by binary fieldHash" if binary else " order by fieldHash"
+        
+        c = self.conn.cursor(SSCursor)
+        logger.debug('Streaming the field hashes of %s' % table)
+        try:
+            c.execute(query)
+            rows = c.fetchmany(batch_size)
+            while rows:
+                yield rows
+                rows = c.fetchmany(batch_size)
+        finally:
+            c.close()
+    
+    def get_hash_bucket_digests(self, table, prefix_length, prefixes=None):
+        """ 
+            Groups the fieldHash values of the specified table by their first prefix_length characters
+            and computes the number of hashes and two CRC32 based digests (xor and sum) of each group 
+            on the server, so only one row per group is transferred. NULL hashes are left out.
+            
+            Keyword arguments:
+               table -- name of the table to compute the digests for
+               prefix_length -- the number of leading characters to group the hashes by
+               prefixes -- a list of shorter prefixes to restrict the hashes to (using the fieldHash
+                           index), if None all hashes are grouped
+               
+            returns -- a dict of prefix to a (count, xor digest, sum digest) tuple
+        """
+        c = self.conn.cursor()
+        logger.debug('Computing hash bucket digests of %s at prefix length %d' % (table, prefix_length))
+        
+        digests = dict()
+        for where, args in self.__hash_prefix_clauses(prefixes):
+            c.execute("select binary left(fieldHash, %d), count(*), bit_xor(crc32(fieldHash)), sum(crc32(fieldHash)) " \
+                      "from %s where %s group by 1" % (prefix_length, table, where), args)
+            for row in c.fetchall():
+                digests[row[0]] = (row[1], row[2], row[3])
+        c.close()
+        return digests
+    
+    def get_hash_set_for_prefixes(self, table, prefixes):
+        """ 
+            Gets the set of values of the fieldHash column in the table starting with any of the 
+            specified prefixes.
+            
+            Keyword arguments:
+               table -- name of the table from which to get the values of fieldHash
+               prefixes -- a list of prefixes of the hashes to get
+               
+            returns -- a set of hashes
+        """
+        c = self.conn.cursor()
+        hashSet = set()
+        for where, args in self.__hash_prefix_clauses(prefixes):
+            c.execute("select fieldHash from %s where %s" % (table, where), args)
+            for row_data in c.fetchall():
+                hashSet.add(row_data[0])
+        c.close()
+        return hashSet
+    
+    def __hash_prefix_clauses(self, prefixes, batch_size=500):
+        """
+            Builds where clauses restricting the fieldHash column to the specified prefixes, in 
+            batches so no single query grows too large.
+
+            Keyword arguments:
+               prefixes -- a list of prefixes, if None only NULL hashes are excluded
+
+            returns -- a generator of (where clause, query arguments) tuples
+        """
+        if prefixes is None:
+            yield ("fieldHash is not null", None)
+            return
+        for batch in hash_batches(prefixes, batch_size):
+            clause = " or ".join(["fieldHash like %s"] * len(batch))
+            args = [re.sub(r'([\\%_])', r'\\\1', prefix) + '%' for prefix in batch]
+            yield ("(%s)" % clause, args)
+    
+    def delete_records(self, table, hashSet, row_count=None, strategy='auto'):
         """ 
             Delete records from the specified table that have fieldHash in the specified set of values in hashSet.
-            The delete is done in batches of 20,000 so as to not exceed the max_allowed_packet_size on a MySQL TCP/IP 
-            connection. If hashSet is None then nothing is deleted.
+            If hashSet is None then nothing is deleted. The delete is done with one of these strategies:
+            
+               batch -- delete statements with as many hashes as fit in the server's max_allowed_packet
+               join -- stage the hashes in a temporary table (see stage_hashes) and delete with a 
+                       single multi-table delete joining on it
+               rebuild -- copy the rows to keep into a new table and swap it in with rename table, 
+                          not possible for tables with triggers or foreign keys
+            
+            With the auto strategy the choice is made by choose_delete_strategy. The strategy used and 
+            the rows per second it achieved are logged.
             
             Keyword arguments:
                table -- name of the table from which to delete the set of values of fieldHash
                hashSet -- the set of hash values to find in the fieldHash column in the table to delete
+               row_count -- the number of rows in the table, if None the estimate from the table 
+                            statistics is used (defaults to None)
+               strategy -- one of auto, batch, join or rebuild (defaults to auto)
+               
+            returns -- the number of rows deleted
         """
         if hashSet is None or len(hashSet) == 0:
-            return
+            return 0
+        
+        max_bytes = self.get_max_statement_bytes()
+        engine, can_rebuild = self.get_table_engine_info(table)
+        if strategy == 'auto':
+            if row_count is None:
+                row_count = self.get_row_estimate(table)
+            delete_bytes = sum(len(str(hash)) + 3 for hash in hashSet)
+            strategy = choose_delete_strategy(len(hashSet), delete_bytes, row_count, engine, max_bytes, can_rebuild)
+        elif strategy == 'rebuild' and not can_rebuild:
+            logger.info("Can not rebuild %s, it has triggers or foreign keys, deleting with a join instead" % table)
+            strategy = 'join'
         
+        start = time.time()
+        if strategy == 'batch':
+            deleted = self.__delete_batched(table, hashSet, max_bytes, engine)
+        elif strategy == 'join':
+            deleted = self.__delete_joined(table, hashSet)
+        elif strategy == 'rebuild':
+            deleted = self.__delete_by_rebuild(table, hashSet)
+        else:
+            raise ValueError("Unknown delete strategy %s" % strategy)
+        elapsed = time.time() - start
+        self.__invalidate(table, ['table_rows'])
+        
+        logger.info("Deleted %d rows of %s on %s with the %s strategy in %.1f seconds (%.0f rows/s)" % \
+                    (deleted, table, self.host, strategy, elapsed, deleted / elapsed if elapsed > 0 else 0))
+        return deleted
+    
+    def __delete_batched(self, table, hashSet, max_bytes, engine):
+        """
+            Deletes the rows with the specified hashes with delete statements of at most max_bytes.
+            Keys are only disabled for MyISAM tables, InnoDB ignores disable keys.
+        """
         c = self.conn.cursor()
-        c.execute("alter table %s disable keys" % table)       
-        
-        batch_size = 20000
-        batch = set()
-        batches_complete = False
-        while not batches_complete:
-            batch.add(hashSet.pop())
-            batches_complete = len(hashSet) == 0
-            
-            if len(batch) == batch_size or batches_complete:
-                query = "delete from %s where fieldHash in ('%s')" % (table, "','".join(str(hash) for hash in batch))
-                logger.debug(query);
-                c.execute(query)
-                batch.clear()
+        if engine == 'MyISAM':
+            c.execute("alter table %s disable keys" % table)       
         
-        c.execute("alter table %s enable keys" % table)    
+        deleted = 0
+        query = "delete from %s where fieldHash in ('%%s')" % table
+        for batch in packet_batches(hashSet, max_bytes - len(query)):
+            c.execute(query % "','".join(str(hash) for hash in batch))
+            deleted += c.rowcount
+        
+        if engine == 'MyISAM':
+            c.execute("alter table %s enable keys" % table)    
         self.conn.commit()
         c.close()
+        return deleted
+    
+    def __delete_joined(self, table, hashSet):
+        """
+            Deletes the rows with the specified hashes with a single delete joining on the hashes 
+            staged in a temporary table.
+        """
+        staging_table = self.stage_hashes(table, hashSet)
+        try:
+            c = self.conn.cursor()
+            c.execute("delete t from %s.%s t join %s h on h.fieldHash = t.fieldHash" % (self.database, table, staging_table))
+            deleted = c.rowcount
+            self.conn.commit()
+            c.close()
+        finally:
+            self.drop_staged_hashes(staging_table)
+        return deleted
+    
+    def __delete_by_rebuild(self, table, hashSet):
+        """
+            Deletes the rows with the specified hashes by copying all other rows into a new table 
+            that then replaces the table.
+        """
+        keep_table = "%s__pydbcopy_keep" % table
+        staging_table = self.stage_hashes(table, hashSet)
+        try:
+            self.drop_table(keep_table)
+            c = self.conn.cursor()
+            c.execute("SET AUTOCOMMIT=1")
+            c.execute("select count(*) from %s.%s t join %s h on h.fieldHash = t.fieldHash" % \
+                      (self.database, table, staging_table))
+            deleted = c.fetchone()[0]
+            
+            c.execute("create table %s.%s like %s.%s" % (self.database, keep_table, self.database, table))
+            try:
+                c.execute("insert into %s.%s select t.* from %s.%s t left join %s h on h.fieldHash = t.fieldHash where h.fieldHash is null" % \
+                          (self.database, keep_table, self.database, table, staging_table))
+            except:
+                self.drop_table(keep_table)
+                raise
+            c.close()
+            self.swap_in_table(table, keep_table)
+        finally:
+            self.drop_staged_hashes(staging_table)
+        return deleted
+    
+    def get_max_statement_bytes(self):
+        """
+            Gets the size a single statement may have on this connection: the server's 
+            max_allowed_packet, capped at the 16Mb the client library allows by default, with some
+            room to spare.
+            
+            returns -- the maximum statement size in bytes
+        """
+        c = self.conn.cursor()
+        c.execute("select @@max_allowed_packet")
+        max_allowed_packet = c.fetchone()[0]
+        c.close()
+        return int(min(max_allowed_packet, 16777216) * 0.9)
     
-    def get_row_count(self, table):
+    def get_table_engine_info(self, table):
+        """
+            Gets the storage engine of the specified table and whether it can safely be replaced
+            by a rebuilt copy, which is not the case if it has triggers or takes part in foreign keys.
+            
+            Keyword arguments:
+               table -- name of the table
+               
+            returns -- a tuple of the engine name (None if the table does not exist) and a boolean
+        """
+        cached, engine = catalog.lookup(self.host, self.database, table, 'engine')
+        if cached:
+            return (engine, catalog.lookup(self.host, self.database, table, 'can_rebuild')[1])
+        
+        c = self.conn.cursor()
+        c.execute("select engine from information_schema.tables where table_schema = %s and table_name = %s", \
+                  (self.database, table))
+        row = c.fetchone()
+        engine = row and row[0]
+        
+        c.execute("select count(*) from information_schema.triggers where event_object_schema = %s and event_object_table = %s", \
+                  (self.database, table))
+        triggers = c.fetchone()[0]
+        
+        c.execute("select count(*) from information_schema.referential_constraints " \
+                  "where constraint_schema = %s and (table_name = %s or referenced_table_name = %s)", \
+                  (self.database, table, table))
+        foreign_keys = c.fetchone()[0]
+        c.close()
+        return (engine, triggers == 0 and foreign_keys == 0)
+    
+    def get_primary_key_columns(self, table):
+        """ 
+            Gets the names of the columns making up the primary key of the specified table.
+            
+            Keyword arguments:
+               table -- name of the table from which to get the primary key
+               
+            returns -- a list of column names in key order, empty if the table has no primary key
+        """
+        cached, columns = catalog.lookup(self.host, self.database, table, 'primary_key')
+        if cached:
+            return list(columns)
+        
+        c = self.conn.cursor()
+        logger.debug('Determining the primary key of %s.%s on %s' % (self.database, table, self.host))
+        c.execute("show keys from %s where Key_name = 'PRIMARY'" % (table))
+        rows = c.fetchall()
+        c.close()
+        
+        # columns: Table, Non_unique, Key_name, Seq_in_index, Column_name, ...
+        return [row[4] for row in sorted(rows, key=lambda row: row[3])]
+    
+    def get_key_range(self, table, column):
+        """ 
+            Gets the smallest and largest values of the specified (indexed) column in the specified table.
+            
+            Keyword arguments:
+               table -- name of the table from which to get the range
+               column -- name of the column from which to get the range
+               
+            returns -- a (min, max) tuple, (None, None) if the table is empty
+        """
+        c = self.conn.cursor()
+        c.execute("select min(%s), max(%s) from %s" % (column, column, table))
+        rows = c.fetchone()
+        c.close()
+        return (rows[0], rows[1])
+    
+    def iter_key_batches(self, table, columns, batch_size=100000):
+        """ 
+            Reads the values of the specified (primary key) columns of every row of the table 
+            ordered by those columns, with a server side (unbuffered) cursor so that only one batch
+            is held in memory at a time.
+            
+            Keyword arguments:
+               table -- name of the table
+               columns -- list of the names of the columns to read
+               batch_size -- the maximum number of rows per batch (defaults to 100,000)
+               
+            returns -- a generator of lists of tuples of column values
+        """
+        names = ", ".join("`%s`" % column for column in columns)
+        c = self.conn.cursor(SSCursor)
+        logger.debug('Streaming the keys of %s' % table)
+        try:
+            c.execute("select %s from %s order by %s" % (names, table, names))
+            rows = c.fetchmany(batch_size)
+            while rows:
+                yield rows
+                rows = c.fetchmany(batch_size)
+        finally:
+            c.close()
+    
+    def delete_keys(self, table, columns, keys, commit=True):
+        """ 
+            Deletes the rows with the specified (primary) keys, in statements sized to fit in the
+            server's max_allowed_packet.
+            
+            Keyword arguments:
+               table -- name of the table
+               columns -- list of the names of the key columns
+               keys -- an iterable of tuples of key column values
+               commit -- commit the deletes when done (defaults to True)
+               
+            returns -- the number of rows deleted
+        """
+        c = self.conn.cursor()
+        query = "delete from %s where (%s) in (%%s)" % (table, ", ".join("`%s`" % column for column in columns))
+        literals = ("(%s)" % ", ".join(self.conn.literal(value) for value in key) for key in keys)
+        deleted = 0
+        for batch in packet_batches(literals, self.get_max_statement_bytes() - len(query)):
+            c.execute(query % ",".join(batch))
+            deleted += c.rowcount
+        if commit:
+            self.conn.commit()
+        c.close()
+        self.__invalidate(table, ['table_rows'])
+        return deleted
+
+    def delete_key_range(self, table, key_range):
+        """
+            Deletes the rows in a primary key range, such as the rows of a chunk partially loaded
+            by a failed copy.
+
+            Keyword arguments:
+               table -- name of the table
+               key_range -- a (column, lower, upper) tuple, see select_into_outfile
+
+            returns -- the number of rows deleted
+        """
+        c = self.conn.cursor()
+        c.execute("delete from %s%s" % (table, self.__key_range_clause(key_range)))
+        deleted = c.rowcount
+        self.conn.commit()
+        c.close()
+        self.__invalidate(table, ['table_rows'])
+        return deleted
+
+    def replace_rows(self, table, rows, commit=True):
+        """ 
+            Inserts rows into the specified table, replacing the rows with the same primary or 
+            unique key, with extended replace into statements.
+            
+            Keyword arguments:
+               table -- name of the table
+               rows -- a list of dicts of column name to value, all with the same columns
+               commit -- commit the rows when done (defaults to True)
+        """
+        if len(rows) == 0:
+            return
+        columns = sorted(rows[0].keys())
+        c = self.conn.cursor()
+        c.executemany("replace into %s (%s) values (%s)" % \
+                      (table, ", ".join("`%s`" % column for column in columns), ", ".join(["%s"] * len(columns))), \
+                      [[row[column] for column in columns] for row in rows])
+        if commit:
+            self.conn.commit()
+        c.close()
+        self.__invalidate(table, ['table_rows'])
+    
+    def get_master_status(self):
+        """ 
+            Gets the current position in the binary log of this host.
+            
+            returns -- a (log file, log position) tuple, None if binary logging is off
+        """
+        c = self.conn.cursor()
+        c.execute("show master status")
+        row = c.fetchone()
+        c.close()
+        if row is None:
+            return None
+        return (row[0], int(row[1]))
+    
+    def get_row_estimate(self, table):
+        """ 
+            Gets the approximate number of rows in the specified table from the table statistics
+            kept in information_schema. This is much cheaper than get_row_count on large InnoDB
+            tables but may be off by as much as 50%.
+            
+            Keyword arguments:
+               table -- name of the table from which to get the row estimate
+               
+            returns -- an estimate of the number of rows in the table, None if table
+                       does not exist.
+        """
+        cached, estimate = catalog.lookup(self.host, self.database, table, 'table_rows')
+        if cached:
+            return estimate
+        
+        c = self.conn.cursor()
+        c.execute("select table_rows from information_schema.tables where table_schema = %s and table_name = %s", \
+                  (self.database, table))
+        rows = c.fetchone()
+        c.close()
+        if rows is None:
+            return None
+        return rows[0]
+    
+    def get_table_sizes(self, tables):
+        """ 
+            Gets the size on disk (data and indexes) and the estimated number of rows of the specified
+            tables from information_schema in a single query.
+            
+            Keyword arguments:
+               tables -- list of names of the tables to get the sizes of
+               
+            returns -- a dict of table name to a (bytes, rows) tuple, tables that do not exist
+                       are left out
+        """
+        if len(tables) == 0:
+            return dict()
+        
+        c = self.conn.cursor()
+        logger.debug('Determining the size of %d tables in %s on %s' % (len(tables), self.database, self.host))
+        c.execute("select table_name, data_length + index_length, table_rows from information_schema.tables " \
+                  "where table_schema = %%s and table_name in (%s)" % ','.join(['%s'] * len(tables)), \
+                  [self.database] + list(tables))
+        rows = c.fetchall()
+        c.close()
+        
+        return dict((row[0], (row[1] or 0, row[2] or 0)) for row in rows)
+    
+    def get_table_fingerprints(self, tables):
+        """ 
+            Gets the metadata information_schema keeps about the specified tables (create and 
+            update time, data and index length and next auto increment value) in a single query,
+            along with the current time of the server. None of it needs a scan of the tables.
+            MySQL 8 caches the metadata for information_schema_stats_expiry seconds (a day by 
+            default), the cache is turned off for this session so the metadata is current.
+            
+            Keyword arguments:
+               tables -- list of names of the tables
+               
+            returns -- a dict of table name to a dict of the metadata (see changedetect), tables that
+                       do not exist are left out
+        """
+        if len(tables) == 0:
+            return dict()
+        
+        c = self.conn.cursor()
+        c.execute("show variables like 'information_schema_stats_expiry'")
+        if c.fetchone() is not None:
+            c.execute("set session information_schema_stats_expiry = 0")
+        c.execute("select table_name, create_time, update_time, data_length, index_length, auto_increment, now() " \
+                  "from information_schema.tables where table_schema = %%s and table_name in (%s)" % \
+                  ','.join(['%s'] * len(tables)), [self.database] + list(tables))
+        rows = c.fetchall()
+        c.close()
+        
+        return dict((row[0], { 'create_time' : row[1], 'update_time' : row[2], 'data_length' : row[3], 
+                               'index_length' : row[4], 'auto_increment' : row[5], 'taken_at' : row[6] }) for row in rows)
+    
+    def get_quick_checksum(self, table):
+        """ 
+            Gets the live checksum of the specified table with CHECKSUM TABLE ... QUICK, which only
+            MyISAM tables created with CHECKSUM=1 keep.
+            
+            Keyword arguments:
+               table -- name of the table
+               
+            returns -- the checksum, None if the table keeps no live checksum
+        """
+        c = self.conn.cursor()
+        c.execute("checksum table %s quick" % table)
+        row = c.fetchone()
+        c.close()
+        return row[1] if row is not None else None
+    
+    def get_row_count(self, table, key_range=None):
         """ 
             Gets the number of rows in the specified table
             
             Keyword arguments:
                table -- name of the table from which to get the row count
+               key_range -- a (column, lower, upper) tuple restricting the count to a primary key
+                            range, see select_into_outfile (defaults to None, all rows)
                
             returns -- a count of the number of rows in the table, None if table
                        does not exist.
         """
-        query = "select count(*) from %s" % (table)
+        query = "select count(*) from %s%s" % (table, self.__key_range_clause(key_range))
         count = self.__execute_count_query(query)
         if count is None:
             logger.debug("table %s.%s does not exist on host %s" % (self.database, table, self.host))
@@ -342,3 +1191,96 @@ class MySQLHost(object):
         except:
             pass
         return count
+
+# the delete fraction from which rebuilding a table beats deleting from it, per engine.
+# MyISAM only marks deleted rows so deleting stays cheap for longer.
+rebuild_fractions = { 'InnoDB' : 0.3, 'MyISAM' : 0.5 }
+
+delete_strategies = ('auto', 'batch', 'join', 'rebuild')
+
+def choose_delete_strategy(delete_count, delete_bytes, row_count, engine, max_bytes, can_rebuild):
+    """
+        Chooses how to delete a set of rows (see MySQLHost.delete_records): a delete that fits in a
+        single statement is done as a batch, a delete of a large fraction of the table is done by
+        rebuilding the table (if possible) and anything in between with a join.
+        
+        Keyword arguments:
+            delete_count -- the number of hashes to delete
+            delete_bytes -- the size of the hashes once quoted in a statement
+            row_count -- the (estimated) number of rows in the table, may be None
+            engine -- the storage engine of the table
+            max_bytes -- the maximum size of a statement
+            can_rebuild -- False if the table can not be rebuilt
+            
+        returns -- one of batch, join or rebuild
+    """
+    if delete_bytes <= max_bytes:
+        return 'batch'
+    fraction = float(delete_count) / row_count if row_count else 1.0
+    if can_rebuild and fraction >= rebuild_fractions.get(engine, 0.3):
+        return 'rebuild'
+    return 'join'
+
+def packet_batches(hash_set, max_bytes):
+    """
+        Splits a set of hashes into lists whose quoted size in a statement is at most max_bytes.
+        
+        Keyword arguments:
+            hash_set -- an iterable of hashes
+            max_bytes -- the maximum size of the quoted hashes of a batch
+            
+        returns -- a generator of lists of hashes
+    """
+    batch = []
+    batch_bytes = 0
+    for hash in hash_set:
+        hash_bytes = len(str(hash)) + 3
+        if batch and batch_bytes + hash_bytes > max_bytes:
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(hash)
+        batch_bytes += hash_bytes
+    if len(batch) > 0:
+        yield batch
+
+def split_secondary_keys(schema):
+    """
+        Splits the secondary (unique, plain, fulltext and spatial) keys off a table schema. The
+        primary key and any constraints are kept.
+        
+        Keyword arguments:
+            schema -- SQL statement creating the table, as returned by MySQLHost.get_table_structure
+            
+        returns -- a tuple of the schema without secondary keys and a list of the key definitions
+    """
+    lines = schema.split('\n')
+    end = max(i for i, line in enumerate(lines) if line.startswith(')'))
+    definitions = []
+    keys = []
+    for line in lines[1:end]:
+        definition = line.strip().rstrip(',')
+        if re.match(r'(UNIQUE |FULLTEXT |SPATIAL )?KEY ', definition):
+            keys.append(definition)
+        else:
+            definitions.append(definition)
+    return ('\n'.join([lines[0], '  ' + ',\n  '.join(definitions)] + lines[end:]), keys)
+
+def hash_batches(hash_set, batch_size):
+    """
+        Splits a set of hashes into lists of at most batch_size hashes without modifying the set.
+        
+        Keyword arguments:
+            hash_set -- an iterable of hashes
+            batch_size -- the maximum number of hashes per batch
+            
+        returns -- a generator of lists of hashes
+    """
+    batch = []
+    for hash in hash_set:
+        batch.append(hash)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if len(batch) > 0:
+        yield batch
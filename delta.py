@@ -0,0 +1,119 @@
+"""
+  Delta transfers of dump files: the dump of each table (or chunk) loaded by the previous run is
+  kept in a local spool, and the next dump of the same table is fetched with rsync against it, so
+  only the blocks that changed cross the link (rsync's rolling checksum delta). The new file is
+  rebuilt locally by rsync before it is loaded, and then replaces the previous dump in the spool.
+"""
+import os
+import re
+import shutil
+import subprocess
+import multiprocessing
+from distutils.spawn import find_executable
+from transport import SshTransport
+
+logger = multiprocessing.get_logger()
+
+class DeltaSpool(object):
+    """
+        A directory holding the last dump loaded for each spool key (see pydbcopy.copy_rows).
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, key):
+        """
+            returns -- the path of the spooled dump of a key
+        """
+        return os.path.join(self.directory, "%s.csv" % key)
+
+    def basis(self, key):
+        """
+            returns -- the path of the spooled dump of a key, None if there is none
+        """
+        path = self.path(key)
+        return path if os.path.isfile(path) else None
+
+    def keep(self, key, filename):
+        """
+            Moves a loaded dump into the spool, replacing the previous dump of the key atomically.
+
+            Keyword arguments:
+                key -- the spool key of the dump
+                filename -- path of the dump, it is moved
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        temp_filename = "%s.%d" % (self.path(key), os.getpid())
+        shutil.move(filename, temp_filename)
+        os.rename(temp_filename, self.path(key))
+
+class DeltaTransport(SshTransport):
+    """
+        Fetches files with rsync over the multiplexed ssh connection of SshTransport, against a
+        basis file put in place of the local file first (see transfer_delta). The remote file is
+        removed by rsync once transferred.
+    """
+    name = 'delta'
+
+    def __init__(self, user, compress=True, **kwargs):
+        SshTransport.__init__(self, user, **kwargs)
+        self.compress = compress
+        self.received_bytes = 0
+
+    def usable(self, host):
+        return SshTransport.usable(self, host) and find_executable('rsync') is not None
+
+    def transfer_delta(self, host, remote_filename, local_filename, basis):
+        """
+            Fetches a file (see transfer) sending only its differences with the basis file.
+
+            Keyword arguments:
+                host -- the host to fetch the file from
+                remote_filename -- path of the file on the host
+                local_filename -- local path to fetch the file to
+                basis -- path of a local file similar to the remote file, it is left untouched
+
+            returns -- True if the file was fetched
+        """
+        # rsync writes the new file next to the basis and renames it into place, so a hard link
+        # of the basis is enough to keep the basis itself untouched
+        try:
+            os.link(basis, local_filename)
+        except OSError:
+            shutil.copyfile(basis, local_filename)
+        if self.transfer(host, remote_filename, local_filename):
+            return True
+        if os.path.exists(local_filename):
+            os.remove(local_filename)
+        return False
+
+    def fetch(self, host, remote_filename, local_filename):
+        command = ['rsync', '--no-whole-file', '--remove-source-files', '--stats', \
+                   '-e', ' '.join(['ssh'] + self.ssh_options())]
+        if self.compress:
+            command.append('--compress')
+        command += ['%s@%s:%s' % (self.user, host, remote_filename), local_filename]
+
+        rsync_process = subprocess.Popen(command, stdout=subprocess.PIPE)
+        output = rsync_process.communicate()[0]
+        if rsync_process.returncode != 0:
+            logger.debug("Error retrieving remote file with rsync (exit status %d)" % rsync_process.returncode)
+            return False
+
+        received = parse_received_bytes(output)
+        if received is not None:
+            self.received_bytes += received
+            logger.debug("Delta transfer of %s received %d of %d bytes" % \
+                         (remote_filename, received, os.path.getsize(local_filename)))
+        return True
+
+def parse_received_bytes(stats):
+    """
+        returns -- the total bytes received according to the --stats output of rsync, None if not
+                   found
+    """
+    match = re.search(r'^Total bytes received: ([\d,.]+)', stats, re.M)
+    if match is None:
+        return None
+    return int(re.sub(r'[,.]', '', match.group(1)))
@@ -0,0 +1,143 @@
+"""
+  Fan-out copies: every table is exported from the source and transferred once, then loaded
+  into several targets in parallel (see pydbcopy.fanout_copy_table). Each target is still
+  verified and diffed on its own, the rows the incremental copies of the targets need are
+  exported together and each target only loads the rows of its own diff from the dump.
+"""
+import os
+import re
+import tempfile
+import threading
+import multiprocessing
+
+logger = multiprocessing.get_logger()
+
+def parse_targets(targets, default_database):
+    """
+        Parses the targets of a fan-out copy.
+
+        Keyword arguments:
+            targets -- a list of host/database strings, the database can be left out
+            default_database -- the database of the targets that leave it out
+
+        returns -- a list of (host, database) tuples
+    """
+    parsed = []
+    for target in targets:
+        if '/' in target:
+            host, database = target.split('/', 1)
+        else:
+            host, database = target, default_database
+        parsed.append((host, database))
+    return parsed
+
+def target_name(host, database):
+    """
+        returns -- the name of a target in logs and connection pool roles
+    """
+    return "%s/%s" % (host, database)
+
+def column_index(structure, column):
+    """
+        Finds the position of a column in the rows of a table.
+
+        Keyword arguments:
+            structure -- the create table statement of the table, see MySQLHost.get_table_structure
+            column -- name of the column, matched case insensitively
+
+        returns -- the index of the column in a select * of the table, None if it has no such column
+    """
+    columns = re.findall(r'^\s+`([^`]+)`', structure, re.M)
+    lowered = [name.lower() for name in columns]
+    if column.lower() not in lowered:
+        return None
+    return lowered.index(column.lower())
+
+def ends_escaped(text):
+    """
+        returns -- True if text ends with an escaping backslash, i.e. an odd number of them
+    """
+    return (len(text) - len(text.rstrip('\\'))) % 2 == 1
+
+def split_escaped(text, separator):
+    """
+        Splits text on a separator, except where the separator is escaped with a backslash.
+    """
+    parts = []
+    for part in text.split(separator):
+        if parts and ends_escaped(parts[-1]):
+            parts[-1] += separator + part
+        else:
+            parts.append(part)
+    return parts
+
+def iter_dump_rows(f):
+    """
+        Reads the rows of a dump written by select into outfile: tab separated fields, one row per
+        line, tabs and newlines within values escaped with a backslash.
+
+        returns -- an iterator of tuples of the line of a row (with its newline) and its fields
+    """
+    pending = ''
+    for line in f:
+        pending += line
+        if pending.endswith('\n') and ends_escaped(pending[:-1]):
+            continue
+        yield pending, split_escaped(pending[:-1] if pending.endswith('\n') else pending, '\t')
+        pending = ''
+    if pending:
+        yield pending, split_escaped(pending, '\t')
+
+def filter_dump(filename, index, values, dump_dir):
+    """
+        Copies the rows of a dump (see iter_dump_rows) whose field at index is one of the values.
+
+        Keyword arguments:
+            filename -- path of the dump
+            index -- the index of the field to filter on, see column_index
+            values -- a set of the field values of the rows to keep
+            dump_dir -- the directory to write the filtered dump to
+
+        returns -- a tuple of the path of the filtered dump and the number of rows in it
+    """
+    fd, filtered = tempfile.mkstemp(suffix='.csv', dir=dump_dir)
+    rows = 0
+    out = os.fdopen(fd, 'w')
+    try:
+        f = open(filename, 'r')
+        try:
+            for line, fields in iter_dump_rows(f):
+                if index < len(fields) and fields[index] in values:
+                    out.write(line)
+                    rows += 1
+        finally:
+            f.close()
+    finally:
+        out.close()
+    return filtered, rows
+
+def run_threads(work, items):
+    """
+        Calls work on every item at once, each call in its own thread.
+
+        Keyword arguments:
+            work -- a function of an item
+            items -- a list of items
+
+        returns -- a list of the results of the calls, in the order of the items. A call that
+                   raised has a result of None, the exception is logged.
+    """
+    results = [None] * len(items)
+
+    def run(position):
+        try:
+            results[position] = work(items[position])
+        except:
+            logger.error("Failed fan-out work on %s" % (items[position],), exc_info=1)
+
+    threads = [threading.Thread(target=run, args=(position,)) for position in range(len(items))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
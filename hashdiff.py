@@ -0,0 +1,381 @@
+"""
+  Ways of finding the rows that differ between a source and a target table from their
+  fieldHash columns, for incremental copies.
+"""
+import binascii
+import tempfile
+import multiprocessing
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+logger = multiprocessing.get_logger()
+
+HEX_DIGITS = '0123456789abcdef'
+
+def set_diff(table, source_host, dest_host):
+    """
+        Diffs the complete sets of fieldHash values of the source and target tables in memory.
+
+        Keyword arguments:
+            table -- String name of the table to diff
+            source_host -- MySQLHost source host
+            dest_host -- MySQLHost destination host
+
+        returns -- a tuple of the set of hashes to add to the target, the set of hashes to delete
+                   from the target and the number of hashes on the target
+    """
+    sourceHashSet = source_host.get_current_hash_set(table)
+    targetHashSet = dest_host.get_current_hash_set(table)
+
+    return (sourceHashSet.difference(targetHashSet),
+            targetHashSet.difference(sourceHashSet),
+            len(targetHashSet))
+
+def bucket_diff(table, source_host, dest_host, leaf_rows=10000):
+    """
+        Diffs the fieldHash values of the source and target tables hierarchically, like a Merkle
+        tree. Both hosts group their hashes into buckets by hash prefix and compute a digest of
+        each bucket in SQL (see MySQLHost.get_hash_bucket_digests). Only the buckets whose digests
+        differ are split further by a longer prefix, until they hold at most leaf_rows hashes; only
+        then are the hashes of those buckets fetched and diffed. The hashes transferred and held
+        in memory grow with the number of changed rows rather than with the size of the table.
+
+        Keyword arguments:
+            table -- String name of the table to diff
+            source_host -- MySQLHost source host
+            dest_host -- MySQLHost destination host
+            leaf_rows -- the bucket size below which hashes are fetched (defaults to 10,000)
+
+        returns -- see set_diff
+    """
+    hashes_to_add = set()
+    hashes_to_del = set()
+
+    prefix_length = 1
+    source_buckets = source_host.get_hash_bucket_digests(table, prefix_length)
+    target_buckets = dest_host.get_hash_bucket_digests(table, prefix_length)
+    target_count = sum(digest[0] for digest in target_buckets.values())
+
+    while True:
+        leaves = []
+        refine = []
+        for prefix in set(source_buckets.keys()).union(target_buckets.keys()):
+            source_digest = source_buckets.get(prefix)
+            target_digest = target_buckets.get(prefix)
+            if source_digest == target_digest:
+                continue
+            count = max(source_digest[0] if source_digest else 0, target_digest[0] if target_digest else 0)
+            # a hash no longer than its prefix can not be split any further
+            if count <= leaf_rows or len(prefix) < prefix_length:
+                leaves.append(prefix)
+            else:
+                refine.append(prefix)
+
+        logger.debug("Hash diff of %s at prefix length %d: %d buckets to fetch, %d buckets to split" % \
+                     (table, prefix_length, len(leaves), len(refine)))
+
+        if len(leaves) > 0:
+            source_hashes = source_host.get_hash_set_for_prefixes(table, leaves)
+            target_hashes = dest_host.get_hash_set_for_prefixes(table, leaves)
+            hashes_to_add.update(source_hashes.difference(target_hashes))
+            hashes_to_del.update(target_hashes.difference(source_hashes))
+
+        if len(refine) == 0:
+            break
+
+        prefix_length += 1
+        source_buckets = source_host.get_hash_bucket_digests(table, prefix_length, refine)
+        target_buckets = dest_host.get_hash_bucket_digests(table, prefix_length, refine)
+
+    return (hashes_to_add, hashes_to_del, target_count)
+
+class CompactHashArray(object):
+    """
+        A set of hashes held as one sorted numpy array of fixed width byte strings instead of a 
+        python set of string objects. Lower case hex hashes of the same even length (such as MD5 
+        or SHA1 hex digests) are stored as their binary digests, at half the width. Any other 
+        hashes are stored as they are, padded to the width of the longest.
+    """
+    def __init__(self):
+        self.hex_length = None
+        self.is_hex = True
+        self.arrays = []
+        self.array = None
+
+    def add_batch(self, hashes):
+        """
+            Adds a batch of hashes, sorted and de-duplicated on its own to keep memory down.
+        """
+        hashes = [hash.encode('utf-8') if isinstance(hash, unicode) else hash for hash in hashes]
+        if len(hashes) == 0:
+            return
+        if self.is_hex:
+            if self.hex_length is None:
+                self.hex_length = len(hashes[0])
+            if self.hex_length % 2 == 0 and \
+               all(len(hash) == self.hex_length and hash.strip(HEX_DIGITS) == '' for hash in hashes):
+                digests = [binascii.unhexlify(hash) for hash in hashes]
+                self.arrays.append(numpy.unique(numpy.array(digests, dtype='S%d' % (self.hex_length // 2))))
+                return
+            self.to_raw()
+        self.arrays.append(numpy.unique(numpy.array(hashes, dtype='S%d' % max(len(hash) for hash in hashes))))
+
+    def finish(self):
+        """
+            Merges the batches into a single sorted array of unique hashes.
+
+            returns -- this CompactHashArray
+        """
+        if len(self.arrays) == 0:
+            self.array = numpy.array([], dtype='S1')
+        else:
+            self.array = numpy.unique(numpy.concatenate(self.arrays))
+        self.arrays = []
+        return self
+
+    def to_raw(self):
+        """
+            Switches from binary digests to storing the hashes as they are.
+        """
+        if not self.is_hex:
+            return
+        dtype = 'S%d' % (self.hex_length or 1)
+        self.arrays = [numpy.array(self.decode(array), dtype=dtype) for array in self.arrays]
+        if self.array is not None:
+            self.array = numpy.array(self.decode(self.array), dtype=dtype)
+        self.is_hex = False
+
+    def decode(self, values):
+        """
+            Turns stored values back into the original hashes.
+
+            Keyword arguments:
+                values -- an iterable of values from the array
+
+            returns -- a list of hash strings
+        """
+        if not self.is_hex or self.hex_length is None:
+            return [str(value) for value in values]
+        # numpy drops trailing NUL bytes of fixed width strings, put them back
+        width = self.hex_length // 2
+        return [binascii.hexlify(str(value).ljust(width, '\0')) for value in values]
+
+    def __len__(self):
+        return len(self.array)
+
+def read_compact_hashes(host, table, batch_size=100000):
+    """
+        Reads the fieldHash values of a table in batches into a CompactHashArray.
+
+        Keyword arguments:
+            host -- MySQLHost to read the hashes from
+            table -- String name of the table
+            batch_size -- number of hashes read at a time (defaults to 100,000)
+
+        returns -- a finished CompactHashArray
+    """
+    hashes = CompactHashArray()
+    for batch in host.iter_hash_batches(table, batch_size):
+        hashes.add_batch([row[0] for row in batch])
+    return hashes.finish()
+
+def compact_diff(table, source_host, dest_host):
+    """
+        Diffs the fieldHash values of the source and target tables like set_diff, but streams the
+        hashes in batches into sorted numpy arrays of fixed width binary digests (see 
+        CompactHashArray) and computes the differences with vectorized set operations. Needs 
+        roughly a tenth of the memory of set_diff for hex hashes. Falls back to set_diff when
+        numpy is not installed. NULL hashes are left out.
+
+        Keyword arguments:
+            table -- String name of the table to diff
+            source_host -- MySQLHost source host
+            dest_host -- MySQLHost destination host
+
+        returns -- see set_diff
+    """
+    if numpy is None:
+        logger.warn("numpy is not installed, using the set diff method for %s" % table)
+        return set_diff(table, source_host, dest_host)
+
+    source_hashes = read_compact_hashes(source_host, table)
+    target_hashes = read_compact_hashes(dest_host, table)
+
+    # both sides must be stored the same way to be compared
+    if source_hashes.is_hex != target_hashes.is_hex or \
+       (source_hashes.is_hex and len(source_hashes) and len(target_hashes) and \
+        source_hashes.hex_length != target_hashes.hex_length):
+        source_hashes.to_raw()
+        target_hashes.to_raw()
+
+    hashes_to_add = numpy.setdiff1d(source_hashes.array, target_hashes.array, assume_unique=True)
+    hashes_to_del = numpy.setdiff1d(target_hashes.array, source_hashes.array, assume_unique=True)
+
+    return (set(source_hashes.decode(hashes_to_add)),
+            set(target_hashes.decode(hashes_to_del)),
+            len(target_hashes))
+
+class HashSpool(object):
+    """
+        An append only collection of hashes that keeps at most max_buffered of them in memory and
+        spills the rest to a temporary file, so it can hold any number of hashes in constant memory.
+        It can be iterated (once at a time) and sized like a set, but has no membership test: that
+        would scan every hash, turn it into a set first. Hashes must not contain newlines.
+    """
+    def __init__(self, max_buffered=100000):
+        self.max_buffered = max_buffered
+        self.buffer = []
+        self.file = None
+        self.count = 0
+
+    def add(self, hash):
+        self.buffer.append(hash)
+        self.count += 1
+        if len(self.buffer) >= self.max_buffered:
+            if self.file is None:
+                self.file = tempfile.TemporaryFile()
+            self.file.write(''.join(hash + '\n' for hash in self.buffer))
+            self.buffer = []
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, hash):
+        raise TypeError("A HashSpool has no membership test, turn it into a set first")
+
+    def __iter__(self):
+        if self.file is not None:
+            self.file.flush()
+            self.file.seek(0)
+            for line in self.file:
+                yield line[:-1]
+            self.file.seek(0, 2)
+        for hash in self.buffer:
+            yield hash
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+class HashOrderError(Exception):
+    """
+        Raised when a stream of hashes is not in the byte order expected by merge_diff.
+    """
+    pass
+
+def iter_ordered_hashes(host, table, binary, batch_size=100000):
+    """
+        Reads the fieldHash values of a table in order, skipping duplicates.
+
+        Keyword arguments:
+            host -- MySQLHost to read the hashes from
+            table -- String name of the table
+            binary -- order by the bytes of the hashes instead of the column's collation
+            batch_size -- number of hashes read at a time (defaults to 100,000)
+
+        returns -- a generator of hashes in increasing byte order, raises HashOrderError if the
+                   collation order of the column turns out to differ from the byte order
+    """
+    previous = None
+    batches = host.iter_hash_batches(table, batch_size, ordered=True, binary=binary)
+    try:
+        for batch in batches:
+            for row in batch:
+                hash = row[0]
+                if previous is not None:
+                    if hash == previous:
+                        continue
+                    if hash < previous:
+                        raise HashOrderError("fieldHash of %s on %s is not in byte order: '%s' after '%s'" % \
+                                             (table, host.host, hash, previous))
+                previous = hash
+                yield hash
+    finally:
+        batches.close()
+
+def merge_hash_streams(source_hashes, target_hashes, max_buffered=100000):
+    """
+        Walks two ordered streams of unique hashes in lockstep, collecting the hashes only found
+        in one of them.
+
+        Keyword arguments:
+            source_hashes -- an iterable of the source hashes in increasing order
+            target_hashes -- an iterable of the target hashes in increasing order
+            max_buffered -- the number of hashes each output holds in memory (see HashSpool)
+
+        returns -- see set_diff, with HashSpools instead of sets
+    """
+    hashes_to_add = HashSpool(max_buffered)
+    hashes_to_del = HashSpool(max_buffered)
+    target_count = 0
+
+    source_hashes = iter(source_hashes)
+    target_hashes = iter(target_hashes)
+    source_hash = next(source_hashes, None)
+    target_hash = next(target_hashes, None)
+    while source_hash is not None or target_hash is not None:
+        if target_hash is None or (source_hash is not None and source_hash < target_hash):
+            hashes_to_add.add(source_hash)
+            source_hash = next(source_hashes, None)
+        elif source_hash is None or target_hash < source_hash:
+            hashes_to_del.add(target_hash)
+            target_count += 1
+            target_hash = next(target_hashes, None)
+        else:
+            target_count += 1
+            source_hash = next(source_hashes, None)
+            target_hash = next(target_hashes, None)
+
+    return (hashes_to_add, hashes_to_del, target_count)
+
+def merge_diff(table, source_host, dest_host):
+    """
+        Diffs the fieldHash values of the source and target tables in constant memory: both hosts
+        return their hashes ordered by fieldHash through unbuffered cursors, using the fieldHash 
+        index, and the two streams are walked in lockstep (see merge_hash_streams). If the column's
+        collation does not order the hashes by their bytes (mixed case hashes on a case insensitive
+        collation for instance) the diff is redone with the hashes sorted by their bytes on the 
+        servers. NULL hashes are left out.
+
+        Keyword arguments:
+            table -- String name of the table to diff
+            source_host -- MySQLHost source host
+            dest_host -- MySQLHost destination host
+
+        returns -- see set_diff, with HashSpools instead of sets
+    """
+    for binary in (False, True):
+        source_hashes = iter_ordered_hashes(source_host, table, binary)
+        target_hashes = iter_ordered_hashes(dest_host, table, binary)
+        try:
+            return merge_hash_streams(source_hashes, target_hashes)
+        except HashOrderError, e:
+            if binary:
+                raise
+            logger.info("%s, diffing again in byte order" % e)
+        finally:
+            source_hashes.close()
+            target_hashes.close()
+
+diff_methods = { 'set' : set_diff, 'bucket' : bucket_diff, 'compact' : compact_diff, 'merge' : merge_diff }
+
+def diff_hashes(method, table, source_host, dest_host):
+    """
+        Diffs the fieldHash values of the source and target tables with the specified method.
+
+        Keyword arguments:
+            method -- name of the diff method, one of the keys of diff_methods
+            table -- String name of the table to diff
+            source_host -- MySQLHost source host
+            dest_host -- MySQLHost destination host
+
+        returns -- see set_diff
+    """
+    if method not in diff_methods:
+        raise ValueError("Unknown diff method '%s', expected one of %s" % (method, ', '.join(sorted(diff_methods))))
+    logger.debug("Diffing hashes of %s with the %s method" % (table, method))
+    return diff_methods[method](table, source_host, dest_host)
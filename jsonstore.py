@@ -0,0 +1,81 @@
+"""
+  JSON files of the state kept between runs: the copy history (see scheduler), the table
+  fingerprints (see changedetect), the checkpoint manifest (see checkpoint) and the change
+  capture position (see cdc). Files shared between sources and targets keep their entries
+  under a prefix identifying them. Files are always replaced atomically, a reader never sees a
+  half written file.
+"""
+import os
+import json
+import multiprocessing
+
+logger = multiprocessing.get_logger()
+
+def load(filename, description):
+    """
+        Loads a JSON file.
+
+        Keyword arguments:
+            filename -- path of the file
+            description -- what the file is, for the warning if it is unreadable
+
+        returns -- the contents of the file, None if there is no (readable) file
+    """
+    if not filename or not os.path.isfile(filename):
+        return None
+    try:
+        f = open(filename, 'r')
+        try:
+            return json.load(f)
+        finally:
+            f.close()
+    except (IOError, ValueError):
+        logger.warn("Ignoring unreadable %s %s" % (description, filename))
+        return None
+
+def save(filename, stored):
+    """
+        Writes a JSON file to a temporary file renamed over it.
+    """
+    temp_filename = "%s.%d" % (filename, os.getpid())
+    f = open(temp_filename, 'w')
+    try:
+        json.dump(stored, f, indent=1, sort_keys=True)
+    finally:
+        f.close()
+    os.rename(temp_filename, filename)
+
+def load_prefixed(filename, prefix, description):
+    """
+        Loads the entries of a JSON file stored under a prefix by save_prefixed.
+
+        Keyword arguments:
+            filename -- path of the file
+            prefix -- the prefix of the entries of interest
+            description -- what the file is, for the warning if it is unreadable
+
+        returns -- a dict of the keys of the entries without the prefix to their values, empty if
+                   there is no (readable) file
+    """
+    stored = load(filename, description)
+    if not isinstance(stored, dict):
+        return dict()
+    return dict((key[len(prefix):], value) for key, value in stored.items() if key.startswith(prefix))
+
+def save_prefixed(filename, prefix, entries, description):
+    """
+        Stores entries in a JSON file under a prefix, keeping the entries stored for other keys
+        (and other prefixes).
+
+        Keyword arguments:
+            filename -- path of the file
+            prefix -- the prefix to store the entries under
+            entries -- a dict of key to value
+            description -- what the file is, for the warning if it is unreadable
+    """
+    stored = load(filename, description)
+    if not isinstance(stored, dict):
+        stored = dict()
+    for key, value in entries.items():
+        stored[prefix + key] = value
+    save(filename, stored)
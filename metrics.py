@@ -0,0 +1,215 @@
+"""
+  Per table metrics of a run: the copy strategy chosen and why, and the wall time, bytes and rows
+  of every stage of the copy (verify, diff, delete, export, transfer, load, stream). The metrics
+  of the table a thread is working on are recorded through the module functions (see activate),
+  so the copy routines do not have to pass them around. Worker processes hand their metrics back
+  with their results, main merges them and writes them out as JSON lines, a Prometheus textfile
+  and/or StatsD metrics.
+"""
+import os
+import json
+import time
+import socket
+import threading
+import multiprocessing
+
+logger = multiprocessing.get_logger()
+
+class TableMetrics(object):
+    """
+        The metrics of a single table. Stages is a dict of stage name to a dict of the seconds,
+        bytes and rows of the stage, summed over its occurrences (such as the chunks of a table).
+    """
+    def __init__(self, table):
+        self.table = table
+        self.strategy = None
+        self.reason = None
+        self.result = None
+        self.stages = dict()
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def record(self, stage, seconds, bytes=None, rows=None):
+        """
+            Adds an occurrence of a stage, bytes and rows are left out when unknown.
+        """
+        self.lock.acquire()
+        try:
+            totals = self.stages.setdefault(stage, { 'seconds' : 0.0, 'bytes' : None, 'rows' : None })
+            totals['seconds'] += seconds
+            if bytes is not None:
+                totals['bytes'] = (totals['bytes'] or 0) + bytes
+            if rows is not None:
+                totals['rows'] = (totals['rows'] or 0) + rows
+        finally:
+            self.lock.release()
+
+    def choose(self, strategy, reason):
+        """
+            Records the copy strategy (skip, invalid, incremental or full) and the reason for it.
+        """
+        self.strategy = strategy
+        self.reason = reason
+
+    def merge(self, other):
+        """
+            Adds the stages of other metrics of the same table, the strategy of other wins if set.
+        """
+        for stage, totals in other.stages.items():
+            self.record(stage, totals['seconds'], totals['bytes'], totals['rows'])
+        if other.strategy is not None:
+            self.choose(other.strategy, other.reason)
+
+    def to_dict(self):
+        """
+            returns -- the metrics as a dict that can be stored as JSON, with the rows and bytes per
+                       second of every stage
+        """
+        stages = dict()
+        for stage, totals in self.stages.items():
+            stages[stage] = dict(totals)
+            for measure in ('rows', 'bytes'):
+                stages[stage]['%s_per_second' % measure] = None
+                if totals[measure] is not None and totals['seconds'] > 0:
+                    stages[stage]['%s_per_second' % measure] = totals[measure] / totals['seconds']
+        return { 'table' : self.table, 'strategy' : self.strategy, 'reason' : self.reason, 'result' : self.result, \
+                 'seconds' : sum(totals['seconds'] for totals in self.stages.values()), 'stages' : stages }
+
+# the metrics of the table the current thread is working on
+current = threading.local()
+
+def activate(table_metrics):
+    """
+        Makes the metrics of a table the ones the current thread records into.
+
+        returns -- table_metrics
+    """
+    current.metrics = table_metrics
+    return table_metrics
+
+def deactivate():
+    current.metrics = None
+
+def record(stage, started, bytes=None, rows=None):
+    """
+        Records a stage that started at the specified time and ends now into the metrics of the
+        current thread, if any.
+
+        Keyword arguments:
+            stage -- name of the stage
+            started -- the time.time() the stage started at
+            bytes -- the bytes the stage went through (defaults to None, unknown)
+            rows -- the rows the stage went through (defaults to None, unknown)
+    """
+    table_metrics = getattr(current, 'metrics', None)
+    if table_metrics is not None:
+        table_metrics.record(stage, time.time() - started, bytes, rows)
+
+def choose(strategy, reason):
+    """
+        Records the copy strategy into the metrics of the current thread, if any.
+    """
+    table_metrics = getattr(current, 'metrics', None)
+    if table_metrics is not None:
+        table_metrics.choose(strategy, reason)
+
+def write_json_lines(filename, run, all_metrics):
+    """
+        Appends the metrics of every table of a run to a JSON lines file, one line per table.
+
+        Keyword arguments:
+            filename -- path of the file
+            run -- a dict describing the run (such as its start time and hosts), added to every line
+            all_metrics -- a list of TableMetrics
+    """
+    f = open(filename, 'a')
+    try:
+        for table_metrics in all_metrics:
+            line = table_metrics.to_dict()
+            line.update(run)
+            f.write(json.dumps(line, sort_keys=True) + '\n')
+    finally:
+        f.close()
+
+def format_prometheus(all_metrics):
+    """
+        returns -- the metrics of every table in the Prometheus text exposition format
+    """
+    lines = []
+    for name, kind, help in (('pydbcopy_stage_seconds', 'gauge', 'Wall time of a stage of the copy of a table'),
+                             ('pydbcopy_stage_bytes', 'gauge', 'Bytes a stage of the copy of a table went through'),
+                             ('pydbcopy_stage_rows', 'gauge', 'Rows a stage of the copy of a table went through')):
+        lines.append("# HELP %s %s" % (name, help))
+        lines.append("# TYPE %s %s" % (name, kind))
+        measure = name[len('pydbcopy_stage_'):]
+        for table_metrics in all_metrics:
+            for stage, totals in sorted(table_metrics.stages.items()):
+                if totals[measure] is not None:
+                    lines.append('%s{table="%s",stage="%s"} %s' % (name, table_metrics.table, stage, totals[measure]))
+    lines.append("# HELP pydbcopy_table_result Result code of the copy of a table, by strategy")
+    lines.append("# TYPE pydbcopy_table_result gauge")
+    for table_metrics in all_metrics:
+        if table_metrics.result is not None:
+            lines.append('pydbcopy_table_result{table="%s",strategy="%s"} %d' % \
+                         (table_metrics.table, table_metrics.strategy or '', table_metrics.result))
+    return '\n'.join(lines) + '\n'
+
+def write_prometheus(filename, all_metrics):
+    """
+        Writes the metrics to a Prometheus textfile (for the node exporter textfile collector),
+        atomically so the collector never reads a partial file.
+    """
+    temp_filename = "%s.%d" % (filename, os.getpid())
+    f = open(temp_filename, 'w')
+    try:
+        f.write(format_prometheus(all_metrics))
+    finally:
+        f.close()
+    os.rename(temp_filename, filename)
+
+def format_statsd(all_metrics, prefix='pydbcopy'):
+    """
+        returns -- a list of StatsD lines of the metrics: a timer per stage and gauges of its
+                   bytes and rows
+    """
+    lines = []
+    for table_metrics in all_metrics:
+        for stage, totals in sorted(table_metrics.stages.items()):
+            name = "%s.%s.%s" % (prefix, table_metrics.table, stage)
+            lines.append("%s.seconds:%d|ms" % (name, totals['seconds'] * 1000))
+            for measure in ('bytes', 'rows'):
+                if totals[measure] is not None:
+                    lines.append("%s.%s:%d|g" % (name, measure, totals[measure]))
+    return lines
+
+def send_statsd(address, lines):
+    """
+        Sends StatsD lines over UDP, as many per packet as fit in a safe datagram size. A failure
+        is only logged.
+
+        Keyword arguments:
+            address -- host:port of the StatsD server
+            lines -- see format_statsd
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        host, port = address.rsplit(':', 1)
+        packet = []
+        for line in lines + [None]:
+            if packet and (line is None or len('\n'.join(packet + [line])) > 1432):
+                sock.sendto('\n'.join(packet), (host, int(port)))
+                packet = []
+            if line is not None:
+                packet.append(line)
+    except (socket.error, ValueError):
+        logger.warn("Unable to send metrics to StatsD at %s" % address, exc_info=1)
+    finally:
+        sock.close()
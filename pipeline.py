@@ -0,0 +1,168 @@
+"""
+  A staged pipeline that runs each stage of a copy (for example export, transfer and load) in
+  its own bounded pool of worker threads so that the stages of different tables overlap.
+"""
+import sys
+import time
+import threading
+import Queue
+import multiprocessing
+
+logger = multiprocessing.get_logger()
+
+# put on a stage's queue to stop one of its workers
+STOP = object()
+
+class Stage(object):
+    """
+        A single stage of a StagedPipeline. The function is called with each job that reaches the
+        stage and returns a list of jobs for the next stage, an empty list (or None) if the job
+        is finished. Jobs returned by the last stage are finished.
+    """
+    def __init__(self, name, function, workers, queue_size=0):
+        """
+            Keyword arguments:
+                name -- name of the stage used when reporting
+                function -- callable taking a job and returning a list of jobs for the next stage
+                workers -- the number of threads working on this stage
+                queue_size -- the maximum number of jobs waiting for this stage, once the queue is
+                              full the previous stage blocks (defaults to 0, unbounded)
+        """
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.queue = Queue.Queue(queue_size)
+        self.max_depth = 0
+        self.total_depth = 0
+        self.samples = 0
+
+    def sample(self):
+        depth = self.queue.qsize()
+        self.max_depth = max(self.max_depth, depth)
+        self.total_depth += depth
+        self.samples += 1
+        return depth
+
+class StagedPipeline(object):
+    """
+        Runs jobs through a sequence of Stages, each with its own pool of worker threads. While
+        one job is in a later stage the workers of the earlier stages are already busy with the
+        next jobs. The queue depth of every stage is reported periodically and summarized when
+        the pipeline is done: a stage whose queue keeps filling up is the bottleneck and should
+        get more workers, a stage whose queue stays empty can do with fewer.
+
+        A job that raises an exception in any stage is finished with its error attribute set to
+        the exception.
+    """
+    def __init__(self, stages, report_interval=60, on_finish=None):
+        """
+            Keyword arguments:
+                stages -- list of Stages in the order jobs go through them
+                report_interval -- seconds between queue depth reports, 0 to only report the
+                                   summary (defaults to 60)
+                on_finish -- callable taking each job once it is finished, in whichever stage and
+                             however it finished, on the thread of that stage (defaults to None)
+        """
+        self.stages = stages
+        self.report_interval = report_interval
+        self.on_finish = on_finish
+        self.finished = []
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+
+    def run(self, jobs):
+        """
+            Runs the specified jobs through every stage of the pipeline and waits for all of them
+            (and any jobs they lead to) to finish.
+
+            Keyword arguments:
+                jobs -- an iterable of jobs for the first stage
+
+            returns -- a list of the finished jobs
+        """
+        threads = []
+        for index, stage in enumerate(self.stages):
+            for i in range(stage.workers):
+                thread = threading.Thread(target=self.__work, args=(index,), name="%s-%d" % (stage.name, i + 1))
+                thread.daemon = True
+                thread.start()
+                threads.append(thread)
+
+        monitor = threading.Thread(target=self.__monitor, name="pipeline-monitor")
+        monitor.daemon = True
+        monitor.start()
+
+        for job in jobs:
+            self.stages[0].queue.put(job)
+
+        # every job is handed to the next stage before it is marked done in the previous one
+        for stage in self.stages:
+            stage.queue.join()
+
+        for stage in self.stages:
+            for i in range(stage.workers):
+                stage.queue.put(STOP)
+        for thread in threads:
+            thread.join()
+
+        self.done.set()
+        monitor.join()
+        self.report_summary()
+        return self.finished
+
+    def __work(self, index):
+        stage = self.stages[index]
+        while True:
+            job = stage.queue.get()
+            if job is STOP:
+                stage.queue.task_done()
+                return
+
+            try:
+                next_jobs = stage.function(job) or []
+            except:
+                logger.error("Pipeline stage %s failed for %s" % (stage.name, job), exc_info=1)
+                job.error = sys.exc_info()[1]
+                next_jobs = []
+                self.__finish([job])
+            else:
+                if index + 1 == len(self.stages):
+                    self.__finish(next_jobs)
+                elif len(next_jobs) == 0:
+                    self.__finish([job])
+                else:
+                    for next_job in next_jobs:
+                        self.stages[index + 1].queue.put(next_job)
+            stage.queue.task_done()
+
+    def __finish(self, jobs):
+        if self.on_finish is not None:
+            for job in jobs:
+                try:
+                    self.on_finish(job)
+                except:
+                    logger.error("Finishing %s failed" % job, exc_info=1)
+                    job.error = sys.exc_info()[1]
+        self.lock.acquire()
+        try:
+            self.finished.extend(jobs)
+        finally:
+            self.lock.release()
+
+    def __monitor(self):
+        last_report = time.time()
+        while not self.done.wait(1):
+            depths = [stage.sample() for stage in self.stages]
+            if self.report_interval and time.time() - last_report >= self.report_interval:
+                logger.info("Pipeline queue depth: %s" % \
+                            ", ".join("%s=%d" % (stage.name, depth) for stage, depth in zip(self.stages, depths)))
+                last_report = time.time()
+
+    def report_summary(self):
+        """
+            Logs the number of workers and the maximum and average queue depth of every stage.
+        """
+        for stage in self.stages:
+            average = float(stage.total_depth) / stage.samples if stage.samples else 0.0
+            logger.info("Pipeline stage %s: %d workers, max queue depth %d, average queue depth %.1f" % \
+                        (stage.name, stage.workers, stage.max_depth, average))
@@ -1,11 +1,30 @@
 from optparse import OptionParser
 from config import settings
-from dbutils import MySQLHost
+from dbutils import MySQLHost, delete_strategies
+from pipeline import StagedPipeline, Stage
+import scheduler
+import hashdiff
+import watermark
+import cdc
+import changedetect
+import connpool
+import counts
+import transport
+import delta
+import checkpoint
+import spool
+import fanout
+import metrics
+import streaming
 import re
 import sys
 import os
 import stat
+import time
+import threading
 import multiprocessing
+import multiprocessing.pool
+import Queue
 import logging
 
 logger = multiprocessing.get_logger()
@@ -49,8 +68,35 @@ def main(argv=None):
     if options.force_full is not None: settings.force_full = options.force_full 
     if options.no_last_mod_check is not None: settings.no_last_mod_check = options.no_last_mod_check 
     if options.debug is not None: settings.debug = options.debug 
+    if options.chunks is not None: settings.chunks = options.chunks 
+    if options.chunk_min_rows is not None: settings.chunk_min_rows = options.chunk_min_rows 
+    if options.copy_method is not None: settings.copy_method = options.copy_method 
+    if options.pipeline is not None: settings.pipeline = options.pipeline 
+    if options.no_schedule is not None: settings.schedule_longest_first = not options.no_schedule 
+    if options.diff_method is not None: settings.diff_method = options.diff_method 
+    if options.delete_strategy is not None: settings.delete_strategy = options.delete_strategy 
+    if options.shadow_load is not None: settings.shadow_load = options.shadow_load 
+    if options.bulk_load is not None: settings.bulk_load = options.bulk_load 
+    if options.bulk_load_skip_binlog is not None: settings.bulk_load_skip_binlog = options.bulk_load_skip_binlog 
+    if options.bulk_load_defer_keys is not None: settings.bulk_load_defer_keys = options.bulk_load_defer_keys 
+    if options.export_ordered is not None: settings.export_ordered = options.export_ordered 
+    if options.watermark_copy is not None: settings.watermark_copy = options.watermark_copy 
+    if options.reconcile is not None: settings.reconcile = options.reconcile 
+    if options.cdc is not None: settings.cdc = options.cdc 
+    if options.no_change_detection is not None: settings.change_detection = not options.no_change_detection 
+    if options.no_catalog_cache is not None: settings.catalog_cache = not options.no_catalog_cache 
+    if options.count_strategy is not None: settings.count_strategy = options.count_strategy 
+    if options.transfer_method is not None: settings.transfer_method = options.transfer_method 
+    if options.delta_transfer is not None: settings.delta_transfer = options.delta_transfer 
+    if options.resume is not None: settings.resume = options.resume 
+    if options.dump_spool is not None: settings.dump_spool = options.dump_spool 
+    if options.concurrent_verify is not None: settings.concurrent_verify = options.concurrent_verify 
+    if options.metrics_file is not None: settings.metrics_file = options.metrics_file 
+    if options.connection_pool_size is not None and options.connection_pool_size != '':
+        settings.connection_pool_size = int(options.connection_pool_size)
 
     if options.tables is not None: settings.tables = options.tables.split()
+    if options.targets is not None: settings.targets = options.targets.split()
     if options.tables_to_skip_verification is not None: settings.tables_to_skip_verification = options.tables_to_skip_verification.split()
 
     if options.num_processes is not None and options.num_processes != '':
@@ -93,17 +139,135 @@ def main(argv=None):
     logger.addHandler(ch)
     logger.setLevel(logging.DEBUG if settings.verbosity else logging.INFO)
         
-    if not settings.debug and settings.num_processes > 1:
-        pool = multiprocessing.Pool(settings.num_processes)
-        result_list = pool.map(verify_and_copy_table, settings.tables, 1)
+    if settings.cdc:
+        return run_change_capture(settings.tables)
+    
+    run_started = time.time()
+    tables = schedule_tables(settings.tables)
+    
+    if settings.catalog_cache:
+        prefetch_catalog(tables)
+    
+    if settings.targets:
+        results = copy_tables_fanout(tables)
+        report_metrics(tables, results, run_started)
+        return report_results(results)
+    
+    # the source fingerprints are taken before copying, changes made while copying show up in 
+    # the next run. A resumed copy holds rows loaded by an earlier run, its tables get no 
+    # fingerprints for the next run to check them again.
+    source_fingerprints = dict()
+    resumable_tables = set()
+    if settings.change_detection:
+        stored_fingerprints.update(changedetect.load_fingerprints(get_fingerprint_file(), get_fingerprint_prefix()))
+        source_fingerprints = take_fingerprints(MySQLHost(settings.source_host, settings.source_user, \
+                                                          settings.source_password, settings.source_database), tables)
+        resumable_tables = set(table for table in tables if has_resumable_checkpoint(table))
+    
+    # the tables found not to need a copy are left out, the others are not verified again
+    results = dict()
+    if settings.concurrent_verify:
+        results = verify_tables(tables)
+    tables_to_copy = [table for table in tables if table not in results]
+    
+    durations = dict()
+    if settings.pipeline and settings.copy_method != 'stream':
+        results.update(copy_tables_pipelined(tables_to_copy))
+    elif not settings.debug and settings.num_processes > 1 and tables_to_copy:
+        pool = multiprocessing.Pool(settings.num_processes, init_worker)
+        copy_results, durations = copy_tables(pool, tables_to_copy)
+        results.update(copy_results)
     else:
-        result_list = map(verify_and_copy_table, settings.tables)
+        for table in tables_to_copy:
+            started = time.time()
+            results[table] = verify_and_copy_table(table)
+            durations[table] = time.time() - started
+    
+    # only the durations of actual copies say anything about the next run
+    scheduler.save_history(get_history_file(), get_history_prefix(), \
+                           dict((table, seconds) for table, seconds in durations.items() if results[table] == 0))
+    
+    if settings.change_detection:
+        target_fingerprints = take_fingerprints(MySQLHost(settings.target_host, settings.target_user, \
+                                                          settings.target_password, settings.target_database), tables)
+        changedetect.save_fingerprints(get_fingerprint_file(), get_fingerprint_prefix(), \
+                                       dict((table, { 'source' : source_fingerprints[table], 'target' : target_fingerprints[table] }) \
+                                            for table in tables if results[table] in (0, 1) \
+                                            and table not in resumable_tables \
+                                            and table in source_fingerprints and table in target_fingerprints))
+    
+    # a table copied (or found unchanged) by any means has nothing left to resume
+    if os.path.isfile(get_checkpoint_manifest().filename):
+        get_checkpoint_manifest().clear_tables([table for table in tables if results[table] in (0, 1)])
+    
+    report_metrics(tables, results, run_started)
+    return report_results(results)
+
+# the metrics of the tables of the run, merged from every worker process and thread (see 
+# collect_metrics)
+run_metrics = dict()
+run_metrics_lock = threading.Lock()
+
+def collect_metrics(table_metrics):
+    """
+        Merges the metrics of (part of) the copy of a table into the metrics of the run.
+    """
+    if table_metrics is None:
+        return
+    run_metrics_lock.acquire()
+    try:
+        if table_metrics.table in run_metrics:
+            run_metrics[table_metrics.table].merge(table_metrics)
+        else:
+            run_metrics[table_metrics.table] = table_metrics
+    finally:
+        run_metrics_lock.release()
+
+def report_metrics(tables, results, run_started):
+    """
+        Writes the metrics of every table of the run (see metrics) to the metrics file as JSON 
+        lines, to the Prometheus textfile and to StatsD, each if configured. A failure to write 
+        them is only logged.
+        
+        Keyword arguments:
+            tables -- list of String names of the tables of the run
+            results -- a dict of table name to result code (see verify_and_copy_table)
+            run_started -- the time the run started at
+    """
+    all_metrics = []
+    for table in tables:
+        table_metrics = run_metrics.setdefault(table, metrics.TableMetrics(table))
+        table_metrics.result = results[table]
+        all_metrics.append(table_metrics)
     
+    run = { 'run_started' : run_started, 'run_seconds' : time.time() - run_started, \
+            'source' : "%s/%s" % (settings.source_host, settings.source_database), \
+            'target' : ' '.join(settings.targets) or "%s/%s" % (settings.target_host, settings.target_database) }
+    try:
+        if settings.metrics_file:
+            metrics.write_json_lines(settings.metrics_file, run, all_metrics)
+        if settings.metrics_prometheus_file:
+            metrics.write_prometheus(settings.metrics_prometheus_file, all_metrics)
+    except (IOError, OSError):
+        logger.warn("Unable to write the metrics of the run", exc_info=1)
+    if settings.metrics_statsd:
+        metrics.send_statsd(settings.metrics_statsd, metrics.format_statsd(all_metrics))
+
+def report_results(results):
+    """
+        Logs the summary of a run: the tables skipped, copied, invalid and failed.
+        
+        Keyword arguments:
+            results -- a dict of table name to result code (see verify_and_copy_table)
+               
+        returns -- the exit status of the run, -1 if any table is invalid or failed
+    """
     failed_tables = set()
     invalid_tables = set()
     skipped_tables = set()
     copied_tables = set()
-    for result, table in map(None, result_list, settings.tables):
+    for table in settings.tables:
+        result = results[table]
         if result == 1:
             skipped_tables.add(table)
         elif result == -1:
@@ -113,8 +277,12 @@ def main(argv=None):
         else:
             copied_tables.add(table)
     
-    logger.info('Summary for copy from source database %s on %s to target database %s on %s:' % \
-                (settings.source_database, settings.source_host, settings.target_database, settings.target_host))
+    if settings.targets:
+        target = "targets %s" % ', '.join(settings.targets)
+    else:
+        target = "target database %s on %s" % (settings.target_database, settings.target_host)
+    logger.info('Summary for copy from source database %s on %s to %s:' % \
+                (settings.source_database, settings.source_host, target))
     logger.info('--------------------------------------')
     if len(skipped_tables) > 0:
         logger.info(' Skipped: %s' % ', '.join(skipped_tables))
@@ -126,182 +294,1689 @@ def main(argv=None):
         logger.error(' Failed: %s' % ', '.join(failed_tables))
     logger.info('--------------------------------------')
     
-    if len(invalid_tables) > 0 or len(failed_tables) > 0:
-        return -1
+    if len(invalid_tables) > 0 or len(failed_tables) > 0:
+        return -1
+    
+    return 0
+
+def run_change_capture(tables):
+    """
+        Keeps the specified tables in sync by tailing the binary log of the source (see cdc). On the
+        first run, with no saved position, the current binary log position of the source is taken 
+        and every table is given a full copy as the initial snapshot; changes are then applied from
+        that position on. Rows changed during the snapshot are applied again, which is harmless. The
+        position is saved after every batch so a restarted change capture resumes where it stopped.
+        
+        Keyword arguments:
+            tables -- list of String names of the tables to capture
+               
+        returns -- 0 once a non blocking capture is caught up, 1 if the capture can not start
+    """
+    if cdc.BinLogStreamReader is None:
+        logger.error("Change capture needs the python-mysql-replication package")
+        return 1
+    
+    source_host = MySQLHost(settings.source_host, settings.source_user, \
+                            settings.source_password, settings.source_database)
+    dest_host = MySQLHost(settings.target_host, settings.target_user, \
+                          settings.target_password, settings.target_database)
+    
+    position_file = get_cdc_position_file()
+    position = cdc.load_position(position_file)
+    if position is None:
+        position = source_host.get_master_status()
+        if position is None:
+            logger.error("Binary logging is off on %s, changes can not be captured" % settings.source_host)
+            return 1
+        logger.info("Taking the initial snapshot at %s:%d" % position)
+        for table in tables:
+            if not perform_full_copy(table, source_host, dest_host, settings.scp_user, settings.dump_dir):
+                logger.error("Failed snapshot of table %s" % table)
+                return 1
+        cdc.save_position(position_file, position)
+    
+    logger.info("Capturing changes of %s from %s:%d" % (', '.join(tables), position[0], position[1]))
+    connection_settings = { 'host' : settings.source_host, 'port' : 3306, \
+                            'user' : settings.source_user, 'passwd' : settings.source_password }
+    stream = cdc.open_binlog_stream(connection_settings, settings.cdc_server_id, settings.source_database, tables, \
+                                    position, settings.cdc_blocking, settings.cdc_batch_seconds)
+    try:
+        cdc.apply_changes(stream, cdc.ChangeApplier(dest_host), position_file, \
+                          settings.cdc_batch_rows, settings.cdc_batch_seconds)
+    finally:
+        stream.close()
+    return 0
+
+def get_cdc_position_file():
+    """
+        returns -- the path of the file the change capture position is kept in (see cdc)
+    """
+    return settings.cdc_position_file or os.path.join(settings.dump_dir, 'pydbcopy_cdc_position.json')
+
+def schedule_tables(tables):
+    """
+        Orders the tables to copy longest-processing-time first (see scheduler.order_longest_first)
+        using their sizes in information_schema on the source and the durations of their previous
+        copies. Unless scheduling is turned off, in which case the configured order is kept.
+        
+        Keyword arguments:
+            tables -- list of String names of the tables to copy
+               
+        returns -- a list of the String names of the tables in the order to copy them
+    """
+    if not settings.schedule_longest_first:
+        return tables
+    
+    try:
+        source_host = MySQLHost(settings.source_host, settings.source_user, \
+                                settings.source_password, settings.source_database)
+        sizes = source_host.get_table_sizes(tables)
+    except:
+        logger.warn("Unable to get table sizes from %s, tables will be copied in the configured order" % \
+                    settings.source_host, exc_info=1)
+        return tables
+    
+    history = scheduler.load_history(get_history_file(), get_history_prefix())
+    ordered_tables = scheduler.order_longest_first(tables, sizes, history)
+    logger.debug("Copying tables longest first: %s" % ', '.join(ordered_tables))
+    return ordered_tables
+
+def prefetch_catalog(tables):
+    """
+        Fetches the metadata of the specified tables on the source and the target into the catalog 
+        (see catalog) before any worker is started, so every worker inherits it. A host the metadata
+        can not be fetched from is simply queried table by table.
+        
+        Keyword arguments:
+            tables -- list of String names of the tables to copy
+    """
+    for host, user, password, database in get_connect_args().values():
+        try:
+            found = MySQLHost(host, user, password, database).prefetch_catalog(tables)
+            logger.debug("Prefetched the metadata of %d of %d tables on %s" % (found, len(tables), host))
+        except:
+            logger.warn("Unable to prefetch the metadata of the tables on %s" % host, exc_info=1)
+
+def get_history_file():
+    """
+        returns -- the path of the file the durations of copies are kept in (see scheduler)
+    """
+    if settings.history_file:
+        return settings.history_file
+    return os.path.join(settings.dump_dir, 'pydbcopy_history.json')
+
+def get_history_prefix():
+    """
+        returns -- the prefix the durations of copies from the configured source are kept under
+    """
+    return "%s/%s/" % (settings.source_host, settings.source_database)
+
+def copy_tables(pool, tables):
+    """
+        Copies the specified tables using the specified multi-processing pool. Tables are handed
+        to the workers one at a time as they free up, in the order given (see schedule_tables).
+        When a table is split into primary key ranges for a chunked full copy (see 
+        plan_table_chunks) its chunks are handed out before the tables left, so a single large
+        table can be copied by every worker at once. No more tasks than workers are queued on the
+        pool, so the chunks do not wait behind the tables queued before them.
+        
+        Keyword arguments:
+            pool -- multiprocessing.Pool of settings.num_processes workers to copy the tables with
+            tables -- list of String names of the tables to copy
+               
+        returns -- a tuple of a dict of table name to result code (see verify_and_copy_table) and
+                   a dict of table name to the seconds spent copying it (summed over its chunks)
+    """
+    results = dict()
+    durations = dict()
+    table_chunks = dict()
+    chunks_left = dict()
+    tables_left = list(tables)
+    chunks_to_copy = []
+    running = []
+    done = Queue.Queue()
+    
+    def submit(work, item):
+        return pool.apply_async(work, (item,), callback=lambda task_result: done.put((work, task_result)))
+    
+    while True:
+        # a task that raised has no callback, its exception is raised here
+        for async_result in running:
+            if async_result.ready() and not async_result.successful():
+                async_result.get()
+        running = [async_result for async_result in running if not async_result.ready()]
+        while len(running) < settings.num_processes and (chunks_to_copy or tables_left):
+            if chunks_to_copy:
+                running.append(submit(copy_table_chunk, chunks_to_copy.pop(0)))
+            else:
+                running.append(submit(verify_and_plan_table, tables_left.pop(0)))
+        if not running and done.empty():
+            break
+        try:
+            work, task_result = done.get(True, 1)
+        except Queue.Empty:
+            continue
+        
+        collect_metrics(task_result.metrics)
+        table = task_result.table
+        if work is verify_and_plan_table:
+            results[table] = task_result.result
+            durations[table] = task_result.elapsed
+            table_chunks[table] = task_result.chunks
+            chunks_left[table] = len(task_result.chunks or [])
+            chunks_to_copy.extend(task_result.chunks or [])
+            continue
+        
+        results[table] = min(results[table], task_result.result)
+        durations[table] += task_result.elapsed
+        chunks_left[table] -= 1
+        if chunks_left[table] == 0:
+            if not finish_chunked_copy(table_chunks[table], results[table] == 0):
+                results[table] = min(results[table], -3)
+            if results[table] == 0:
+                logger.info("Successful chunked full copy of table %s" % table)
+            else:
+                logger.error("Failed chunked full copy of table %s" % table)
+    
+    pool.close()
+    pool.join()
+    return results, durations
+
+def get_connect_args():
+    """
+        returns -- a dict of connection pool role to the (host, user, password, database) tuple to
+                   connect with: the source and the target, or the source and every target of a
+                   fan-out copy (see get_fanout_targets)
+    """
+    connect_args = { 'source' : (settings.source_host, settings.source_user, settings.source_password, settings.source_database) }
+    if settings.targets:
+        for role, host, database in get_fanout_targets():
+            connect_args[role] = (host, settings.target_user, settings.target_password, database)
+    else:
+        connect_args['target'] = (settings.target_host, settings.target_user, settings.target_password, settings.target_database)
+    return connect_args
+
+def get_connection_pool():
+    """
+        returns -- the connection pool of the current process (see connpool)
+    """
+    return connpool.get_pool(get_connect_args(), settings.connection_pool_size)
+
+def init_worker():
+    """
+        Initializer of the workers of the multi-processing pool: opens the connection pool of the 
+        worker along with a first connection to each host, reused by every table the worker copies.
+        A host that can not be reached yet is connected to when a table needs it.
+    """
+    connections = get_connection_pool()
+    for role in get_connect_args():
+        try:
+            connections.checkin(role, connections.checkout(role))
+        except:
+            logger.warn("Unable to open a %s connection for worker %s" % (role, os.getpid()), exc_info=1)
+
+def verify_and_copy_table(table):
+    """
+        This routine verifies the specified table's row count on the source is within a certain 
+        configurable threshold and if it is copies it to the local database. If the tables schema
+        on the source and target are equal and the source has not been moddified more recently
+        than the target then the copy is skipped. An incremental copy is attempted and if failed 
+        then a full copy is attempted.
+        
+        This is the main routine that the set of tables is mapped through by the multi-processing 
+        pool. This routine returns the following codes:
+        
+         0 = successful copy
+         1 = skipped copying table due to no change detected.
+        -1 = failed validity check, source row count is too different than target
+        
+        Any other return value is an unknown failure.
+    """
+    table_result = verify_and_plan_table(table)
+    collect_metrics(table_result.metrics)
+    if table_result.chunks:
+        chunk_results = map(copy_table_chunk, table_result.chunks)
+        for chunk_result in chunk_results:
+            collect_metrics(chunk_result.metrics)
+        table_result.result = min(chunk_result.result for chunk_result in chunk_results)
+        if not finish_chunked_copy(table_result.chunks, table_result.result == 0):
+            table_result.result = -3
+    return table_result.result
+
+class TableResult(object):
+    """
+        The outcome of verify_and_plan_table for a single table (or of copy_table_chunk for a 
+        chunk of it). The result is one of the codes described in verify_and_copy_table. If a
+        chunked full copy was prepared then chunks holds the TableChunks still to be copied and 
+        the table is only copied once they all succeed. Elapsed is the number of seconds since 
+        started, if given. Metrics are the metrics.TableMetrics of the work, handed back to main.
+    """
+    def __init__(self, table, result, chunks=None, started=None, table_metrics=None):
+        self.table = table
+        self.result = result
+        self.chunks = chunks
+        self.elapsed = time.time() - started if started is not None else 0.0
+        self.metrics = table_metrics
+
+def verify_and_plan_table(table):
+    """
+        Does the work of verify_and_copy_table except that a full copy of a table large enough to
+        be chunked (see plan_table_chunks) is only prepared: the target table is truncated and the 
+        chunks are returned to the caller to be copied with copy_table_chunk.
+        
+        Keyword arguments:
+            table -- String name of the table to copy
+               
+        returns -- a TableResult
+    """
+    started = time.time()
+    logging.getLogger('PyDBCopy')
+    
+    # check out DB connections to both source and target DB
+    connections = get_connection_pool()
+    source_host = connections.checkout('source')
+    try:
+        dest_host = connections.checkout('target')
+        table_metrics = metrics.activate(metrics.TableMetrics(table))
+        try:
+            table_result = plan_table(table, source_host, dest_host, started)
+            table_result.metrics = table_metrics
+            return table_result
+        finally:
+            metrics.deactivate()
+            connections.checkin('target', dest_host)
+    finally:
+        connections.checkin('source', source_host)
+
+def plan_table(table, source_host, dest_host, started):
+    """
+        Does the work of verify_and_plan_table with connections checked out of the pool.
+        
+        Keyword arguments:
+            table -- String name of the table to copy
+            source_host -- MySQLHost source host
+            dest_host -- MySQLHost destination host
+            started -- the time the table was started on
+               
+        returns -- a TableResult
+    """
+    result = verify_table(table, source_host, dest_host)
+    if result is None:
+        copied = False
+        try:
+            if not settings.force_full and not has_resumable_checkpoint(table):
+                logger.info("Starting incremental copy of table %s from %s(%s) to %s(%s)" % \
+                       (table, source_host.database, source_host.host, dest_host.database, dest_host.host))
+                copied = perform_incremental_copy(table, source_host, dest_host, settings.scp_user, settings.dump_dir) or \
+                         perform_watermark_copy(table, source_host, dest_host, settings.scp_user, settings.dump_dir)
+                if copied:
+                    logger.info("Successful incremental copy of table %s" % table)
+                else:
+                    logger.warn("Failed incremental copy of table %s" % table)
+                    
+            if not copied:
+                logger.info("Starting full copy of table %s from %s(%s) to %s(%s)" % \
+                       (table, source_host.database, source_host.host, dest_host.database, dest_host.host))
+                choose_full_copy(table)
+                chunks = prepare_chunked_full_copy(table, source_host, dest_host)
+                if chunks:
+                    logger.info("Split full copy of table %s into %d chunks" % (table, len(chunks)))
+                    return TableResult(table, 0, chunks, started)
+                copied = perform_full_copy(table, source_host, dest_host, settings.scp_user, settings.dump_dir)
+                if copied:
+                    logger.info("Successful full copy of table %s" % table)
+                else:
+                    logger.error("Failed full copy of table %s" % table)
+        except:
+            logger.error("Failed copy of table %s", table, exc_info=1)
+                
+        if not copied:
+            return TableResult(table, -3, started=started)
+    else:
+        return TableResult(table, result, started=started)
+    return TableResult(table, 0, started=started)
+
+# tables verified by verify_tables before the copy started, they are not verified again
+verified_tables = set()
+
+def verify_tables(tables):
+    """
+        Verifies all the specified tables up front (see verify_table), with verify_workers threads
+        of the main process each on its own connections (see get_thread_hosts). The metadata round
+        trips of the validity checks, schema comparisons and change detection of many tables then
+        overlap, instead of each table holding a worker process while it waits on them. Only the 
+        tables that need a copy are handed to the workers afterwards, without verifying them again.
+        A table that can not be verified up front is left to be verified when it is copied.
+        
+        Keyword arguments:
+            tables -- list of String names of the tables to verify
+               
+        returns -- a dict of table name to result code of the tables that are not to be copied
+                   (-1 = failed validity check, 1 = skipped, see verify_and_copy_table)
+    """
+    def verify(table):
+        table_metrics = metrics.activate(metrics.TableMetrics(table))
+        try:
+            source_host, dest_host = get_thread_hosts()
+            return table, verify_table(table, source_host, dest_host)
+        except:
+            logger.warn("Unable to verify table %s up front, it will be verified when copied" % table, exc_info=1)
+            return table, False
+        finally:
+            metrics.deactivate()
+            collect_metrics(table_metrics)
+    
+    started = time.time()
+    results = dict()
+    pool = multiprocessing.pool.ThreadPool(settings.verify_workers)
+    try:
+        for table, result in pool.imap_unordered(verify, tables):
+            if result is None:
+                verified_tables.add(table)
+            elif result is not False:
+                results[table] = result
+    finally:
+        pool.close()
+        pool.join()
+    logger.info("Verified %d tables in %.1f seconds, %d to copy" % \
+                (len(tables), time.time() - started, len(tables) - len(results)))
+    return results
+
+def choose_full_copy(table):
+    """
+        Records the full copy strategy in the metrics of the table, with the reason an 
+        incremental copy was not done unless one was already recorded.
+    """
+    table_metrics = getattr(metrics.current, 'metrics', None)
+    if settings.force_full:
+        metrics.choose('full', 'forced')
+    elif has_resumable_checkpoint(table):
+        metrics.choose('full', 'resumed from its checkpoint')
+    elif table_metrics is None or table_metrics.strategy != 'full':
+        metrics.choose('full', 'no incremental copy possible')
+
+def verify_table(table, source_host, dest_host, dest_role='target'):
+    """
+        Decides whether the specified table needs to be copied: the source row count must pass the
+        validity check (unless the table is to skip verification) and the copy is skipped if the 
+        schemas on the source and target are equal and the source has not been modified more 
+        recently than the target.
+        
+        Keyword arguments:
+            table -- String name of the table to check
+            source_host -- MySQLHost source host
+            dest_host -- MySQLHost destination host
+            dest_role -- the connection pool role of the destination host (defaults to target)
+               
+        returns -- None if the table needs to be copied, otherwise the result code for the table
+                   (-1 = failed validity check, 1 = skipped, see verify_and_copy_table)
+    """
+    if table in verified_tables:
+        return None
+    started = time.time()
+    try:
+        if table not in settings.tables_to_skip_verification:
+            if not perform_validity_check(table, source_host, dest_host, settings.verify_threshold, settings.count_strategy, dest_role):
+                metrics.choose('invalid', 'failed the validity check')
+                return -1
+        if settings.no_last_mod_check \
+           or not dest_host.table_exists(table) \
+           or not schema_compare(table, source_host, dest_host, True) \
+           or not is_table_unchanged(table, source_host, dest_host, dest_role):
+            return None
+        
+        logger.info("Skipping copying of table %s (source/dest have same row count and last mod date)" % table)
+        return 1
+    finally:
+        metrics.record('verify', started)
+
+class CopyJob(object):
+    """
+        A unit of work going through the stages of a pipelined copy (see copy_tables_pipelined):
+        a whole table, a chunk of a table or the rows of a table to add in an incremental copy.
+    """
+    def __init__(self, table, result=None, chunk=None, hash_set=None, truncate=False, shadow=None, dump_key=None, \
+                 table_metrics=None):
+        self.table = table
+        self.result = result
+        self.chunk = chunk
+        self.hash_set = hash_set
+        self.truncate = truncate
+        self.shadow = shadow if chunk is None else chunk.shadow
+        self.checkpoint = get_chunk_checkpoint(chunk) if chunk is not None else None
+        self.dump_key = dump_key
+        self.metrics = table_metrics or metrics.TableMetrics(table)
+        self.csvfilename = None
+        self.staged = False
+        self.error = None
+    
+    def spool_key(self):
+        """
+            returns -- the key the job's dump is kept under for delta transfers, None if it is not 
+                       kept (see copy_rows)
+        """
+        if self.chunk is not None:
+            return self.chunk.spool_key()
+        return self.table if self.hash_set is None else None
+    
+    def __str__(self):
+        if self.chunk is not None:
+            return str(self.chunk)
+        return "table %s" % self.table
+
+thread_hosts = threading.local()
+
+# the number of jobs still to be finished of each table of a pipelined copy that has to be 
+# finished once they are, and whether they all succeeded so far (see finish_pipeline_job)
+pending_loads = dict()
+pending_loads_lock = threading.Lock()
+
+def get_thread_hosts():
+    """
+        Gets the source and destination MySQLHosts of the current thread, connecting on first use.
+        
+        returns -- a (source_host, dest_host) tuple
+    """
+    if not hasattr(thread_hosts, 'source_host'):
+        thread_hosts.source_host = get_connection_pool().checkout('source')
+        thread_hosts.dest_host = get_connection_pool().checkout('target')
+    return thread_hosts.source_host, thread_hosts.dest_host
+
+def copy_tables_pipelined(tables):
+    """
+        Copies the specified tables with a staged pipeline (see pipeline.StagedPipeline) rather 
+        than a multi-processing pool. Each stage of a copy has its own pool of threads: planning 
+        (verification, incremental diff and deletes) and export on the source, transfer via SCP
+        and load on the target. While one table is being loaded the next is being transferred and
+        the one after that exported. Queue depths are logged so each pool can be sized for the
+        links between the hosts.
+        
+        Keyword arguments:
+            tables -- list of String names of the tables to copy
+               
+        returns -- a dict of table name to result code (see verify_and_copy_table)
+    """
+    transfer_queue_size = settings.transfer_workers * 2
+    load_queue_size = settings.load_workers * 2
+    stages = [Stage('plan', pipeline_plan, settings.export_workers),
+              Stage('export', pipeline_export, settings.export_workers, settings.export_workers * 2),
+              Stage('transfer', pipeline_transfer, settings.transfer_workers, transfer_queue_size),
+              Stage('load', pipeline_load, settings.load_workers, load_queue_size)]
+    
+    results = dict()
+    jobs = [CopyJob(table) for table in tables]
+    for job in jobs:
+        collect_metrics(job.metrics)
+    for job in StagedPipeline(stages, settings.pipeline_report_interval, finish_pipeline_job).run(jobs):
+        result = job.result if job.error is None else -3
+        results[job.table] = min(results.get(job.table, result), result)
+    
+    for table in tables:
+        if results[table] == 0:
+            logger.info("Successful copy of table %s" % table)
+        elif results[table] < -1:
+            logger.error("Failed copy of table %s" % table)
+    return results
+
+def pipeline_plan(job):
+    """
+        Plan stage of a pipelined copy: verifies the table, performs the incremental diff and 
+        deletes or prepares the target table for a (possibly chunked) full copy.
+        
+        returns -- a list of CopyJobs to export
+    """
+    metrics.activate(job.metrics)
+    source_host, dest_host = get_thread_hosts()
+    table = job.table
+    
+    job.result = verify_table(table, source_host, dest_host)
+    if job.result is not None:
+        return []
+    job.result = 0
+    
+    if not settings.force_full and not has_resumable_checkpoint(table):
+        logger.info("Starting incremental copy of table %s from %s(%s) to %s(%s)" % \
+               (table, source_host.database, source_host.host, dest_host.database, dest_host.host))
+        hash_set = plan_incremental_copy(table, source_host, dest_host)
+        if hash_set is not None:
+            if len(hash_set) == 0:
+                return []
+            return [CopyJob(table, 0, hash_set=hash_set, table_metrics=job.metrics)]
+        if perform_watermark_copy(table, source_host, dest_host, settings.scp_user, settings.dump_dir):
+            return []
+        logger.warn("Failed incremental copy of table %s" % table)
+    
+    logger.info("Starting full copy of table %s from %s(%s) to %s(%s)" % \
+           (table, source_host.database, source_host.host, dest_host.database, dest_host.host))
+    choose_full_copy(table)
+    chunks = prepare_chunked_full_copy(table, source_host, dest_host)
+    if chunks:
+        logger.info("Split full copy of table %s into %d chunks" % (table, len(chunks)))
+        jobs = [CopyJob(table, 0, chunk=chunk, table_metrics=job.metrics) for chunk in chunks]
+    else:
+        # nothing may fail between creating the shadow table and handing it to its job, which
+        # drops it if the job fails (see finish_pipeline_job)
+        dump_key = get_dump_key(table, source_host)
+        shadow = prepare_shadow_table(table, source_host, dest_host)
+        if shadow is None and not init_target_table(table, source_host, dest_host):
+            job.result = -3
+            return []
+        jobs = [CopyJob(table, 0, truncate=shadow is None, shadow=shadow, dump_key=dump_key, table_metrics=job.metrics)]
+    
+    if jobs[0].shadow is not None or (jobs[0].chunk is not None and jobs[0].chunk.deferred_keys):
+        pending_loads_lock.acquire()
+        try:
+            pending_loads[table] = [len(jobs), True]
+        finally:
+            pending_loads_lock.release()
+    return jobs
+
+def pipeline_export(job):
+    """
+        Export stage of a pipelined copy: selects the job's rows into an outfile on the source, 
+        unless the dump of the job's chunk transferred by a previous run can be reused (see 
+        checkpoint) or the dump of the table is spooled (see spool).
+    """
+    metrics.activate(job.metrics)
+    if job.checkpoint is not None:
+        job.csvfilename = job.checkpoint.staged_file()
+        if job.csvfilename is not None:
+            logger.info("Reusing the dump %s of %s transferred by a previous run" % (job.csvfilename, job))
+            job.staged = True
+            return [job]
+    if job.dump_key is not None:
+        job.csvfilename = fetch_spooled_dump(job.table, job.dump_key)
+        if job.csvfilename is not None:
+            job.staged = True
+            return [job]
+    source_host = get_thread_hosts()[0]
+    key_range = job.chunk.key_range() if job.chunk is not None else None
+    started = time.time()
+    job.csvfilename = source_host.select_into_outfile(job.table, job.hash_set, settings.dump_dir, key_range, settings.export_ordered)
+    metrics.record('export', started)
+    return [job]
+
+def pipeline_transfer(job):
+    """
+        Transfer stage of a pipelined copy: SCPs the job's outfile from the source (iff remote).
+    """
+    if job.staged:
+        return [job]
+    metrics.activate(job.metrics)
+    source_host = get_thread_hosts()[0]
+    started = time.time()
+    if not retrieve_remote_dumpfile(source_host, settings.scp_user, job.csvfilename, job.csvfilename, job.spool_key()):
+        logger.error("Error retrieving remote file %s, check ssh config and remote permissions for %s on %s" % \
+                          (job.csvfilename, settings.scp_user, source_host))
+        job.result = -3
+        return []
+    metrics.record('transfer', started, bytes=os.path.getsize(job.csvfilename))
+    if job.checkpoint is not None:
+        job.checkpoint.stage(job.csvfilename)
+    if job.dump_key is not None:
+        spool_dump(job.table, job.dump_key, job.csvfilename, source_host)
+    return [job]
+
+def pipeline_load(job):
+    """
+        Load stage of a pipelined copy: loads the job's file into the target table.
+    """
+    metrics.activate(job.metrics)
+    dest_host = get_thread_hosts()[1]
+    dest_table = job.shadow.name if job.shadow is not None else job.table
+    if job.chunk is not None and job.chunk.resumed:
+        clear_chunk_range(job.chunk, dest_host)
+    started = time.time()
+    deferred_keys = truncate_for_load(dest_table, dest_host) if job.truncate else []
+    try:
+        rows = dest_host.load_data_in_file(dest_table, job.csvfilename, session_variables=get_load_session_variables())
+    finally:
+        dest_host.add_secondary_keys(dest_table, deferred_keys)
+    metrics.record('load', started, bytes=os.path.getsize(job.csvfilename), rows=rows)
+    if job.checkpoint is not None:
+        job.checkpoint.complete(rows)
+    spool_or_remove_dumpfile(get_thread_hosts()[0], job.csvfilename, job.spool_key())
+    return [job]
+
+def finish_pipeline_job(job):
+    """
+        Called by the pipeline for every job of a pipelined copy once it is finished, whether it
+        was loaded, failed or stopped early in any stage. When the last job of a table loaded into
+        a shadow table or with deferred secondary keys is finished the table is finished like on
+        the process pool path (see finish_table_load). The job's result is set to failed if that 
+        fails.
+    """
+    if job.chunk is None and job.shadow is None:
+        return
+    pending_loads_lock.acquire()
+    try:
+        pending = pending_loads.get(job.table)
+        if pending is None:
+            return
+        pending[0] -= 1
+        pending[1] = pending[1] and job.error is None and job.result == 0
+        if pending[0] > 0:
+            return
+        del pending_loads[job.table]
+    finally:
+        pending_loads_lock.release()
+    
+    deferred_keys = job.chunk.deferred_keys if job.chunk is not None else None
+    if not finish_table_load(job.table, job.shadow, deferred_keys, pending[1], get_thread_hosts()[1], job.chunk is not None) \
+       and job.result == 0:
+        job.result = -3
+
+def get_fanout_targets():
+    """
+        returns -- a list of (role, host, database) tuples of the targets of a fan-out copy in the
+                   configured order, role being their connection pool role
+    """
+    return [('target:%s' % fanout.target_name(host, database), host, database) \
+            for host, database in fanout.parse_targets(settings.targets, settings.target_database)]
+
+def copy_tables_fanout(tables):
+    """
+        Copies the specified tables to every target of a fan-out copy (see fanout_copy_table), 
+        the tables in parallel with a multi-processing pool unless in debug mode.
+        
+        Keyword arguments:
+            tables -- list of String names of the tables to copy
+               
+        returns -- a dict of table name to the worst result code of its targets (see 
+                   verify_and_copy_table)
+    """
+    if not settings.debug and settings.num_processes > 1:
+        pool = multiprocessing.Pool(settings.num_processes, init_worker)
+        target_results = pool.map(fanout_copy_table, tables, 1)
+        pool.close()
+        pool.join()
+    else:
+        target_results = map(fanout_copy_table, tables)
+    for by_target, table_metrics in target_results:
+        collect_metrics(table_metrics)
+    return dict((table, min(by_target.values())) for table, (by_target, table_metrics) in zip(tables, target_results))
+
+def fanout_copy_table(table):
+    """
+        Copies the specified table to every target of a fan-out copy (see fanout), each target 
+        on its own thread and connections:
+        
+         1. every target is verified (see verify_table) and, unless a full copy is forced, 
+            diffed with the source and its deletes done (see plan_incremental_copy)
+         2. the rows the targets need are exported and transferred once: the whole table if any
+            target needs a full copy, and the rows of the diffs of all the other targets together
+         3. every target loads its rows in parallel, a full copy like perform_full_copy and an 
+            incremental copy from the rows of its own diff only (see load_fanout_target)
+        
+        Watermark copies are not done in a fan-out copy, targets without a fieldHash column get
+        a full copy instead.
+        
+        Keyword arguments:
+            table -- String name of the table to copy
+               
+        returns -- a tuple of a dict of target name to result code (see verify_and_copy_table) and
+                   the metrics.TableMetrics of the copies
+    """
+    table_metrics = metrics.activate(metrics.TableMetrics(table))
+    targets = get_fanout_targets()
+    plans = fanout.run_threads(lambda target: plan_fanout_target(table, target[0], table_metrics), targets)
+    plans = [plan if plan is not None else (-3, None) for plan in plans]
+    results = dict((role, plan[0]) for (role, host, database), plan in zip(targets, plans))
+    
+    copies = [(role, plan[1]) for (role, host, database), plan in zip(targets, plans) if plan[0] is None]
+    if copies:
+        connections = get_connection_pool()
+        source_host = connections.checkout('source')
+        full_dump = diff_dump = None
+        diff_hashes = set()
+        try:
+            if [hash_set for role, hash_set in copies if hash_set is None]:
+                logger.info("Exporting table %s for the full copies of %d targets" % (table, len(copies)))
+                full_dump = export_dump(table, source_host, settings.scp_user, settings.dump_dir, spool_key=table, \
+                                        dump_key=get_dump_key(table, source_host))
+            for role, hash_set in copies:
+                if hash_set is not None:
+                    diff_hashes.update(hash_set)
+            if diff_hashes:
+                logger.info("Exporting %d rows of table %s for the incremental copies of the targets" % (len(diff_hashes), table))
+                diff_dump = export_dump(table, source_host, settings.scp_user, settings.dump_dir, hash_set=diff_hashes)
+            
+            loaded = fanout.run_threads(lambda copy: load_fanout_target(table, copy[0], copy[1], full_dump, diff_dump, diff_hashes, \
+                                                                        table_metrics), copies)
+            for (role, hash_set), copied in zip(copies, loaded):
+                results[role] = 0 if copied else -3
+        except:
+            logger.error("Failed fan-out copy of table %s", table, exc_info=1)
+            for role, hash_set in copies:
+                results[role] = -3
+        finally:
+            if full_dump is not None:
+                spool_or_remove_dumpfile(source_host, full_dump, table)
+            if diff_dump is not None:
+                os.remove(diff_dump)
+            connections.checkin('source', source_host)
+    
+    for role, result in results.items():
+        if result == 0:
+            logger.info("Successful copy of table %s to %s" % (table, role[len('target:'):]))
+        elif result < -1:
+            logger.error("Failed copy of table %s to %s" % (table, role[len('target:'):]))
+    metrics.deactivate()
+    return dict((role[len('target:'):], result) for role, result in results.items()), table_metrics
+
+def plan_fanout_target(table, role, table_metrics=None):
+    """
+        Verifies and diffs a target of a fan-out copy (see fanout_copy_table).
+        
+        Keyword arguments:
+            table -- String name of the table to copy
+            role -- the connection pool role of the target
+            table_metrics -- the metrics.TableMetrics to record into (defaults to None)
+               
+        returns -- a tuple of the result code of the target and the set of hashes of the rows it
+                   needs. The result code is None if the target needs the rows, the set of hashes
+                   is None if it needs a full copy. The hashes are held in memory even with the 
+                   merge diff method, the dump of the diffs is filtered on them for every target.
+    """
+    metrics.activate(table_metrics)
+    connections = get_connection_pool()
+    source_host = dest_host = None
+    try:
+        source_host = connections.checkout('source')
+        dest_host = connections.checkout(role)
+        result = verify_table(table, source_host, dest_host, role)
+        if result is not None:
+            return (result, None)
+        if not settings.force_full:
+            hash_set = plan_incremental_copy(table, source_host, dest_host)
+            if isinstance(hash_set, hashdiff.HashSpool):
+                spool = hash_set
+                try:
+                    hash_set = set(spool)
+                finally:
+                    spool.close()
+            if hash_set is not None:
+                return (0, None) if len(hash_set) == 0 else (None, hash_set)
+        return (None, None)
+    finally:
+        connections.checkin('source', source_host)
+        connections.checkin(role, dest_host)
+
+def load_fanout_target(table, role, hash_set, full_dump, diff_dump, diff_hashes, table_metrics=None):
+    """
+        Loads the rows a target of a fan-out copy needs (see fanout_copy_table). The rows of an
+        incremental copy are filtered out of the dump of all the diffs (see fanout.filter_dump),
+        unless the target needs all of them.
+        
+        Keyword arguments:
+            table -- String name of the table to copy
+            role -- the connection pool role of the target
+            hash_set -- the set of hashes of the rows the target needs, None for a full copy
+            full_dump -- the local path of the dump of the whole table, None if it failed
+            diff_dump -- the local path of the dump of the rows of all the diffs, None if it failed
+            diff_hashes -- the set of hashes of the rows in diff_dump
+            table_metrics -- the metrics.TableMetrics to record into (defaults to None)
+               
+        returns -- True if the target is copied
+    """
+    metrics.activate(table_metrics)
+    connections = get_connection_pool()
+    source_host = dest_host = None
+    try:
+        source_host = connections.checkout('source')
+        dest_host = connections.checkout(role)
+        if hash_set is None:
+            return full_dump is not None and load_full_dump(table, source_host, dest_host, full_dump)
+        if diff_dump is None:
+            return False
+        started = time.time()
+        if len(hash_set) == len(diff_hashes):
+            rows = dest_host.load_data_in_file(table, diff_dump, session_variables=get_load_session_variables())
+            metrics.record('load', started, bytes=os.path.getsize(diff_dump), rows=rows)
+            return True
+        
+        index = fanout.column_index(source_host.get_table_structure(table), 'fieldHash')
+        csvfilename, rows = fanout.filter_dump(diff_dump, index, hash_set, settings.dump_dir)
+        try:
+            logger.debug("Loading %d of the %d rows exported for the diffs of %s into %s" % (rows, len(diff_hashes), table, role))
+            rows = dest_host.load_data_in_file(table, csvfilename, session_variables=get_load_session_variables())
+            metrics.record('load', started, bytes=os.path.getsize(csvfilename), rows=rows)
+        finally:
+            os.remove(csvfilename)
+        return True
+    finally:
+        connections.checkin('source', source_host)
+        connections.checkin(role, dest_host)
+
+def load_full_dump(table, source_host, dest_host, csvfilename):
+    """
+        Loads a dump of the whole specified table into the destination like perform_full_copy: 
+        into a shadow table swapped in afterwards, or into the truncated destination table. The
+        dump is left in place.
+         
+        Keyword arguments:
+            table -- String name of the table to load
+            source_host -- MySQLHost source host to take the schema from
+            dest_host -- MySQLHost destination host to load into
+            csvfilename -- the local path of the dump
+               
+        returns --  True if the dump is loaded.
+    """
+    shadow = prepare_shadow_table(table, source_host, dest_host)
+    if shadow is None and not init_target_table(table, source_host, dest_host):
+        return False
+    
+    dest_table = shadow.name if shadow is not None else table
+    loaded = False
+    try:
+        started = time.time()
+        deferred_keys = truncate_for_load(table, dest_host) if shadow is None else []
+        try:
+            rows = dest_host.load_data_in_file(dest_table, csvfilename, session_variables=get_load_session_variables())
+        finally:
+            dest_host.add_secondary_keys(dest_table, deferred_keys)
+        metrics.record('load', started, bytes=os.path.getsize(csvfilename), rows=rows)
+        if shadow is not None:
+            finish_shadow_table(shadow, dest_host)
+        loaded = True
+    finally:
+        if shadow is not None and not loaded:
+            dest_host.drop_table(shadow.name)
+    return loaded
+
+def perform_incremental_copy(table, source_host, dest_host, scp_user, dump_dir):
+    """
+        Performs an incremental copy of the specified table from source to destination by using a 
+        fieldHash column on the source and target that is to be a hash of all data in the row. The 
+        incremental copy copies only the difference of rows on the target from the source and deletes 
+        the difference of rows on the source from the target. The deletes are done in batches of 20,000 
+        so as to not exceed the max_allowed_packet size for the MySQL server. The copied rows are copied
+        in a similar fashion as the full copy (see perform_full_copy routine below).
+        
+        This routine fails if it detects schema differences in source and target or if the fieldHash
+        column is missing or if the percent difference in number of rows from source to dest is > 40% (a
+        full copy makes more sense in this case). Percent diff is calculated as:
+        
+        (number of rows to be added to dest + number of rows to be removed from dest) / total rows in dest
+        
+        Keyword arguments:
+            table -- String name of the table to copy
+            source_host -- MySQLHost source host to copy from (can be remote)
+            dest_host -- MySQLHost destination host to copy to (must be local)
+            scp_user -- String representing the user to connect remotely as when SCPing the file
+            dump_dir -- String containing the location on the source and dest to store the file
+               
+        returns --  True if the copy succeeds, false otherwise.
+    """
+    targetHashesToAdd = plan_incremental_copy(table, source_host, dest_host)
+    if targetHashesToAdd is None:
+        return False
+    
+    if len(targetHashesToAdd) > 0:
+        if not copy_rows(table, source_host, dest_host, scp_user, dump_dir, targetHashesToAdd):
+            return False
+        
+    logger.debug("Tables should now be in sync.")
+    
+    return True
+
+def perform_watermark_copy(table, source_host, dest_host, scp_user, dump_dir):
+    """
+        Performs a watermark incremental copy of a table without a fieldHash column if the 
+        watermark copy option is on: only the rows at or above the target's watermark (see 
+        watermark.find_watermark) are copied, replacing the target rows with the same primary key.
+        Deleted rows are then caught by reconciling the primary keys of both tables (see 
+        watermark.reconcile_deletes), when the target ends up with more rows than the source or 
+        on every run with the reconcile option.
+        
+        This routine fails if the table has a fieldHash column (see perform_incremental_copy), if
+        the schemas differ, if the table has no primary key or no watermark, or if the target 
+        table is empty.
+        
+        Keyword arguments:
+            table -- String name of the table to copy
+            source_host -- MySQLHost source host to copy from (can be remote)
+            dest_host -- MySQLHost destination host to copy to (must be local)
+            scp_user -- String representing the user to connect remotely as when SCPing the file
+            dump_dir -- String containing the location on the source and dest to store the file
+               
+        returns --  True if the copy succeeds, false otherwise.
+    """
+    if not settings.watermark_copy or not dest_host.table_exists(table):
+        return False
+    
+    if not schema_compare(table, source_host, dest_host, True):
+        logger.debug("Watermark Error: Table structures do not match.")
+        return False
+    
+    if re.search('fieldhash', source_host.get_table_structure(table), re.I) is not None:
+        return False
+    
+    if len(dest_host.get_primary_key_columns(table)) == 0:
+        logger.debug("Watermark Error: Table %s has no primary key to upsert on." % table)
+        return False
+    
+    found = watermark.find_watermark(table, source_host, dest_host)
+    if found is None:
+        logger.debug("Watermark Error: Table %s has no lastModifiedDate or auto increment key, or is empty." % table)
+        return False
+    
+    column, lower = found
+    logger.info("Copying the rows of %s with %s >= %s" % (table, column, lower))
+    metrics.choose('incremental', 'watermark on %s' % column)
+    if not copy_rows(table, source_host, dest_host, scp_user, dump_dir, key_range=(column, lower, None), replace=True):
+        return False
+    
+    if settings.reconcile or dest_host.get_row_count(table) > source_host.get_row_count(table):
+        if watermark.reconcile_deletes(table, source_host, dest_host) is None:
+            return False
+    
+    return True
+
+def plan_incremental_copy(table, source_host, dest_host):
+    """
+        Does the first half of an incremental copy (see perform_incremental_copy): checks that an
+        incremental copy is possible, diffs the fieldHash sets of source and destination (see 
+        hashdiff.diff_hashes) and deletes the rows missing from the source from the destination.
+        
+        Keyword arguments:
+            table -- String name of the table to copy
+            source_host -- MySQLHost source host to copy from (can be remote)
+            dest_host -- MySQLHost destination host to copy to (must be local)
+               
+        returns --  the set of hashes of the rows still to be copied to the destination, or None if
+                    an incremental copy is not possible.
+    """
+    if not dest_host.table_exists(table):
+        logger.debug("Sync Error: Table %s does not exist in target DB." % table)
+        metrics.choose('full', 'no target table')
+        return None
+        
+    if not schema_compare(table, source_host, dest_host, False):
+        logger.debug("Sync Error: Table structures do not match.")
+        metrics.choose('full', 'table structures differ')
+        return None
+    
+    if re.search('fieldhash', source_host.get_table_structure(table), re.I) is None:
+        logger.debug("Sync Error: Tables do not hash fields.")
+        return None
+
+    logger.debug("Syncing table %s" % table)
+    
+    started = time.time()
+    targetHashesToAdd, targetHashesToDel, targetHashCount = \
+        hashdiff.diff_hashes(settings.diff_method, table, source_host, dest_host)
+    metrics.record('diff', started, rows=targetHashCount)
+    
+    lenTargetHashes = 1 if targetHashCount == 0 else targetHashCount
+    lenTargetHashesToDel = 0 if targetHashesToDel is None else len(targetHashesToDel)
+    lenTargetHashesToAdd = 0 if targetHashesToAdd is None else len(targetHashesToAdd)
+    if ((lenTargetHashesToAdd + lenTargetHashesToDel) / lenTargetHashes) > .4:
+        logger.debug("Sync Error: tables too different (>40%), try full copy.")
+        metrics.choose('full', 'tables too different (>40%)')
+        return None
+    
+    started = time.time()
+    deleted = dest_host.delete_records(table, targetHashesToDel, targetHashCount, settings.delete_strategy)
+    metrics.record('delete', started, rows=deleted)
+    metrics.choose('incremental', '%d rows to add, %d to delete' % (lenTargetHashesToAdd, lenTargetHashesToDel))
+    
+    return targetHashesToAdd
+
+def perform_full_copy(table, source_host, dest_host, scp_user, dump_dir):
+    """
+        Performs a full copy of the specified table from source to destination by selecting 
+        all rows into an outfile, SCPing the file from the remote machine (iff source is remote), 
+        truncating the data in the destination table and then loading the file into the local 
+        destination table (or by streaming the rows, see copy_rows). If the destination schema 
+        differs from the source schema then it will be dropped and recreated, if the target schema
+        does not exist it will be created. With the shadow load option the rows are loaded into a 
+        shadow table instead which then replaces the destination table (see prepare_shadow_table).
+        With the dump spool option an unchanged table is loaded from its spooled dump (see spool).
+         
+        Keyword arguments:
+            table -- String name of the table to copy
+            source_host -- MySQLHost source host to copy from (can be remote)
+            dest_host -- MySQLHost destination host to copy to (must be local)
+            scp_user -- String representing the user to connect remotely as when SCPing the file
+            dump_dir -- String containing the location on the source and dest to store the file
+               
+        returns --  True if the copy succeeds, false otherwise.
+    """
+    dump_key = get_dump_key(table, source_host)
+    shadow = prepare_shadow_table(table, source_host, dest_host)
+    if shadow is not None:
+        copied = False
+        try:
+            copied = copy_rows(table, source_host, dest_host, scp_user, dump_dir, dest_table=shadow.name, spool_key=table, \
+                               dump_key=dump_key)
+            if copied:
+                finish_shadow_table(shadow, dest_host)
+        finally:
+            if not copied:
+                dest_host.drop_table(shadow.name)
+        return copied
+    
+    if not init_target_table(table, source_host, dest_host):
+        return False
+    
+    return copy_rows(table, source_host, dest_host, scp_user, dump_dir, truncate=True, spool_key=table, dump_key=dump_key)
+
+def copy_rows(table, source_host, dest_host, scp_user, dump_dir, hash_set=None, key_range=None, truncate=False, dest_table=None, \
+              replace=False, spool_key=None, checkpoint=None, dump_key=None):
+    """
+        Copies rows of the specified table from source to destination. With the default 'outfile'
+        copy method the rows are selected into an outfile, the file is SCPed from the remote machine
+        (iff source is remote) and loaded into the destination table. With the 'stream' copy method
+        the rows are streamed from the source straight into the destination table without writing
+        any file (see streaming.stream_rows).
+         
+        Keyword arguments:
+            table -- String name of the table to copy
+            source_host -- MySQLHost source host to copy from (can be remote)
+            dest_host -- MySQLHost destination host to copy to (must be local)
+            scp_user -- String representing the user to connect remotely as when SCPing the file
+            dump_dir -- String containing the location on the source and dest to store the file
+            hash_set -- a set of hashes (from the fieldHash column) of the rows to copy, 
+                        if None all rows are copied
+            key_range -- see MySQLHost.select_into_outfile
+            truncate -- truncate the destination table right before loading (defaults to False)
+            dest_table -- name of the table to load into on the destination (defaults to table)
+            replace -- replace destination rows with the same primary key (defaults to False)
+            spool_key -- the key to keep the dump under for a delta transfer of the next dump of 
+                         the same rows (defaults to None, the dump is not kept), see delta
+            checkpoint -- a checkpoint.ChunkCheckpoint to record the transfer and the load of the
+                          dump in, its dump is loaded instead if a previous run transferred it
+                          (defaults to None)
+            dump_key -- the key of the rows in the dump spool, they are loaded from the spool if
+                        their dump is there and their dump is spooled otherwise (defaults to None,
+                        the spool is not used), see get_dump_key
+               
+        returns --  True if the copy succeeds, false otherwise.
+    """
+    dest_table = dest_table or table
+    if settings.copy_method == 'stream':
+        started = time.time()
+        deferred_keys = truncate_for_load(dest_table, dest_host) if truncate else []
+        try:
+            rows = streaming.stream_rows(table, source_host, dest_host, hash_set, key_range, settings.stream_batch_rows, dest_table, \
+                                  settings.export_ordered, get_load_session_variables(), replace)
+        finally:
+            dest_host.add_secondary_keys(dest_table, deferred_keys)
+        metrics.record('stream', started, rows=rows)
+        if checkpoint is not None:
+            checkpoint.complete(None)
+        return True
+    
+    csvfilename = checkpoint.staged_file() if checkpoint is not None else None
+    if csvfilename is not None:
+        logger.info("Reusing the dump %s transferred by a previous run" % csvfilename)
+    else:
+        csvfilename = export_dump(table, source_host, scp_user, dump_dir, hash_set, key_range, spool_key, dump_key)
+        if csvfilename is None:
+            return False
+        if checkpoint is not None:
+            checkpoint.stage(csvfilename)
+
+    started = time.time()
+    deferred_keys = truncate_for_load(dest_table, dest_host) if truncate else []
+    try:
+        rows = dest_host.load_data_in_file(dest_table, csvfilename, session_variables=get_load_session_variables(), replace=replace)
+    finally:
+        dest_host.add_secondary_keys(dest_table, deferred_keys)
+    metrics.record('load', started, bytes=os.path.getsize(csvfilename), rows=rows)
+    if checkpoint is not None:
+        checkpoint.complete(rows)
+    spool_or_remove_dumpfile(source_host, csvfilename, spool_key)
+
+    return True
+
+def export_dump(table, source_host, scp_user, dump_dir, hash_set=None, key_range=None, spool_key=None, dump_key=None):
+    """
+        Gets a local dump of rows of the specified table: from the dump spool if the rows are 
+        spooled, otherwise they are selected into an outfile on the source and the file is SCPed
+        from the remote machine (iff source is remote).
+         
+        Keyword arguments:
+            table -- String name of the table to dump
+            source_host -- MySQLHost source host to dump from (can be remote)
+            scp_user -- String representing the user to connect remotely as when SCPing the file
+            dump_dir -- String containing the location on the source and dest to store the file
+            hash_set -- see copy_rows
+            key_range -- see copy_rows
+            spool_key -- see copy_rows
+            dump_key -- see copy_rows
+               
+        returns --  the local path of the dump, None if it could not be transferred.
+    """
+    if dump_key is not None:
+        started = time.time()
+        csvfilename = fetch_spooled_dump(table, dump_key)
+        if csvfilename is not None:
+            metrics.record('spool', started, bytes=os.path.getsize(csvfilename))
+            return csvfilename
+    
+    started = time.time()
+    csvfilename = source_host.select_into_outfile(table, hash_set, dump_dir, key_range, settings.export_ordered)
+    metrics.record('export', started)
+    
+    started = time.time()
+    if not retrieve_remote_dumpfile(source_host, scp_user, csvfilename, csvfilename, spool_key):
+        logger.error("Error retrieving remote file %s, check ssh config and remote permissions for %s on %s" % \
+                          (csvfilename, scp_user, source_host))
+        return None
+    metrics.record('transfer', started, bytes=os.path.getsize(csvfilename))
+    if dump_key is not None:
+        spool_dump(table, dump_key, csvfilename, source_host)
+    return csvfilename
+
+def use_delta_transfer(source_host, spool_key):
+    """
+        returns -- True if the dump with the specified spool key is to be transferred as a delta 
+                   against the previous dump of the same rows (see delta)
+    """
+    return settings.delta_transfer and spool_key is not None and source_host.host != 'localhost'
+
+def get_delta_spool():
+    """
+        returns -- the delta.DeltaSpool the loaded dumps are kept in, pydbcopy_delta_spool_dir or
+                   spool in the dump dir
+    """
+    return delta.DeltaSpool(settings.delta_spool_dir or os.path.join(settings.dump_dir, 'spool'))
+
+def spool_or_remove_dumpfile(source_host, csvfilename, spool_key):
+    """
+        Disposes of a loaded dump file: it is kept in the delta spool if the next dump of the same
+        rows is to be transferred as a delta, removed otherwise.
+    """
+    if use_delta_transfer(source_host, spool_key):
+        try:
+            get_delta_spool().keep(spool_key, csvfilename)
+            return
+        except (IOError, OSError):
+            logger.warn("Unable to keep %s in the delta spool" % csvfilename, exc_info=1)
+    os.remove(csvfilename)
+
+def get_dump_spool():
+    """
+        returns -- the spool.DumpSpool of table dumps, in pydbcopy_dump_spool_dir or dumps in the
+                   dump dir
+    """
+    return spool.DumpSpool(settings.dump_spool_dir or os.path.join(settings.dump_dir, 'dumps'), \
+                           settings.dump_spool_budget_mb * 1048576)
+
+def get_dump_key(table, source_host):
+    """
+        Derives the key of the current rows of the specified table in the dump spool from the 
+        metadata fingerprint of the source table (see changedetect), or its live checksum when 
+        the metadata can not tell whether the rows changed.
+        
+        Keyword arguments:
+            table -- String name of the table
+            source_host -- MySQLHost source host
+               
+        returns -- the key (see spool.dump_key), None if the dump spool option is off or the 
+                   changes of the table can not be told
+    """
+    if not settings.dump_spool:
+        return None
+    fingerprint = changedetect.normalize(source_host.get_table_fingerprints([table]).get(table))
+    if fingerprint is not None and changedetect.has_reliable_update_time(fingerprint):
+        fingerprint.pop('taken_at')
+    else:
+        checksum = source_host.get_quick_checksum(table)
+        if checksum is None:
+            logger.debug("Changes to table %s can not be told from its metadata, its dump will not be spooled" % table)
+            return None
+        fingerprint = { 'checksum' : str(checksum) }
+    return spool.dump_key(source_host.host, source_host.database, table, source_host.get_table_structure(table), fingerprint)
+
+def fetch_spooled_dump(table, dump_key):
+    """
+        returns -- the path of a copy of the spooled dump of the specified table in the dump dir,
+                   None if it is not spooled (see spool.DumpSpool.fetch)
+    """
+    csvfilename = get_dump_spool().fetch(dump_key, settings.dump_dir)
+    if csvfilename is not None:
+        logger.info("Table %s is unchanged since it was spooled, loading its spooled dump" % table)
+    return csvfilename
+
+def spool_dump(table, dump_key, csvfilename, source_host):
+    """
+        Keeps a copy of a dump of the specified table in the dump spool, a failure is only logged.
+    """
+    try:
+        get_dump_spool().store(dump_key, csvfilename, \
+                               { 'host' : source_host.host, 'database' : source_host.database, 'table' : table })
+    except (IOError, OSError):
+        logger.warn("Unable to keep the dump of %s in the dump spool" % table, exc_info=1)
+
+def get_load_session_variables():
+    """
+        Gets the session variables of the bulk load profile to set around loads into the target:
+        unique and foreign key checks are turned off with the bulk load option and binary logging
+        with the bulk load skip binlog option.
+        
+        returns -- a dict of session variable name to value, empty for the server defaults
+    """
+    session_variables = dict()
+    if settings.bulk_load:
+        session_variables['unique_checks'] = 0
+        session_variables['foreign_key_checks'] = 0
+    if settings.bulk_load_skip_binlog:
+        session_variables['sql_log_bin'] = 0
+    return session_variables
+
+def truncate_for_load(table, dest_host):
+    """
+        Truncates the specified destination table before a full load. With the bulk load defer
+        keys option its secondary keys are dropped as well, the caller has to add them back once
+        the load is done (see MySQLHost.add_secondary_keys).
+        
+        Keyword arguments:
+            table -- String name of the table to truncate
+            dest_host -- MySQLHost destination host
+               
+        returns -- a list of the definitions of the keys dropped
+    """
+    dest_host.truncate_table(table)
+    if not settings.bulk_load_defer_keys:
+        return []
+    return dest_host.drop_secondary_keys(table)
+
+def init_target_table(table, source_host, dest_host):
+    """
+        Makes sure the destination table exists with the same schema as the source table. If the 
+        destination schema differs from the source schema then it is dropped and recreated, if the
+        destination table does not exist it is created.
+         
+        Keyword arguments:
+            table -- String name of the table to initialize
+            source_host -- MySQLHost source host to take the schema from
+            dest_host -- MySQLHost destination host to initialize the table on
+               
+        returns --  True if the destination table is ready to be loaded, False if the source table
+                    does not exist.
+    """
+    if not source_host.table_exists(table):
+        logger.error("Source table %s does not exist in database %s on %s" % \
+                          (table, source_host.database, source_host))
+        return False
+    
+    init_target_schema = False
+    if not dest_host.table_exists(table):
+        logger.debug("Table %s does not exist in target DB...it will be created." % table)
+        init_target_schema = True
+    elif not schema_compare(table, source_host, dest_host, True): 
+        logger.debug("Target table structure does not match source...it will be re-created.")
+        init_target_schema = True
+    
+    if init_target_schema:
+        dest_host.create_table_with_schema(table, source_host.get_table_structure(table))
+    
+    return True
+
+class ShadowTable(object):
+    """
+        A table loaded in the place of a destination table for a full copy (see prepare_shadow_table).
+        Name is the name of the shadow table and keys the secondary keys still to be built on it.
+    """
+    def __init__(self, table, name, keys):
+        self.table = table
+        self.name = name
+        self.keys = keys
+    
+    def __str__(self):
+        return "shadow table %s of %s" % (self.name, self.table)
+
+def prepare_shadow_table(table, source_host, dest_host):
+    """
+        Prepares a shadow load of the specified table if the shadow load option is on: an empty 
+        table named <table>__pydbcopy_new is created on the destination with the source schema 
+        minus its secondary keys. Once the rows are loaded into it finish_shadow_table builds the 
+        keys and swaps it in for the destination table, so readers of the destination table never
+        see it empty or half loaded. Tables with foreign keys on the source, or with triggers or
+        foreign keys on the destination, are not shadow loaded: they can not simply be swapped.
+         
+        Keyword arguments:
+            table -- String name of the table to copy
+            source_host -- MySQLHost source host to take the schema from
+            dest_host -- MySQLHost destination host to create the shadow table on
+               
+        returns --  a ShadowTable, or None if the table is to be loaded in place.
+    """
+    if not settings.shadow_load or not source_host.table_exists(table):
+        return None
+    
+    schema = source_host.get_table_structure(table)
+    if re.search('FOREIGN KEY', schema, re.I) is not None or not dest_host.get_table_engine_info(table)[1]:
+        logger.info("Table %s has triggers or foreign keys, it will be loaded in place." % table)
+        return None
+    
+    shadow_name = "%s__pydbcopy_new" % table
+    keys = dest_host.create_shadow_table(table, shadow_name, schema)
+    return ShadowTable(table, shadow_name, keys)
+
+def finish_shadow_table(shadow, dest_host):
+    """
+        Builds the secondary keys of a loaded shadow table and atomically swaps it in for its 
+        destination table (see prepare_shadow_table).
+         
+        Keyword arguments:
+            shadow -- the loaded ShadowTable
+            dest_host -- MySQLHost destination host
+    """
+    dest_host.add_secondary_keys(shadow.name, shadow.keys)
+    dest_host.swap_in_table(shadow.table, shadow.name)
+    logger.info("Swapped in %s" % shadow)
+
+def finish_chunked_copy(chunks, succeeded):
+    """
+        Completes a chunked full copy once all of its chunks are copied: if the chunks were loaded
+        into a shadow table it is swapped in when they all succeeded and dropped otherwise (unless
+        the loaded chunks are checkpointed for the copy to be resumed), if the secondary keys of 
+        the table were dropped for the load they are added back.
+         
+        Keyword arguments:
+            chunks -- list of the TableChunks of the table
+            succeeded -- True if every chunk was copied
+               
+        returns --  True if the table is copied
+    """
+    if chunks[0].shadow is None and not chunks[0].deferred_keys:
+        return succeeded
+    
+    connections = get_connection_pool()
+    dest_host = connections.checkout('target')
+    try:
+        return finish_table_load(chunks[0].table, chunks[0].shadow, chunks[0].deferred_keys, succeeded, dest_host, True)
+    finally:
+        connections.checkin('target', dest_host)
+
+def finish_table_load(table, shadow, deferred_keys, succeeded, dest_host, chunked=False):
+    """
+        Completes the load of a table in one or more parts (see finish_chunked_copy and 
+        finish_pipeline_job): a shadow table is swapped in when every part succeeded and dropped
+        otherwise (unless the loaded chunks are checkpointed for the copy to be resumed), secondary
+        keys dropped for the load are added back either way.
+         
+        Keyword arguments:
+            table -- String name of the table
+            shadow -- the ShadowTable the parts were loaded into, None if loaded in place
+            deferred_keys -- the secondary keys dropped for the load, if loaded in place
+            succeeded -- True if every part was loaded
+            dest_host -- MySQLHost destination host
+            chunked -- True if the parts are the chunks of a chunked copy (defaults to False)
+               
+        returns --  True if the table is copied
+    """
+    if shadow is None:
+        if deferred_keys:
+            dest_host.add_secondary_keys(table, deferred_keys)
+        return succeeded
     
-    return 0
+    try:
+        if succeeded:
+            finish_shadow_table(shadow, dest_host)
+            return True
+    except:
+        logger.error("Failed to swap in %s" % shadow, exc_info=1)
+    if chunked and has_resumable_checkpoint(shadow.table):
+        logger.info("Keeping %s for the copy to be resumed (see --resume)" % shadow)
+    else:
+        dest_host.drop_table(shadow.name)
+    return False
 
-def verify_and_copy_table(table):
+class TableChunk(object):
     """
-        This routine verifies the specified table's row count on the source is within a certain 
-        configurable threshold and if it is copies it to the local database. If the tables schema
-        on the source and target are equal and the source has not been moddified more recently
-        than the target then the copy is skipped. An incremental copy is attempted and if failed 
-        then a full copy is attempted.
-        
-        This is the main routine that the set of tables is mapped through by the multi-processing 
-        pool. This routine returns the following codes:
+        A primary key range of a table that is exported, transferred and loaded independently of
+        the rest of the table (see copy_table_chunk). Rows with lower <= column < upper belong to 
+        the chunk, a bound of None is open ended. A resumed chunk is copied again after a failed 
+        run, its key range may hold rows already (see resume_chunked_full_copy).
+    """
+    def __init__(self, table, column, lower, upper, index, count, shadow=None, deferred_keys=None, resumed=False):
+        self.table = table
+        self.column = column
+        self.lower = lower
+        self.upper = upper
+        self.index = index
+        self.count = count
+        self.shadow = shadow
+        self.deferred_keys = deferred_keys
+        self.resumed = resumed
+    
+    def dest_table(self):
+        return self.shadow.name if self.shadow is not None else self.table
         
-         0 = successful copy
-         1 = skipped copying table due to no change detected.
-        -1 = failed validity check, source row count is too different than target
+    def key_range(self):
+        return (self.column, self.lower, self.upper)
+    
+    def spool_key(self):
+        return "%s.%dof%d" % (self.table, self.index + 1, self.count)
+    
+    def __str__(self):
+        return "chunk %d/%d of table %s (%s from %s to %s)" % \
+            (self.index + 1, self.count, self.table, self.column, self.lower, self.upper)
+
+def plan_table_chunks(table, source_host, num_chunks, min_rows):
+    """
+        Splits the specified table into primary key ranges of roughly equal width for a chunked 
+        full copy. Only tables with a single column integer primary key and at least min_rows rows
+        (according to the table statistics) are split. The first and last chunks are open ended so 
+        rows added on the source after planning are still copied.
         
-        Any other return value is an unknown failure.
+        Keyword arguments:
+            table -- String name of the table to split
+            source_host -- MySQLHost source host to get the primary key range from
+            num_chunks -- the number of chunks to split the table into
+            min_rows -- the minimum estimated number of rows for a table to be split
+               
+        returns --  a list of TableChunks, or None if the table should not be split.
     """
-    logging.getLogger('PyDBCopy')
+    if num_chunks is None or num_chunks < 2:
+        return None
     
-    # set up DB connections to both source and target DB
-    source_host = MySQLHost(settings.source_host, settings.source_user, \
-                            settings.source_password, settings.source_database)
-    dest_host = MySQLHost(settings.target_host, settings.target_user, \
-                          settings.target_password, settings.target_database)
+    pk_columns = source_host.get_primary_key_columns(table)
+    if len(pk_columns) != 1:
+        logger.debug("Table %s does not have a single column primary key, it will not be chunked." % table)
+        return None
     
-    if table not in settings.tables_to_skip_verification:
-        if not perform_validity_check(table, source_host, dest_host, settings.verify_threshold):
-            return - 1
-    if settings.no_last_mod_check \
-       or not dest_host.table_exists(table) \
-       or not schema_compare(table, source_host, dest_host, True) \
-       or not is_last_mod_same(table, source_host, dest_host):
-        
-        copied = False
-        try:
-            if not settings.force_full:
-                logger.info("Starting incremental copy of table %s from %s(%s) to %s(%s)" % \
-                       (table, source_host.database, source_host.host, dest_host.database, dest_host.host))
-                copied = perform_incremental_copy(table, source_host, dest_host, settings.scp_user, settings.dump_dir)
-                if copied:
-                    logger.info("Successful incremental copy of table %s" % table)
-                else:
-                    logger.warn("Failed incremental copy of table %s" % table)
-                    
-            if not copied:
-                logger.info("Starting full copy of table %s from %s(%s) to %s(%s)" % \
-                       (table, source_host.database, source_host.host, dest_host.database, dest_host.host))
-                copied = perform_full_copy(table, source_host, dest_host, settings.scp_user, settings.dump_dir)
-                if copied:
-                    logger.info("Successful full copy of table %s" % table)
-                else:
-                    logger.error("Failed full copy of table %s" % table)
-        except:
-            logger.error("Failed copy of table %s", table, exc_info=1)
-                
-        if not copied:
-            return - 3
-    else:
-        logger.info("Skipping copying of table %s (source/dest have same row count and last mod date)" % table)
-        return 1
-    return 0
+    row_estimate = source_host.get_row_estimate(table)
+    if row_estimate is None or row_estimate < min_rows:
+        logger.debug("Table %s has about %s rows (< %d), it will not be chunked." % (table, row_estimate, min_rows))
+        return None
+    
+    column = pk_columns[0]
+    lower, upper = source_host.get_key_range(table, column)
+    if not isinstance(lower, (int, long)) or not isinstance(upper, (int, long)):
+        logger.debug("Primary key %s of table %s is not an integer, it will not be chunked." % (column, table))
+        return None
+    
+    num_chunks = int(min(num_chunks, upper - lower + 1))
+    if num_chunks < 2:
+        return None
+    
+    bounds = counts.split_key_range(lower, upper, num_chunks)
+    return [TableChunk(table, column, bounds[i], bounds[i + 1], i, num_chunks) for i in range(num_chunks)]
 
-def perform_incremental_copy(table, source_host, dest_host, scp_user, dump_dir):
+def prepare_chunked_full_copy(table, source_host, dest_host):
     """
-        Performs an incremental copy of the specified table from source to destination by using a 
-        fieldHash column on the source and target that is to be a hash of all data in the row. The 
-        incremental copy copies only the difference of rows on the target from the source and deletes 
-        the difference of rows on the source from the target. The deletes are done in batches of 20,000 
-        so as to not exceed the max_allowed_packet size for the MySQL server. The copied rows are copied
-        in a similar fashion as the full copy (see perform_full_copy routine below).
-        
-        This routine fails if it detects schema differences in source and target or if the fieldHash
-        column is missing or if the percent difference in number of rows from source to dest is > 40% (a
-        full copy makes more sense in this case). Percent diff is calculated as:
-        
-        (number of rows to be added to dest + number of rows to be removed from dest) / total rows in dest
-        
+        Prepares a chunked full copy of the specified table if it is large enough to be chunked
+        (see plan_table_chunks): the destination table is initialized (see init_target_table) and
+        truncated, or a shadow table is created for the chunks to be loaded into (see 
+        prepare_shadow_table). The chunks are left to be copied with copy_table_chunk, followed by
+        finish_chunked_copy. With the resume option the plan is checkpointed for the copy to be 
+        resumed if it fails, and a checkpointed copy is resumed instead (see 
+        resume_chunked_full_copy).
+         
         Keyword arguments:
             table -- String name of the table to copy
             source_host -- MySQLHost source host to copy from (can be remote)
             dest_host -- MySQLHost destination host to copy to (must be local)
-            scp_user -- String representing the user to connect remotely as when SCPing the file
-            dump_dir -- String containing the location on the source and dest to store the file
                
-        returns --  True if the copy succeeds, false otherwise.
+        returns --  a list of TableChunks, or None if the table is to be copied by perform_full_copy.
     """
-    if not dest_host.table_exists(table):
-        logger.debug("Sync Error: Table %s does not exist in target DB." % table)
-        return False
-        
-    if not schema_compare(table, source_host, dest_host, False):
-        logger.debug("Sync Error: Table structures do not match.")
-        return False
-    
-    if re.search('fieldhash', source_host.get_table_structure(table), re.I) is None:
-        logger.debug("Sync Error: Tables do not hash fields.")
-        return False
-
-    logger.debug("Syncing table %s" % table)
+    if not source_host.table_exists(table):
+        return None
     
-    sourceHashSet = source_host.get_current_hash_set(table)
-    targetHashSet = dest_host.get_current_hash_set(table)
+    manifest = get_checkpoint_manifest() if settings.resume else None
+    if has_resumable_checkpoint(table):
+        chunks = resume_chunked_full_copy(table, source_host, dest_host, manifest)
+        if chunks:
+            return chunks
+        logger.info("The checkpointed copy of table %s can not be resumed, it will be copied from scratch." % table)
+    if manifest is not None and manifest.get_table(table) is not None:
+        manifest.clear_table(table)
     
-    targetHashesToDel = targetHashSet.difference(sourceHashSet)
-    targetHashesToAdd = sourceHashSet.difference(targetHashSet)
+    if settings.chunks < 2:
+        return None
     
-    lenTargetHashes = 1 if targetHashSet is None or len(targetHashSet) == 0 else len(targetHashSet)
-    lenTargetHashesToDel = 0 if targetHashesToDel is None else len(targetHashesToDel)
-    lenTargetHashesToAdd = 0 if targetHashesToAdd is None else len(targetHashesToAdd)
-    if ((lenTargetHashesToAdd + lenTargetHashesToDel) / lenTargetHashes) > .4:
-        logger.debug("Sync Error: tables too different (>40%), try full copy.")
-        return False
+    chunks = plan_table_chunks(table, source_host, settings.chunks, settings.chunk_min_rows)
+    if not chunks:
+        return None
     
-    dest_host.delete_records(table, targetHashesToDel)
+    plan = { 'column' : chunks[0].column, \
+             'bounds' : [chunk.lower for chunk in chunks] + [None], \
+             'structure' : checkpoint.structure_checksum(source_host.get_table_structure(table)), \
+             'fingerprint' : take_fingerprints(source_host, [table]).get(table) }
+    shadow = prepare_shadow_table(table, source_host, dest_host)
+    if shadow is not None:
+        for chunk in chunks:
+            chunk.shadow = shadow
+        plan.update(shadow={ 'name' : shadow.name, 'keys' : shadow.keys }, deferred_keys=[])
+        if manifest is not None:
+            manifest.start_table(table, plan)
+        return chunks
     
-    if targetHashesToAdd is not None and lenTargetHashesToAdd > 0:
-        csvfilename = source_host.select_into_outfile(table, targetHashesToAdd, dump_dir)
-        retrieve_remote_dumpfile(source_host, scp_user, csvfilename, csvfilename)
-        dest_host.load_data_in_file(table, csvfilename)
-        
-    logger.debug("Tables should now be in sync.")
+    if not init_target_table(table, source_host, dest_host):
+        return None
     
-    return True
+    deferred_keys = truncate_for_load(table, dest_host)
+    for chunk in chunks:
+        chunk.deferred_keys = deferred_keys
+    plan.update(shadow=None, deferred_keys=deferred_keys)
+    if manifest is not None:
+        manifest.start_table(table, plan)
+    return chunks
 
-def perform_full_copy(table, source_host, dest_host, scp_user, dump_dir):
+def resume_chunked_full_copy(table, source_host, dest_host, manifest):
     """
-        Performs a full copy of the specified table from source to destination by selecting 
-        all rows into an outfile, SCPing the file from the remote machine (iff source is remote), 
-        truncating the data in the destination table and then loading the file into the local 
-        destination table. If the destination schema differs from the source schema then it will 
-        be dropped and recreated, if the target schema does not exist it will be created.
+        Resumes the chunked full copy of the specified table checkpointed by a failed run: the 
+        chunks it loaded are skipped, the others are copied again into the same (shadow) table 
+        after deleting whatever rows a failed load left in their key range. If every chunk was 
+        loaded the last one is copied again, for the copy to be finished. The copy is not resumed
+        if the source table structure or fingerprint (see changedetect) changed or the table the
+        chunks were loaded into is gone.
          
         Keyword arguments:
             table -- String name of the table to copy
             source_host -- MySQLHost source host to copy from (can be remote)
             dest_host -- MySQLHost destination host to copy to (must be local)
-            scp_user -- String representing the user to connect remotely as when SCPing the file
-            dump_dir -- String containing the location on the source and dest to store the file
+            manifest -- the checkpoint.CheckpointManifest of the copy
                
-        returns --  True if the copy succeeds, false otherwise.
+        returns --  a list of the TableChunks left to copy, or None if the copy can not be resumed.
     """
-    if not source_host.table_exists(table):
-        logger.error("Source table %s does not exist in database %s on %s" % \
-                          (table, source_host.database, source_host))
-        return False
-    
-    init_target_schema = False
-    if not dest_host.table_exists(table):
-        logger.debug("Table %s does not exist in target DB...it will be created." % table)
-        init_target_schema = True
-    elif not schema_compare(table, source_host, dest_host, True): 
-        logger.debug("Target table structure does not match source...it will be re-created.")
-        init_target_schema = True
-    
-    if init_target_schema:
-        dest_host.create_table_with_schema(table, source_host.get_table_structure(table))
+    table_checkpoint = manifest.get_table(table)
+    plan = table_checkpoint['plan']
+    if plan['structure'] != checkpoint.structure_checksum(source_host.get_table_structure(table)):
+        logger.info("The structure of table %s changed since its copy was checkpointed." % table)
+        return None
+    # the chunks loaded by the failed run hold the source rows of that time
+    if not changedetect.source_unchanged_since(plan.get('fingerprint'), take_fingerprints(source_host, [table]).get(table)):
+        logger.info("Table %s may have changed since its copy was checkpointed." % table)
+        return None
     
-    csvfilename = source_host.select_into_outfile(table, None, dump_dir)
+    shadow = None
+    deferred_keys = plan['deferred_keys']
+    if plan['shadow'] is not None:
+        shadow = ShadowTable(table, plan['shadow']['name'], plan['shadow']['keys'])
+        if not dest_host.table_exists(shadow.name):
+            return None
+    else:
+        if not dest_host.table_exists(table) or not schema_compare(table, source_host, dest_host):
+            return None
+        # the keys are added back when a copy fails, unless its process died
+        if deferred_keys:
+            deferred_keys = dest_host.drop_secondary_keys(table) or deferred_keys
     
-    if not retrieve_remote_dumpfile(source_host, scp_user, csvfilename, csvfilename):
-        logger.error("Error retrieving remote file %s, check ssh config and remote permissions for %s on %s" % \
-                          (csvfilename, scp_user, source_host))
-        return False
+    bounds = plan['bounds']
+    count = len(bounds) - 1
+    indexes = [index for index in range(count) if str(index) not in table_checkpoint['chunks']] or [count - 1]
+    logger.info("Resuming the chunked full copy of table %s, %d of %d chunks left" % (table, len(indexes), count))
+    return [TableChunk(table, plan['column'], bounds[index], bounds[index + 1], index, count, shadow, deferred_keys, True) \
+            for index in indexes]
 
-    dest_host.truncate_table(table)
-    dest_host.load_data_in_file(table, csvfilename)
-    os.remove(csvfilename)
+def get_checkpoint_manifest():
+    """
+        returns -- the checkpoint.CheckpointManifest of the chunked copies between the configured
+                   source and target, kept in pydbcopy_checkpoint_file or in the dump dir
+    """
+    filename = settings.checkpoint_file or os.path.join(settings.dump_dir, 'pydbcopy_checkpoint.json')
+    return checkpoint.CheckpointManifest(filename, get_fingerprint_prefix())
 
-    return True
+def has_resumable_checkpoint(table):
+    """
+        returns -- True if the resume option is on and a failed chunked copy of the specified 
+                   table is checkpointed
+    """
+    return settings.resume and get_checkpoint_manifest().is_resumable(table)
+
+def get_chunk_checkpoint(chunk):
+    """
+        returns -- the checkpoint.ChunkCheckpoint to record the copy of a chunk in, None unless the
+                   resume option is on: recording costs a checksum of every dump and two updates
+                   of the manifest per chunk
+    """
+    if not settings.resume:
+        return None
+    return checkpoint.ChunkCheckpoint(get_checkpoint_manifest(), chunk.table, chunk.index)
+
+def clear_chunk_range(chunk, dest_host):
+    """
+        Deletes the rows a failed run may have left in the key range of a resumed chunk.
+    """
+    deleted = dest_host.delete_key_range(chunk.dest_table(), chunk.key_range())
+    if deleted:
+        logger.info("Deleted %d rows left by a previous run in %s" % (deleted, chunk))
+
+def copy_table_chunk(chunk):
+    """
+        Copies a single chunk of a table prepared by prepare_chunked_full_copy (see copy_rows). 
+        Chunks are copied by the multi-processing pool alongside whole tables (see copy_tables).
+        This routine returns a TableResult with one of the following codes:
+        
+         0 = successful copy
+        -3 = failed copy
+         
+        Keyword arguments:
+            chunk -- TableChunk to copy
+    """
+    started = time.time()
+    connections = get_connection_pool()
+    source_host = dest_host = None
+    table_metrics = metrics.activate(metrics.TableMetrics(chunk.table))
+    
+    try:
+        source_host = connections.checkout('source')
+        dest_host = connections.checkout('target')
+        logger.info("Starting copy of %s" % chunk)
+        if chunk.resumed:
+            clear_chunk_range(chunk, dest_host)
+        if not copy_rows(chunk.table, source_host, dest_host, settings.scp_user, settings.dump_dir, \
+                         key_range=chunk.key_range(), dest_table=chunk.dest_table(), spool_key=chunk.spool_key(), \
+                         checkpoint=get_chunk_checkpoint(chunk)):
+            return TableResult(chunk.table, -3, started=started, table_metrics=table_metrics)
+        logger.info("Successful copy of %s" % chunk)
+    except:
+        logger.error("Failed copy of %s", chunk, exc_info=1)
+        return TableResult(chunk.table, -3, started=started, table_metrics=table_metrics)
+    finally:
+        metrics.deactivate()
+        connections.checkin('source', source_host)
+        connections.checkin('target', dest_host)
+    return TableResult(chunk.table, 0, started=started, table_metrics=table_metrics)
 
-def perform_validity_check(table, source_host, dest_host, threshold):
+def perform_validity_check(table, source_host, dest_host, threshold, count_strategy='exact', dest_role='target'):
     '''
         Performs a row count threshold check. 
         
@@ -312,6 +1987,13 @@ def perform_validity_check(table, source_host, dest_host, threshold):
             threshold -- an integer percent threshold value indicating the acceptable
                          reduction in the number of rows in the source table. This check
                          fails if the source is short by this percent.
+            count_strategy -- how the rows are counted, one of counts.count_strategies 
+                              (defaults to exact). With estimate and auto the check is first
+                              decided on the estimates of the table statistics (see 
+                              check_estimates), auto falls back to counting the rows when the 
+                              estimates are too close to the threshold or fail the check.
+            dest_role -- the connection pool role of the destination host, for parallel counts 
+                         (defaults to target)
                
         returns --  If the source host has less rows than the target by "threshold" percent 
                     then this check fails by returning 0. If source contains more rows than 
@@ -321,8 +2003,12 @@ def perform_validity_check(table, source_host, dest_host, threshold):
         return 1
     if not dest_host.table_exists(table):
         return 1
-    source_row_count = source_host.get_row_count(table)
-    dest_row_count = dest_host.get_row_count(table)
+    if count_strategy in ('estimate', 'auto'):
+        passed = check_estimates(table, source_host, dest_host, threshold, count_strategy == 'estimate')
+        if passed or (passed is not None and count_strategy == 'estimate'):
+            return 1 if passed else 0
+    source_row_count = count_rows(table, source_host, 'source', count_strategy)
+    dest_row_count = count_rows(table, dest_host, dest_role, count_strategy)
     if source_row_count >= dest_row_count:
         return 1
 
@@ -337,6 +2023,60 @@ def perform_validity_check(table, source_host, dest_host, threshold):
                  (table, source_row_count, dest_row_count, 100 - ratioInPct, threshold))
     return 0
 
+def check_estimates(table, source_host, dest_host, threshold, decide=False):
+    '''
+        Performs the row count threshold check of perform_validity_check on the estimates of the 
+        table statistics, assumed to be off by at most settings.count_error_bound. Tables with fewer
+        rows than settings.count_min_rows are left to be counted.
+        
+        Keyword arguments:
+            table -- String name of the table to check
+            source_host -- MySQLHost source host to check
+            dest_host -- MySQLHost destination host to check
+            threshold -- the percent threshold of the check
+            decide -- decide on the estimates themselves when their bounds can not (defaults to False)
+               
+        returns --  True if the check passes, False if it fails, None if it is left to counting
+    '''
+    source_bounds = counts.estimate_bounds(source_host, table, settings.count_error_bound)
+    dest_bounds = counts.estimate_bounds(dest_host, table, settings.count_error_bound)
+    if source_bounds is None or dest_bounds is None:
+        return None
+    if not decide and min(source_bounds[2], dest_bounds[2]) < settings.count_min_rows:
+        return None
+    
+    passed = counts.check_threshold(source_bounds, dest_bounds, threshold)
+    if passed is None and decide:
+        passed = counts.passes_threshold(source_bounds[2], dest_bounds[2], threshold)
+    if passed is not None:
+        logger.debug('Validity check for table %s %s on estimates: source has about %d rows, dest has about %d rows, threshold is %d percent' % \
+                     (table, "passed" if passed else "failed", source_bounds[2], dest_bounds[2], threshold))
+    if passed is False and decide:
+        logger.error('Table %s failed validation on estimates: source has about %d rows, destination has about %d rows, threshold is %d percent' % \
+                     (table, source_bounds[2], dest_bounds[2], threshold))
+    return passed
+
+def count_rows(table, host, role, count_strategy='exact'):
+    '''
+        Counts the rows of the specified table exactly: with parallel counts over primary key ranges 
+        (see counts.parallel_row_count) for the parallel strategy, and for the auto strategy when the 
+        table has an estimated settings.count_min_rows rows or more. Otherwise with a single 
+        select count(*).
+        
+        Keyword arguments:
+            table -- String name of the table to count
+            host -- MySQLHost the table is on
+            role -- the connection pool role of the host, 'source', 'target' or the role of a 
+                    fan-out target
+            count_strategy -- one of counts.count_strategies (defaults to exact)
+               
+        returns -- the number of rows, None if the table does not exist
+    '''
+    if count_strategy == 'parallel' or \
+       (count_strategy == 'auto' and (host.get_row_estimate(table) or 0) >= settings.count_min_rows):
+        return counts.parallel_row_count(host, table, get_connection_pool(), role, settings.count_workers)
+    return host.get_row_count(table)
+
 def schema_compare(table, source_host, dest_host, include_keys=False):
     '''
         Performs a schema comparison for the specified table possibly ignoring indexes/keys. 
@@ -366,7 +2106,82 @@ def schema_compare(table, source_host, dest_host, include_keys=False):
     
     return 1
 
-def is_last_mod_same(table, source_host, dest_host):
+# fingerprints stored by the previous run, loaded by main before the copy starts
+stored_fingerprints = dict()
+
+def is_table_unchanged(table, source_host, dest_host, dest_role='target'):
+    '''
+        Decides whether the specified table is unchanged since it was last copied, trying the 
+        cheapest checks first:
+        
+         1. the metadata fingerprints of both tables against the fingerprints stored by the
+            previous run (see changedetect.compare_metadata), a few milliseconds
+         2. the live checksums of both tables (see MySQLHost.get_quick_checksum)
+         3. the row counts and max lastModifiedDate of both tables (see is_last_mod_same)
+        
+        The first check that can tell decides, with change detection turned off only the last 
+        one is done.
+        
+        Keyword arguments:
+            table -- String name of the table to check
+            source_host -- MySQLHost source host
+            dest_host -- MySQLHost destination host
+            dest_role -- the connection pool role of the destination host (defaults to target)
+               
+        returns -- True if the table is unchanged
+    '''
+    if settings.change_detection:
+        source = changedetect.normalize(source_host.get_table_fingerprints([table]).get(table))
+        target = changedetect.normalize(dest_host.get_table_fingerprints([table]).get(table))
+        unchanged = changedetect.compare_metadata(stored_fingerprints.get(table), source, target)
+        if unchanged is not None:
+            logger.debug("Table %s is %s according to its metadata" % (table, "unchanged" if unchanged else "changed"))
+            if unchanged:
+                metrics.choose('skip', 'unchanged metadata fingerprint')
+            return unchanged
+        
+        unchanged = changedetect.compare_checksums(source_host.get_quick_checksum(table), dest_host.get_quick_checksum(table))
+        if unchanged is not None:
+            logger.debug("Table %s is %s according to its live checksum" % (table, "unchanged" if unchanged else "changed"))
+            if unchanged:
+                metrics.choose('skip', 'same live checksum')
+            return unchanged
+    
+    unchanged = is_last_mod_same(table, source_host, dest_host, dest_role)
+    if unchanged:
+        metrics.choose('skip', 'same row count and last modified date')
+    return unchanged
+
+def take_fingerprints(host, tables):
+    '''
+        Takes the metadata fingerprints of the specified tables on a host (see changedetect), 
+        without failing the run if they can not be taken.
+        
+        returns -- a dict of table name to fingerprint
+    '''
+    try:
+        fingerprints = host.get_table_fingerprints(tables)
+    except:
+        logger.warn("Unable to take the fingerprints of the tables on %s" % host.host, exc_info=1)
+        return dict()
+    return dict((table, changedetect.normalize(fingerprint)) for table, fingerprint in fingerprints.items())
+
+def get_fingerprint_file():
+    """
+        returns -- the path of the file the fingerprints of copied tables are kept in (see changedetect)
+    """
+    if settings.fingerprint_file:
+        return settings.fingerprint_file
+    return os.path.join(settings.dump_dir, 'pydbcopy_fingerprints.json')
+
+def get_fingerprint_prefix():
+    """
+        returns -- the prefix the fingerprints of tables copied between the configured source and 
+                   target are kept under
+    """
+    return "%s/%s>%s/%s/" % (settings.source_host, settings.source_database, settings.target_host, settings.target_database)
+
+def is_last_mod_same(table, source_host, dest_host, dest_role='target'):
     '''
         Compares for equality the max lastModifiedDate (if it exists) for the specified 
         table on source and destination. This check is contingent on row counts being the 
@@ -375,13 +2190,16 @@ def is_last_mod_same(table, source_host, dest_host):
         Keyword arguments:
             source_host -- MySQLHost from which to compare the max lastModifiedDate
             dest_host -- MySQLHost to which to compare the max lastModifiedDate
+            dest_role -- the connection pool role of dest_host, to count its rows in parallel
+                         (defaults to target)
                
         returns -- If either table does not have a lastModifiedField, return 0.
                    If destination lastMod is >= source lastMod and row counts are equal
                    then return 1.
                    Otherwise return 0.
     '''
-    if source_host.get_row_count(table) == dest_host.get_row_count(table):
+    if count_rows(table, source_host, 'source', settings.count_strategy) == \
+       count_rows(table, dest_host, dest_role, settings.count_strategy):
         src_last_mod = source_host.get_table_max_modified(table)
         dest_last_mod = dest_host.get_table_max_modified(table)
         if(src_last_mod is None or src_last_mod == -1 or 
@@ -391,35 +2209,54 @@ def is_last_mod_same(table, source_host, dest_host):
             return 1
     return 0
 
-def retrieve_remote_dumpfile(source_host, scp_user, remote_filename, local_filename):
+# the transports of the current process (see get_transport_selector), with the pid they belong to
+transport_selector = None
+delta_transport = None
+transport_selector_pid = None
+
+def get_transport_selector(scp_user):
+    """
+        Gets the TransportSelector of the current process, so the transfer rates measured by its
+        transports are kept across tables.
+        
+        Keyword arguments:
+            scp_user -- String of the username to connect to the source as
+               
+        returns -- a transport.TransportSelector
+    """
+    global transport_selector, delta_transport, transport_selector_pid
+    if transport_selector is None or transport_selector_pid != os.getpid():
+        transport_selector = transport.create_selector(settings.transfer_method, scp_user, settings.transfer_streams, \
+                                                       settings.transfer_compression, settings.transfer_ssh_cipher or None, \
+                                                       settings.verbosity == 0)
+        delta_transport = delta.DeltaTransport(scp_user, cipher=settings.transfer_ssh_cipher or None, quiet=settings.verbosity == 0)
+        transport_selector_pid = os.getpid()
+    return transport_selector
+
+def retrieve_remote_dumpfile(source_host, scp_user, remote_filename, local_filename, spool_key=None):
     """
-        Retrieves a file from a remote host via SCP.
+        Retrieves a file from a remote host and removes it there, with the transport picked by the
+        configured transfer method (see transport). If delta transfers are on and the previous dump
+        with the same spool key was kept, only the differences with it are transferred (see delta).
         
         Keyword arguments:
-            source_host -- String hostname or IP of the host from which to retrieve the file
+            source_host -- MySQLHost of the host from which to retrieve the file
             scp_user -- String of the username to connect to source_host as
             remote_filename -- String containing the remote filesystem path of the file to retrieve
             local_filename -- String containing the local filesystem path to which to store the file 
+            spool_key -- the key the previous dump of the same rows was kept under (defaults to None)
                
         returns -- True if file retrieval was successful, False otherwise
     """
-    if source_host.host != 'localhost':
-        logger.debug("Retrieving remote file %s@%s:%s to %s" % (scp_user, source_host.host, remote_filename, local_filename))
-        quietOpt = "" if settings.verbosity > 0 else "-q"
-        exit_status = os.system('scp -c arcfour -C -B %s "%s@%s:%s" "%s"' % (quietOpt, scp_user, source_host.host, remote_filename, local_filename))
-        if exit_status != 0:
-            logger.debug("Error retrieving remote file, check ssh config!")
-            return False
-        # cleanup
-        logger.debug("Removing remote file %s from %s" % (remote_filename, source_host.host))
-        quietOpt = "" if settings.verbosity > 0 else " &> /dev/null"
-        exit_status = os.system('echo "rm \"%s\"" | sftp -b - "%s@%s" %s' % (remote_filename, scp_user, source_host.host, quietOpt))
-        if exit_status != 0:
-            logger.warn("Error removing remote dump file %s, check remote permissions for %s on %s!" % \
-                             (remote_filename, scp_user, source_host.host))
-        else:
-            logger.debug("Successfully removed file %s on host %s" % (remote_filename, source_host.host))
-    return True
+    logger.debug("Retrieving remote file %s@%s:%s to %s" % (scp_user, source_host.host, remote_filename, local_filename))
+    selector = get_transport_selector(scp_user)
+    if use_delta_transfer(source_host, spool_key) and delta_transport.usable(source_host.host):
+        basis = get_delta_spool().basis(spool_key)
+        if basis is not None:
+            if delta_transport.transfer_delta(source_host.host, remote_filename, local_filename, basis):
+                return True
+            logger.warn("Delta transfer of %s from %s failed, transferring it whole" % (remote_filename, source_host.host))
+    return selector.transfer(source_host.host, remote_filename, local_filename)
 
 def get_option_parser():
     """Get a handler for command line arguments"""
@@ -516,6 +2353,144 @@ def get_option_parser():
                       dest='debug',
                       help='Run in debug mode, turns off multi-processing [default: %s]' % settings.debug)
 
+    parser.add_option('-c', '--chunks',
+                      action='store',
+                      type='int',
+                      dest='chunks',
+                      help='Split full copies of large tables into this many primary key ranges that are copied in parallel, 0 or 1 to disable [default: %s]' % settings.chunks)
+
+    parser.add_option('--chunkminrows',
+                      action='store',
+                      type='int',
+                      dest='chunk_min_rows',
+                      help='Only split tables with at least this many rows (estimated) into chunks [default: %s]' % settings.chunk_min_rows)
+
+    parser.add_option('-M', '--copymethod',
+                      action='store',
+                      type='choice',
+                      choices=['outfile', 'stream'],
+                      dest='copy_method',
+                      help='How rows are moved: "outfile" (select into outfile, scp, load data infile) or "stream" (straight from a source cursor into load data local infile, no dump files) [default: %s]' % settings.copy_method)
+
+    parser.add_option('-P', '--pipeline',
+                      action='store_true',
+                      dest='pipeline',
+                      help='Copy with a pipeline of export, transfer and load thread pools so the stages of different tables overlap, instead of one process per table (outfile copy method only) [default: %s]' % settings.pipeline)
+
+    parser.add_option('-O', '--noschedule',
+                      action='store_true',
+                      dest='no_schedule',
+                      help='Copy tables in the configured order instead of longest first (by size and previous copy durations) [default: %s]' % (not settings.schedule_longest_first))
+
+    parser.add_option('--diffmethod',
+                      action='store',
+                      type='choice',
+                      choices=sorted(hashdiff.diff_methods.keys()),
+                      dest='diff_method',
+                      help='How incremental copies find changed rows: "set" (fetch every fieldHash from both hosts into python sets), "bucket" (compare digests of hash prefix buckets in SQL and only fetch the hashes of buckets that differ), "compact" (stream the hashes into sorted numpy arrays) or "merge" (walk the hashes of both hosts in index order in lockstep, constant memory) [default: %s]' % settings.diff_method)
+
+    parser.add_option('--deletestrategy',
+                      action='store',
+                      type='choice',
+                      choices=list(delete_strategies),
+                      dest='delete_strategy',
+                      help='How incremental copies delete rows from the target: "batch" (delete statements sized to max_allowed_packet), "join" (stage the hashes in a temporary table and delete with one join), "rebuild" (copy the rows to keep into a new table and swap it in) or "auto" (pick one by delete fraction and engine) [default: %s]' % settings.delete_strategy)
+
+    parser.add_option('--shadowload',
+                      action='store_true',
+                      dest='shadow_load',
+                      help='Load full copies into a shadow table without secondary keys, build the keys and swap it in for the target table with an atomic rename table, so readers never see a half loaded table [default: %s]' % settings.shadow_load)
+
+    parser.add_option('--bulkload',
+                      action='store_true',
+                      dest='bulk_load',
+                      help='Turn off unique_checks and foreign_key_checks for the sessions loading the target [default: %s]' % settings.bulk_load)
+
+    parser.add_option('--skipbinlog',
+                      action='store_true',
+                      dest='bulk_load_skip_binlog',
+                      help='Turn off sql_log_bin for the sessions loading the target, the loads are not replicated (needs the SUPER privilege) [default: %s]' % settings.bulk_load_skip_binlog)
+
+    parser.add_option('--deferkeys',
+                      action='store_true',
+                      dest='bulk_load_defer_keys',
+                      help='Drop the secondary keys of a target table before a full load and build them once it is done [default: %s]' % settings.bulk_load_defer_keys)
+
+    parser.add_option('--exportordered',
+                      action='store_true',
+                      dest='export_ordered',
+                      help='Export rows in primary key order so InnoDB appends to the target instead of splitting pages [default: %s]' % settings.export_ordered)
+
+    parser.add_option('--watermark',
+                      action='store_true',
+                      dest='watermark_copy',
+                      help='Copy tables without a fieldHash column incrementally: only rows at or above the max lastModifiedDate (or auto increment key) of the target are copied and upserted [default: %s]' % settings.watermark_copy)
+
+    parser.add_option('--reconcile',
+                      action='store_true',
+                      dest='reconcile',
+                      help='After a watermark copy always compare the primary keys of both tables to delete rows removed from the source, not only when the target has more rows [default: %s]' % settings.reconcile)
+
+    parser.add_option('--cdc',
+                      action='store_true',
+                      dest='cdc',
+                      help='Keep the tables in sync by applying the row based binary log of the source to the target, after a full copy on the first run (needs python-mysql-replication) [default: %s]' % settings.cdc)
+
+    parser.add_option('--nochangedetect',
+                      action='store_true',
+                      dest='no_change_detection',
+                      help='Decide whether tables changed with row counts and max lastModifiedDate only, instead of trying metadata fingerprints and live checksums first [default: %s]' % (not settings.change_detection))
+
+    parser.add_option('--nocatalogcache',
+                      action='store_true',
+                      dest='no_catalog_cache',
+                      help='Query the metadata of every table on every check instead of prefetching it for all tables at startup [default: %s]' % (not settings.catalog_cache))
+
+    parser.add_option('--poolsize',
+                      dest='connection_pool_size',
+                      help='The number of idle connections to each host kept open by each process and reused across tables, 0 to connect for every table [default: %s]' % settings.connection_pool_size,
+                      metavar='NUM')
+
+    parser.add_option('--countstrategy',
+                      dest='count_strategy',
+                      type='choice',
+                      choices=counts.count_strategies,
+                      help='How rows are counted for the validity and last modified checks: exact, estimate (table statistics only), parallel (primary key ranges on parallel connections) or auto (estimates, counting only when they can not decide) [default: %s]' % settings.count_strategy)
+
+    parser.add_option('--transfer',
+                      dest='transfer_method',
+                      type='choice',
+                      choices=transport.transfer_methods,
+                      help='How dump files are transferred from a remote source: ssh (scp over a reused ssh connection), stream (parallel compressed streams) or auto (the fastest measured) [default: %s]' % settings.transfer_method)
+
+    parser.add_option('--delta',
+                      action='store_true',
+                      dest='delta_transfer',
+                      help='Keep the dump of each full copy and transfer only the differences of the next dump with it, using rsync [default: %s]' % settings.delta_transfer)
+
+    parser.add_option('--metrics',
+                      action='store', type='string', dest='metrics_file', metavar='FILE',
+                      help='Append the metrics of every table (strategy, and wall time, bytes and rows of every stage) to this JSON lines file')
+
+    parser.add_option('--concurrentverify',
+                      action='store_true',
+                      dest='concurrent_verify',
+                      help='Verify all tables up front on concurrent threads of the main process, only the tables to copy are handed to the worker processes [default: %s]' % settings.concurrent_verify)
+
+    parser.add_option('--targets',
+                      action='store', type='string', dest='targets', metavar='\"HOST/DATABASE HOST/DATABASE ...\"',
+                      help='Fan-out copy: export each table once and load it into every one of these targets in parallel')
+
+    parser.add_option('--dumpspool',
+                      action='store_true',
+                      dest='dump_spool',
+                      help='Keep the dumps of full copies and load unchanged tables from them instead of exporting them again [default: %s]' % settings.dump_spool)
+
+    parser.add_option('--resume',
+                      action='store_true',
+                      dest='resume',
+                      help='Checkpoint chunked full copies and resume the ones left unfinished by a failed run [default: %s]' % settings.resume)
+
     return parser
  
 if __name__ == '__main__':
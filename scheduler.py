@@ -0,0 +1,81 @@
+"""
+  Orders tables for copying longest-processing-time first, using table sizes and the durations
+  of previous runs.
+"""
+import multiprocessing
+import jsonstore
+
+logger = multiprocessing.get_logger()
+
+def load_history(filename, prefix):
+    """
+        Loads the durations of previous copies from a history file written by save_history.
+
+        Keyword arguments:
+            filename -- path of the history file
+            prefix -- the prefix the tables of interest are stored under (see save_history)
+
+        returns -- a dict of table name to seconds, empty if there is no (readable) history
+    """
+    return jsonstore.load_prefixed(filename, prefix, 'copy history file')
+
+def save_history(filename, prefix, durations):
+    """
+        Stores the durations of the copies of this run in the history file, keeping the durations
+        stored for other tables (and other prefixes).
+
+        Keyword arguments:
+            filename -- path of the history file
+            prefix -- a prefix to store the tables under, identifying the source (for example
+                      "host/database/")
+            durations -- a dict of table name to seconds
+    """
+    if not filename or len(durations) == 0:
+        return
+    jsonstore.save_prefixed(filename, prefix, durations, 'copy history file')
+
+def estimate_durations(tables, sizes, history):
+    """
+        Estimates how long copying each table will take. Tables copied before get the duration of
+        their last copy. The others get their size divided by the throughput observed for tables
+        that have both a size and a duration. Without any such table the size itself (in bytes) is
+        the estimate, which orders the tables just as well.
+
+        Keyword arguments:
+            tables -- list of table names
+            sizes -- a dict of table name to (bytes, rows) tuple, see MySQLHost.get_table_sizes
+            history -- a dict of table name to seconds, see load_history
+
+        returns -- a dict of table name to estimated cost
+    """
+    known = [table for table in tables if history.get(table) and sizes.get(table) and sizes[table][0]]
+    total_bytes = sum(sizes[table][0] for table in known)
+    total_seconds = sum(history[table] for table in known)
+
+    estimates = dict()
+    for table in tables:
+        size = (sizes.get(table) or (0, 0))[0] or 0
+        if total_seconds > 0:
+            if history.get(table):
+                estimates[table] = history[table]
+            else:
+                estimates[table] = size * total_seconds / float(total_bytes)
+        else:
+            estimates[table] = size
+    return estimates
+
+def order_longest_first(tables, sizes, history=None):
+    """
+        Orders tables longest-processing-time first, so the largest tables are started while every
+        worker is still free and the small ones fill the gaps at the end of the run. Tables with the
+        same estimate keep their configured order.
+
+        Keyword arguments:
+            tables -- list of table names
+            sizes -- a dict of table name to (bytes, rows) tuple, see MySQLHost.get_table_sizes
+            history -- a dict of table name to seconds, see load_history (defaults to None)
+
+        returns -- a new list of the table names
+    """
+    estimates = estimate_durations(tables, sizes, history or dict())
+    return sorted(tables, key=lambda table: estimates[table], reverse=True)
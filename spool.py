@@ -0,0 +1,205 @@
+"""
+  Spool of table dumps reused across targets and runs. A full dump of a table is kept gzipped
+  under a key derived from the source host, database and table, the table structure and a
+  fingerprint of its contents (see pydbcopy.get_dump_key). As long as the fingerprint of the
+  table does not change its dump is loaded from the spool, without exporting or transferring it
+  again. The spool is kept within a size budget by evicting the least recently used dumps first.
+"""
+import os
+import json
+import gzip
+import glob
+import hashlib
+import tempfile
+import time
+import multiprocessing
+import jsonstore
+
+logger = multiprocessing.get_logger()
+
+def dump_key(host, database, table, structure, fingerprint):
+    """
+        Derives the key of a dump in the spool.
+
+        Keyword arguments:
+            host -- the source host
+            database -- the source database
+            table -- name of the table
+            structure -- the create table statement of the table, see MySQLHost.get_table_structure
+            fingerprint -- a dict that changes whenever the rows of the table do
+
+        returns -- the hex SHA-1 digest of all of the above
+    """
+    return hashlib.sha1(json.dumps([host, database, table, structure, fingerprint], sort_keys=True)).hexdigest()
+
+class DumpSpool(object):
+    """
+        A directory of gzipped dumps named after their keys and the SHA-1 checksums of their
+        uncompressed contents, each key with a JSON file describing its current dump: the 
+        checksum and size of the dump and what it is a dump of. A dump is never changed once
+        stored, so a worker fetching a key while another stores it reads either the previous
+        dump or the new one, each with its own checksum.
+    """
+    def __init__(self, directory, budget):
+        """
+            Keyword arguments:
+                directory -- the spool directory, created on first use
+                budget -- the number of bytes of compressed dumps to keep at most
+        """
+        self.directory = directory
+        self.budget = budget
+
+    def dump_path(self, key, checksum):
+        return os.path.join(self.directory, "%s.%s.csv.gz" % (key, checksum))
+
+    def meta_path(self, key):
+        return os.path.join(self.directory, "%s.json" % key)
+
+    def dumps(self, key):
+        """
+            returns -- the paths of the dumps stored under a key, the current one and any not
+                       removed yet
+        """
+        return glob.glob(os.path.join(self.directory, "%s.*.csv.gz" % key))
+
+    def fetch(self, key, dump_dir):
+        """
+            Decompresses the spooled dump of a key into a new file, checking it against its
+            checksum. A dump that fails the check is removed from the spool.
+
+            Keyword arguments:
+                key -- the key of the dump (see dump_key)
+                dump_dir -- the directory to decompress the dump into
+
+            returns -- the path of the decompressed dump, None if the key is not spooled
+        """
+        meta = jsonstore.load(self.meta_path(key), 'spooled dump description')
+        if meta is None:
+            return None
+        dump = self.dump_path(key, meta['checksum'])
+        try:
+            compressed = gzip.open(dump, 'rb')
+        except (IOError, OSError):
+            # replaced by another worker meanwhile
+            return None
+
+        fd, filename = tempfile.mkstemp(suffix='.csv', dir=dump_dir)
+        digest = hashlib.sha1()
+        try:
+            out = os.fdopen(fd, 'wb')
+            try:
+                block = compressed.read(1048576)
+                while block:
+                    digest.update(block)
+                    out.write(block)
+                    block = compressed.read(1048576)
+            finally:
+                out.close()
+                compressed.close()
+        except (IOError, OSError, EOFError, ValueError):
+            logger.warn("Spooled dump %s is unreadable" % dump, exc_info=1)
+            digest = None
+
+        if digest is None or digest.hexdigest() != meta['checksum']:
+            logger.warn("Spooled dump of %s failed its checksum, removing it" % meta.get('table'))
+            os.remove(filename)
+            self.remove(key, meta['checksum'])
+            return None
+
+        # the time of last use, which decides the order of eviction
+        try:
+            os.utime(dump, None)
+        except OSError:
+            pass
+        return filename
+
+    def store(self, key, filename, description=None):
+        """
+            Compresses a dump into the spool under a key, replacing any dump of the key, and
+            evicts the least recently used dumps beyond the budget.
+
+            Keyword arguments:
+                key -- the key of the dump (see dump_key)
+                filename -- path of the dump, it is left in place
+                description -- a dict of what the dump is of, stored along with it (defaults to None)
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        temp_dump = os.path.join(self.directory, "%s.%d.tmp" % (key, os.getpid()))
+        digest = hashlib.sha1()
+        size = 0
+        f = open(filename, 'rb')
+        try:
+            compressed = gzip.open(temp_dump, 'wb', 1)
+            try:
+                block = f.read(1048576)
+                while block:
+                    digest.update(block)
+                    compressed.write(block)
+                    size += len(block)
+                    block = f.read(1048576)
+            finally:
+                compressed.close()
+        finally:
+            f.close()
+
+        meta = dict(description or {})
+        meta.update(checksum=digest.hexdigest(), size=size, stored_at=time.time())
+        dump = self.dump_path(key, meta['checksum'])
+        os.rename(temp_dump, dump)
+        jsonstore.save(self.meta_path(key), meta)
+        for previous in self.dumps(key):
+            if previous != dump:
+                try:
+                    os.remove(previous)
+                except OSError:
+                    pass
+        self.evict(key)
+
+    def remove(self, key, checksum=None):
+        """
+            Removes the dumps of a key from the spool, if they are there.
+
+            Keyword arguments:
+                key -- the key of the dumps
+                checksum -- only remove the dump with this checksum, and the description of the
+                            key if it still describes that dump (defaults to None, all of them)
+        """
+        paths = self.dumps(key) if checksum is None else [self.dump_path(key, checksum)]
+        meta = jsonstore.load(self.meta_path(key), 'spooled dump description') if checksum is not None else None
+        if checksum is None or (meta is not None and meta.get('checksum') == checksum):
+            paths.append(self.meta_path(key))
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def evict(self, keep=None):
+        """
+            Removes the least recently used dumps until the spool fits in its budget.
+
+            Keyword arguments:
+                keep -- the key of a dump not to evict, the one just stored (defaults to None)
+
+            returns -- the number of dumps removed
+        """
+        dumps = []
+        for path in glob.glob(os.path.join(self.directory, '*.csv.gz')):
+            try:
+                dumps.append((os.path.getmtime(path), os.path.getsize(path), os.path.basename(path).split('.')[0]))
+            except OSError:
+                # removed by another process meanwhile
+                pass
+        total = sum(size for used, size, key in dumps)
+        removed = 0
+        for used, size, key in sorted(dumps):
+            if total <= self.budget:
+                break
+            if key == keep:
+                continue
+            logger.debug("Evicting dump %s (%d bytes) from the spool" % (key, size))
+            self.remove(key)
+            total -= size
+            removed += 1
+        return removed
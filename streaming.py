@@ -0,0 +1,160 @@
+"""
+  Streams rows from a source MySQL host straight into a LOAD DATA LOCAL INFILE on a destination
+  host through a named pipe, so no dump file is written on either host.
+"""
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import datetime
+import time
+import multiprocessing
+
+logger = multiprocessing.get_logger()
+
+def escape_value(value):
+    """
+        Encodes a single column value in the default LOAD DATA INFILE format (fields terminated
+        by tab, escaped by backslash, lines terminated by newline).
+
+        Keyword arguments:
+            value -- a column value as returned by MySQLdb
+
+        returns -- a string suitable for a field of a LOAD DATA INFILE line
+    """
+    if value is None:
+        return '\\N'
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    elif isinstance(value, float):
+        value = repr(value)
+    elif isinstance(value, datetime.timedelta):
+        # TIME columns, which may be negative or longer than a day
+        microseconds = (value.days * 86400 + value.seconds) * 1000000 + value.microseconds
+        sign = '-' if microseconds < 0 else ''
+        seconds, microseconds = divmod(abs(microseconds), 1000000)
+        value = '%s%02d:%02d:%02d' % (sign, seconds // 3600, seconds // 60 % 60, seconds % 60)
+        if microseconds:
+            value += '.%06d' % microseconds
+    elif isinstance(value, (set, frozenset)):
+        # SET columns
+        value = ','.join(sorted(value))
+    elif not isinstance(value, str):
+        value = str(value)
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\0', '\\0')
+
+def encode_rows(rows):
+    """
+        Encodes a batch of rows in the default LOAD DATA INFILE format.
+
+        Keyword arguments:
+            rows -- a list of row tuples
+
+        returns -- a string with one line per row
+    """
+    return ''.join('\t'.join(escape_value(value) for value in row) + '\n' for row in rows)
+
+class RowStreamWriter(threading.Thread):
+    """
+        Writes batches of rows into a named pipe from a separate thread while the destination
+        host loads them from the other end of the pipe. Only one batch is held in memory at a
+        time; the pipe blocks the writer whenever the load falls behind.
+    """
+    def __init__(self, pipe_name, batches):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.pipe_name = pipe_name
+        self.batches = batches
+        self.rows = 0
+        self.bytes = 0
+        self.error = None
+        self.cancelled = False
+
+    def run(self):
+        try:
+            try:
+                pipe = open(self.pipe_name, 'wb')
+                try:
+                    for batch in self.batches:
+                        if self.cancelled:
+                            break
+                        data = encode_rows(batch)
+                        pipe.write(data)
+                        self.rows += len(batch)
+                        self.bytes += len(data)
+                finally:
+                    pipe.close()
+            finally:
+                self.batches.close()
+        except:
+            self.error = sys.exc_info()
+
+    def cancel(self):
+        """
+            Stops the writer once the load has failed. Whatever the writer still writes is read
+            and discarded so it is never left blocked on the pipe.
+        """
+        self.cancelled = True
+        fd = os.open(self.pipe_name, os.O_RDONLY | os.O_NONBLOCK)
+        try:
+            while self.is_alive():
+                try:
+                    if not os.read(fd, 65536):
+                        time.sleep(0.01)
+                except OSError:
+                    time.sleep(0.01)
+        finally:
+            os.close(fd)
+
+def stream_rows(table, source_host, dest_host, hash_set=None, key_range=None, batch_size=10000, dest_table=None, \
+                order_by_key=False, session_variables=None, replace=False):
+    """
+        Copies rows of the specified table from source to destination by reading them with an
+        unbuffered cursor on the source and feeding them through a named pipe into a LOAD DATA
+        LOCAL INFILE on the destination. The load is only committed if every row was read from
+        the source, otherwise it is rolled back and an error is raised.
+
+        Keyword arguments:
+            table -- String name of the table to copy
+            source_host -- MySQLHost source host to copy from (can be remote)
+            dest_host -- MySQLHost destination host to copy to
+            hash_set -- a set of hashes (from the fieldHash column) of the rows to copy,
+                        if None all rows are copied
+            key_range -- see MySQLHost.select_into_outfile
+            batch_size -- the number of rows read and encoded at a time (defaults to 10,000)
+            dest_table -- name of the table to load into on the destination (defaults to table)
+            order_by_key -- read the rows in primary key order (defaults to False)
+            session_variables -- see MySQLHost.load_data_in_file
+            replace -- see MySQLHost.load_data_in_file
+
+        returns -- the number of rows copied
+    """
+    dest_table = dest_table or table
+    pipe_dir = tempfile.mkdtemp(prefix='pydbcopy_')
+    pipe_name = os.path.join(pipe_dir, table)
+    os.mkfifo(pipe_name)
+
+    writer = RowStreamWriter(pipe_name, source_host.iter_row_batches(table, hash_set, key_range, batch_size, order_by_key))
+    logger.debug("Streaming %s.%s from %s to %s.%s on %s..." % \
+                 (source_host.database, table, source_host.host, dest_host.database, dest_table, dest_host.host))
+    writer.start()
+    try:
+        try:
+            dest_host.load_data_in_file(dest_table, pipe_name, commit=False, session_variables=session_variables, replace=replace)
+        except:
+            error = sys.exc_info()
+            writer.cancel()
+            dest_host.rollback()
+            raise error[0], error[1], error[2]
+
+        writer.join()
+        if writer.error is not None:
+            dest_host.rollback()
+            raise writer.error[0], writer.error[1], writer.error[2]
+        dest_host.commit()
+    finally:
+        shutil.rmtree(pipe_dir, True)
+
+    logger.debug("Streamed %d rows (%d bytes) of %s" % (writer.rows, writer.bytes, table))
+    return writer.rows
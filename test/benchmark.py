@@ -0,0 +1,304 @@
+"""
+  Benchmarks of pydbcopy, run from the test directory like the tests:
+
+     python benchmark.py [options] [--output results.json] [--baseline previous.json]
+
+  The microbenchmarks time the hash diff methods (see hashdiff) on in-memory hashes and need no
+  database. The copy benchmarks generate synthetic tables of the configured row counts, widths
+  and change rates on the local MySQL databases of the tests (see pydbcopy.conf), standing in
+  for the production hosts, and time the full copy, diff, delete and incremental copy of each.
+  The generated tables are named tmp_bench_* and dropped afterwards. The results are written as
+  JSON, and compared to the results of a previous version with --baseline: every benchmark that
+  got slower by more than the tolerance is reported and the exit code is 1.
+"""
+import sys
+import json
+import time
+import random
+import hashlib
+import platform
+import subprocess
+import optparse
+import logging
+import multiprocessing
+import hashdiff
+from hashdifftest import FakeHost, make_hashes
+
+logger = multiprocessing.get_logger()
+logger.setLevel(logging.WARNING)
+logger.addHandler(logging.StreamHandler(sys.stderr))
+
+# the kinds of synthetic tables: with a fieldHash column (incremental copies), with a
+# lastModifiedDate column (watermark copies) and with neither (full copies only)
+FLAVOURS = ('hashed', 'modified', 'plain')
+
+# benchmarks faster than this are too noisy to report as regressions
+NOISE_SECONDS = 0.05
+
+def get_option_parser():
+    parser = optparse.OptionParser(usage='python benchmark.py [options]')
+    parser.add_option('-f', '--config', action='store', type='string', dest='config_file', default='pydbcopy.conf',
+                      help='The configuration of the local MySQL databases to benchmark on (defaults to pydbcopy.conf)')
+    parser.add_option('--rows', action='store', type='string', dest='rows', default='10000,100000',
+                      help='Comma separated row counts of the synthetic tables (defaults to 10000,100000)')
+    parser.add_option('--width', action='store', type='int', dest='width', default=100,
+                      help='Width in characters of the payload column of the synthetic tables (defaults to 100)')
+    parser.add_option('--change-rate', action='store', type='float', dest='change_rate', default=0.05,
+                      help='Fraction of the rows updated, deleted and inserted between copies (defaults to 0.05)')
+    parser.add_option('--flavours', action='store', type='string', dest='flavours', default=','.join(FLAVOURS),
+                      help='Comma separated kinds of synthetic tables: hashed, modified and/or plain (defaults to all)')
+    parser.add_option('--repeat', action='store', type='int', dest='repeat', default=3,
+                      help='Number of runs of each microbenchmark, the fastest counts (defaults to 3)')
+    parser.add_option('--micro', action='store_true', dest='micro_only', default=False,
+                      help='Only run the microbenchmarks, no database needed')
+    parser.add_option('-o', '--output', action='store', type='string', dest='output',
+                      help='Write the results to this JSON file')
+    parser.add_option('--baseline', action='store', type='string', dest='baseline',
+                      help='Compare the results to those of this JSON file')
+    parser.add_option('--tolerance', action='store', type='float', dest='tolerance', default=0.2,
+                      help='Fraction a benchmark may get slower than its baseline (defaults to 0.2)')
+    return parser
+
+def get_version():
+    """
+        returns -- the git description of the checked out version, None outside of a git tree
+    """
+    try:
+        process = subprocess.Popen(['git', 'describe', '--always', '--dirty'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out = process.communicate()[0]
+        if process.returncode == 0:
+            return out.strip()
+    except OSError:
+        pass
+    return None
+
+def timed(results, name, rows, work, repeat=1):
+    """
+        Times a benchmark and records the fastest of its runs.
+
+        Keyword arguments:
+            results -- the dict of benchmark name to result to record into
+            name -- name of the benchmark
+            rows -- the number of rows the benchmark goes through
+            work -- a function doing the work of a run
+            repeat -- the number of runs (defaults to 1)
+
+        returns -- the return value of the last run of work
+    """
+    best = None
+    for i in range(repeat):
+        started = time.time()
+        value = work()
+        seconds = time.time() - started
+        if best is None or seconds < best:
+            best = seconds
+    results[name] = { 'seconds' : best, 'rows' : rows, 'rows_per_second' : rows / best if best > 0 else None }
+    print "%-45s %9.3fs %12s rows/s" % (name, best, "%.0f" % (rows / best) if best > 0 else '-')
+    return value
+
+def run_microbenchmarks(results, row_counts, change_rate, repeat):
+    """
+        Times every hash diff method on hosts holding in-memory hashes (see hashdifftest.FakeHost),
+        the target missing and adding change_rate / 2 of the rows of the source each.
+    """
+    for rows in row_counts:
+        changed = int(rows * change_rate / 2)
+        source_hashes = make_hashes(0, rows)
+        target_hashes = make_hashes(changed, rows + changed)
+        for method in sorted(hashdiff.diff_methods):
+            def diff():
+                diffs = hashdiff.diff_hashes(method, 'bench', FakeHost(source_hashes), FakeHost(target_hashes))
+                for hashes in diffs[:2]:
+                    if hasattr(hashes, 'close'):
+                        hashes.close()
+            timed(results, "diff.%s.%d" % (method, rows), rows * 2, diff, repeat)
+
+def payload(row_id, version, width):
+    """
+        returns -- the synthetic payload of a version of a row, width characters long
+    """
+    text = hashlib.sha1("%d:%d" % (row_id, version)).hexdigest()
+    return (text * (width // len(text) + 1))[:width]
+
+def create_table(host, table, flavour, width):
+    """
+        Creates an empty synthetic table of a flavour (see FLAVOURS), replacing any existing one.
+    """
+    columns = ["id integer primary key", "payload varchar(%d)" % width]
+    if flavour == 'hashed':
+        columns.append("fieldHash varchar(32), key (fieldHash)")
+    elif flavour == 'modified':
+        columns.append("lastModifiedDate timestamp NOT NULL default CURRENT_TIMESTAMP on update CURRENT_TIMESTAMP")
+    c = host.conn.cursor()
+    try:
+        c.execute("SET AUTOCOMMIT=1")
+        c.execute("drop table if exists %s" % table)
+        c.execute("create table %s ( %s )" % (table, ', '.join(columns)))
+    finally:
+        c.close()
+
+def insert_rows(host, table, flavour, width, row_ids, version, batch_size=5000):
+    """
+        Inserts (or replaces) synthetic rows into a table of a flavour, in batches.
+    """
+    c = host.conn.cursor()
+    try:
+        c.execute("SET AUTOCOMMIT=1")
+        for i in range(0, len(row_ids), batch_size):
+            rows = []
+            for row_id in row_ids[i:i + batch_size]:
+                value = payload(row_id, version, width)
+                if flavour == 'hashed':
+                    rows.append((row_id, value, hashlib.md5(value).hexdigest()))
+                else:
+                    rows.append((row_id, value))
+            columns = "id, payload, fieldHash" if flavour == 'hashed' else "id, payload"
+            c.executemany("replace into %s (%s) values (%s)" % (table, columns, ', '.join(['%s'] * len(rows[0]))), rows)
+    finally:
+        c.close()
+
+def change_table(host, table, flavour, width, rows, change_rate, seed=1):
+    """
+        Changes change_rate of the rows of a synthetic table: a third of them updated, a third
+        deleted and a third inserted.
+
+        returns -- the number of rows changed
+    """
+    changed = int(rows * change_rate)
+    picked = random.Random(seed).sample(xrange(rows), 2 * (changed // 3))
+    updated, deleted = picked[:changed // 3], picked[changed // 3:]
+    insert_rows(host, table, flavour, width, sorted(updated), 1)
+    insert_rows(host, table, flavour, width, range(rows, rows + changed - len(picked)), 1)
+    c = host.conn.cursor()
+    try:
+        c.execute("SET AUTOCOMMIT=1")
+        for i in range(0, len(deleted), 5000):
+            c.execute("delete from %s where id in (%s)" % (table, ', '.join(str(row_id) for row_id in deleted[i:i + 5000])))
+    finally:
+        c.close()
+    return changed
+
+def drop_table(host, table):
+    c = host.conn.cursor()
+    try:
+        c.execute("SET AUTOCOMMIT=1")
+        c.execute("drop table if exists %s" % table)
+    finally:
+        c.close()
+
+def run_copy_benchmarks(results, options, row_counts, flavours):
+    """
+        Times the full copy of every synthetic table, then changes the source table and times the
+        diff methods, the delete strategies and the incremental copy of the hashed tables, and the
+        watermark copy of the modified tables.
+    """
+    import pydbcopy
+    from dbutils import MySQLHost
+    from config import settings
+
+    settings.read_properties(options.config_file)
+    settings.watermark_copy = True
+    source_host = MySQLHost(settings.source_host, settings.source_user, settings.source_password, settings.source_database)
+    dest_host = MySQLHost(settings.target_host, settings.target_user, settings.target_password, settings.target_database)
+
+    for rows in row_counts:
+        for flavour in flavours:
+            table = "tmp_bench_%s_%d" % (flavour, rows)
+            name = "%s.%d" % (flavour, rows)
+            print "Generating %s (%d rows of %d characters)" % (table, rows, options.width)
+            try:
+                create_table(source_host, table, flavour, options.width)
+                insert_rows(source_host, table, flavour, options.width, range(rows), 0)
+                drop_table(dest_host, table)
+
+                timed(results, "full_copy.%s" % name, rows, lambda: pydbcopy.perform_full_copy(table, source_host, dest_host, \
+                                                                                              settings.scp_user, settings.dump_dir))
+                if flavour == 'plain':
+                    continue
+                changed = change_table(source_host, table, flavour, options.width, rows, options.change_rate)
+                if flavour == 'modified':
+                    timed(results, "watermark_copy.%s" % name, changed, lambda: pydbcopy.perform_watermark_copy(table, \
+                          source_host, dest_host, settings.scp_user, settings.dump_dir))
+                    continue
+
+                for method in sorted(hashdiff.diff_methods):
+                    diffs = timed(results, "diff.%s.%s" % (method, name), rows * 2, \
+                                  lambda: hashdiff.diff_hashes(method, table, source_host, dest_host))
+                    if method == 'set':
+                        hashes_to_del = diffs[1]
+                for strategy in ('batch', 'join', 'rebuild'):
+                    copy = "%s_del" % table
+                    drop_table(dest_host, copy)
+                    c = dest_host.conn.cursor()
+                    try:
+                        c.execute("SET AUTOCOMMIT=1")
+                        c.execute("create table %s like %s" % (copy, table))
+                        c.execute("insert into %s select * from %s" % (copy, table))
+                    finally:
+                        c.close()
+                    timed(results, "delete.%s.%s" % (strategy, name), len(hashes_to_del), \
+                          lambda: dest_host.delete_records(copy, hashes_to_del, rows, strategy))
+                    drop_table(dest_host, copy)
+
+                timed(results, "incremental_copy.%s" % name, changed, lambda: pydbcopy.perform_incremental_copy(table, \
+                      source_host, dest_host, settings.scp_user, settings.dump_dir))
+            finally:
+                drop_table(source_host, table)
+                drop_table(dest_host, table)
+
+def compare_results(baseline, results, tolerance):
+    """
+        Compares the results of the benchmarks to those of a baseline run.
+
+        Keyword arguments:
+            baseline -- the results of the baseline run, a dict of benchmark name to result
+            results -- the results of this run
+            tolerance -- the fraction a benchmark may get slower than its baseline
+
+        returns -- a list of the names of the benchmarks that got slower than that, sorted
+    """
+    regressions = []
+    for name in sorted(set(baseline).intersection(results)):
+        before, after = baseline[name]['seconds'], results[name]['seconds']
+        if after > before * (1 + tolerance) and after - before > NOISE_SECONDS:
+            regressions.append(name)
+    return regressions
+
+def main(argv=None):
+    options = get_option_parser().parse_args(argv)[0]
+    row_counts = [int(rows) for rows in options.rows.split(',')]
+    results = dict()
+
+    run_microbenchmarks(results, row_counts, options.change_rate, options.repeat)
+    if not options.micro_only:
+        run_copy_benchmarks(results, options, row_counts, options.flavours.split(','))
+
+    run = { 'version' : get_version(), 'python' : platform.python_version(), 'started_at' : time.time(), \
+            'options' : { 'rows' : row_counts, 'width' : options.width, 'change_rate' : options.change_rate, \
+                          'flavours' : options.flavours.split(','), 'repeat' : options.repeat }, \
+            'results' : results }
+    if options.output:
+        f = open(options.output, 'w')
+        try:
+            json.dump(run, f, indent=1, sort_keys=True)
+        finally:
+            f.close()
+
+    if options.baseline:
+        f = open(options.baseline, 'r')
+        try:
+            baseline = json.load(f)
+        finally:
+            f.close()
+        if baseline.get('options') != run['options']:
+            print "Warning: the baseline %s was run with other options %s" % (options.baseline, baseline.get('options'))
+        regressions = compare_results(baseline['results'], results, options.tolerance)
+        for name in regressions:
+            print "Regression: %s took %.3fs, %.3fs in %s" % \
+                  (name, results[name]['seconds'], baseline['results'][name]['seconds'], baseline.get('version'))
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+import unittest
+from catalog import TableCatalog
+
+
+class TableCatalogTest(unittest.TestCase):
+    """
+        Tests caching and invalidating table metadata, these tests do not need a database.
+    """
+
+    def setUp(self):
+        self.catalog = TableCatalog()
+        self.catalog.store('source', 'db', 'Test', { 'exists' : True, 'table_rows' : 10, 'primary_key' : ['id'] })
+
+    def testLookup(self):
+        self.assertEquals(self.catalog.lookup('source', 'db', 'test', 'exists'), (True, True))
+        self.assertEquals(self.catalog.lookup('source', 'db', 'test', 'structure'), (False, None))
+        self.assertEquals(self.catalog.lookup('target', 'db', 'test', 'exists'), (False, None))
+
+    def testUpdate(self):
+        self.catalog.update('source', 'db', 'test', 'structure', 'CREATE TABLE `test`')
+        self.catalog.update('source', 'db', 'other', 'structure', 'CREATE TABLE `other`')
+        self.assertEquals(self.catalog.lookup('source', 'db', 'test', 'structure'), (True, 'CREATE TABLE `test`'))
+        self.assertEquals(self.catalog.lookup('source', 'db', 'other', 'structure'), (False, None))
+
+    def testInvalidate(self):
+        self.catalog.invalidate('source', 'db', 'test', ['table_rows'])
+        self.assertEquals(self.catalog.lookup('source', 'db', 'test', 'table_rows'), (False, None))
+        self.assertEquals(self.catalog.lookup('source', 'db', 'test', 'primary_key'), (True, ['id']))
+        
+        self.catalog.invalidate('source', 'db', 'test')
+        self.assertEquals(self.catalog.lookup('source', 'db', 'test', 'exists'), (False, None))
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,225 @@
+import unittest
+import tempfile
+import shutil
+import os
+import time
+import cdc
+from config import settings
+
+
+class FakeDestHost(object):
+    """
+        Stands in for the target MySQLHost, recording the changes applied to it.
+    """
+    def __init__(self):
+        self.deleted = []
+        self.replaced = []
+        self.commits = 0
+
+    def get_primary_key_columns(self, table):
+        return ['id']
+
+    def delete_keys(self, table, columns, keys, commit=True):
+        self.deleted.extend((table, key) for key in keys)
+
+    def replace_rows(self, table, rows, commit=True):
+        self.replaced.extend((table, row) for row in rows)
+
+    def commit(self):
+        self.commits += 1
+
+
+class RowsEvent(object):
+    def __init__(self, table, rows, timestamp=0):
+        self.table = table
+        self.rows = rows
+        self.timestamp = timestamp
+
+class WriteRowsEvent(RowsEvent):
+    pass
+
+class UpdateRowsEvent(RowsEvent):
+    pass
+
+class DeleteRowsEvent(RowsEvent):
+    pass
+
+class XidEvent(object):
+    pass
+
+class QueryEvent(object):
+    def __init__(self, query):
+        self.query = query
+
+
+class FakeStream(object):
+    """
+        Stands in for a BinLogStreamReader, the position advances by one per event.
+    """
+    def __init__(self, events):
+        self.events = events
+        self.log_file = 'binlog.000001'
+        self.log_pos = 4
+
+    def __iter__(self):
+        for event in self.events:
+            self.log_pos += 1
+            yield event
+
+class HeartbeatLogEvent(object):
+    pass
+
+
+class IdleStream(FakeStream):
+    """
+        Stands in for a blocking BinLogStreamReader with no events after the given ones: it sends
+        a heartbeat every given number of seconds until stop returns True, at most 20 of them.
+    """
+    def __init__(self, events, seconds, stop):
+        FakeStream.__init__(self, events)
+        self.seconds = seconds
+        self.stop = stop
+        self.heartbeats = 0
+
+    def __iter__(self):
+        for event in FakeStream.__iter__(self):
+            yield event
+        while not self.stop() and self.heartbeats < 20:
+            time.sleep(self.seconds)
+            self.heartbeats += 1
+            yield HeartbeatLogEvent()
+
+
+class ChangeCaptureTest(unittest.TestCase):
+    """
+        Tests batching and applying binary log events against a fake target, these tests do not 
+        need a database.
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.position_file = os.path.join(self.dir, 'position.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testCoalesceChanges(self):
+        dest_host = FakeDestHost()
+        stream = FakeStream([WriteRowsEvent('t', [{ 'values' : { 'id' : 1, 'name' : 'a' } }, 
+                                                  { 'values' : { 'id' : 2, 'name' : 'b' } }]),
+                             UpdateRowsEvent('t', [{ 'before_values' : { 'id' : 1, 'name' : 'a' }, 
+                                                     'after_values' : { 'id' : 1, 'name' : 'c' } },
+                                                   { 'before_values' : { 'id' : 2, 'name' : 'b' }, 
+                                                     'after_values' : { 'id' : 3, 'name' : 'b' } }]),
+                             DeleteRowsEvent('t', [{ 'values' : { 'id' : 4, 'name' : 'd' } }]),
+                             XidEvent()])
+        metrics = cdc.apply_changes(stream, cdc.ChangeApplier(dest_host), self.position_file)
+        
+        self.assertEquals(sorted(dest_host.deleted), [('t', (2,)), ('t', (4,))])
+        self.assertEquals(dest_host.replaced, [('t', { 'id' : 1, 'name' : 'c' }), ('t', { 'id' : 3, 'name' : 'b' })])
+        self.assertEquals(dest_host.commits, 1)
+        self.assertEquals(metrics.applied_rows, 4)
+        self.assertEquals(cdc.load_position(self.position_file), ('binlog.000001', 8))
+
+    def testBatchRows(self):
+        dest_host = FakeDestHost()
+        events = []
+        for i in range(5):
+            events.extend([WriteRowsEvent('t', [{ 'values' : { 'id' : i } }]), XidEvent()])
+        metrics = cdc.apply_changes(FakeStream(events), cdc.ChangeApplier(dest_host), self.position_file, batch_rows=2)
+        self.assertEquals(dest_host.commits, 3)
+        self.assertEquals(metrics.batches, 3)
+        self.assertEquals(len(dest_host.replaced), 5)
+
+    def testPositionOnlyAtTransactionEnds(self):
+        dest_host = FakeDestHost()
+        stream = FakeStream([QueryEvent('BEGIN'),
+                             WriteRowsEvent('t', [{ 'values' : { 'id' : 1 } }]),
+                             WriteRowsEvent('t', [{ 'values' : { 'id' : 2 } }]),
+                             QueryEvent('COMMIT'),
+                             WriteRowsEvent('t', [{ 'values' : { 'id' : 3 } }]),
+                             WriteRowsEvent('t', [{ 'values' : { 'id' : 4 } }])])
+        cdc.apply_changes(stream, cdc.ChangeApplier(dest_host), self.position_file, batch_rows=1)
+        
+        # the transaction is not split by the batch size, the rows of the incomplete one are 
+        # applied without moving the position past its start
+        self.assertEquals(dest_host.commits, 2)
+        self.assertEquals(len(dest_host.replaced), 4)
+        self.assertEquals(cdc.load_position(self.position_file), ('binlog.000001', 8))
+
+    def testBatchSecondsWithoutFurtherEvents(self):
+        dest_host = FakeDestHost()
+        stream = IdleStream([WriteRowsEvent('t', [{ 'values' : { 'id' : 1 } }]), XidEvent()], 0.02, \
+                            lambda: dest_host.commits > 0)
+        cdc.apply_changes(stream, cdc.ChangeApplier(dest_host), self.position_file, batch_seconds=0.05)
+        
+        # the transaction is applied on a heartbeat, not only once the stream ends
+        self.assertTrue(stream.heartbeats < 20)
+        self.assertEquals(dest_host.commits, 1)
+        self.assertEquals(cdc.load_position(self.position_file), ('binlog.000001', 6))
+
+    def testPosition(self):
+        self.assertEquals(cdc.load_position(self.position_file), None)
+        cdc.save_position(self.position_file, ('binlog.000002', 120), cdc.ChangeMetrics())
+        self.assertEquals(cdc.load_position(self.position_file), ('binlog.000002', 120))
+        
+        f = open(self.position_file, 'w')
+        f.write('not json')
+        f.close()
+        self.assertEquals(cdc.load_position(self.position_file), None)
+
+
+@unittest.skipIf(cdc.BinLogStreamReader is None, "python-mysql-replication is not installed")
+class BinlogChangeCaptureTest(unittest.TestCase):
+    """
+        Captures changes from the binary log of the local MySQL source of the test configuration,
+        which needs binlog_format=ROW and a user allowed to replicate.
+    """
+
+    def setUp(self):
+        from dbutils import MySQLHost
+        settings.read_properties("pydbcopy.conf")
+        self.source_host = MySQLHost(settings.source_host, settings.source_user, \
+                                     settings.source_password, settings.source_database)
+        self.dest_host = MySQLHost(settings.target_host, settings.target_user, \
+                                   settings.target_password, settings.target_database)
+        for host in (self.source_host, self.dest_host):
+            c = host.conn.cursor()
+            c.execute("SET AUTOCOMMIT=1")
+            c.execute("create table if not exists tmp_cdc_pydbcopy_test ( id integer primary key, test_string varchar(50) )")
+            c.close()
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        for host in (self.source_host, self.dest_host):
+            c = host.conn.cursor()
+            c.execute("drop table if exists tmp_cdc_pydbcopy_test")
+            c.close()
+        shutil.rmtree(self.dir)
+
+    def testApplyBinlog(self):
+        position = self.source_host.get_master_status()
+        c = self.source_host.conn.cursor()
+        c.execute("insert into tmp_cdc_pydbcopy_test values (1,'test'), (2,'test2')")
+        c.execute("update tmp_cdc_pydbcopy_test set test_string = 'changed' where id = 1")
+        c.execute("delete from tmp_cdc_pydbcopy_test where id = 2")
+        c.close()
+        
+        connection_settings = { 'host' : settings.source_host, 'port' : 3306, 
+                                'user' : settings.source_user, 'passwd' : settings.source_password }
+        stream = cdc.open_binlog_stream(connection_settings, settings.cdc_server_id, settings.source_database, 
+                                        ['tmp_cdc_pydbcopy_test'], position, blocking=False)
+        try:
+            metrics = cdc.apply_changes(stream, cdc.ChangeApplier(self.dest_host), os.path.join(self.dir, 'position.json'))
+        finally:
+            stream.close()
+        
+        c = self.dest_host.conn.cursor()
+        c.execute("select * from tmp_cdc_pydbcopy_test")
+        self.assertEquals(c.fetchall(), ((1, 'changed'),))
+        c.close()
+        self.assertTrue(metrics.lag_seconds is not None)
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import tempfile
+import shutil
+import os
+import changedetect
+
+
+def fingerprint(update_time='2012-03-01 10:00:00', data_length=16384, auto_increment=11, taken_at='2012-03-01 10:05:00'):
+    return changedetect.normalize({ 'create_time' : '2012-01-01 00:00:00', 'update_time' : update_time,
+                                    'data_length' : data_length, 'index_length' : 1024,
+                                    'auto_increment' : auto_increment, 'taken_at' : taken_at })
+
+
+class ChangeDetectTest(unittest.TestCase):
+    """
+        Tests deciding whether tables changed from their fingerprints, these tests do not need a
+        database.
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.fingerprint_file = os.path.join(self.dir, 'fingerprints.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testUnchanged(self):
+        stored = { 'source' : fingerprint(), 'target' : fingerprint() }
+        self.assertEquals(changedetect.compare_metadata(stored, fingerprint(taken_at='2012-03-02 00:00:00'), fingerprint()), True)
+
+    def testChanged(self):
+        stored = { 'source' : fingerprint(), 'target' : fingerprint() }
+        self.assertEquals(changedetect.compare_metadata(stored, fingerprint(auto_increment=12), fingerprint()), False)
+        self.assertEquals(changedetect.compare_metadata(stored, fingerprint(), fingerprint(data_length=32768)), False)
+
+    def testUndecided(self):
+        self.assertEquals(changedetect.compare_metadata(None, fingerprint(), fingerprint()), None)
+
+        # no update time, as with InnoDB before MySQL 5.7
+        stored = { 'source' : fingerprint(update_time=None), 'target' : fingerprint(update_time=None) }
+        self.assertEquals(changedetect.compare_metadata(stored, fingerprint(update_time=None), fingerprint(update_time=None)), None)
+
+        # the source may have been updated again in the second its fingerprint was taken
+        stored = { 'source' : fingerprint(taken_at='2012-03-01 10:00:00'), 'target' : fingerprint() }
+        self.assertEquals(changedetect.compare_metadata(stored, fingerprint(), fingerprint()), None)
+
+    def testSourceUnchangedSince(self):
+        self.assertEquals(changedetect.source_unchanged_since(fingerprint(), fingerprint(taken_at='2012-03-02 00:00:00')), True)
+        self.assertEquals(changedetect.source_unchanged_since(fingerprint(), fingerprint(update_time='2012-03-01 11:00:00')), False)
+        self.assertEquals(changedetect.source_unchanged_since(None, fingerprint()), False)
+        self.assertEquals(changedetect.source_unchanged_since(fingerprint(), None), False)
+        self.assertEquals(changedetect.source_unchanged_since(fingerprint(update_time=None), fingerprint(update_time=None)), False)
+
+    def testCompareChecksums(self):
+        self.assertEquals(changedetect.compare_checksums(1234L, 1234L), True)
+        self.assertEquals(changedetect.compare_checksums(1234L, 4321L), False)
+        self.assertEquals(changedetect.compare_checksums(None, 1234L), None)
+
+    def testFingerprintFile(self):
+        self.assertEquals(changedetect.load_fingerprints(self.fingerprint_file, 'a/'), dict())
+        changedetect.save_fingerprints(self.fingerprint_file, 'a/', { 't' : { 'source' : fingerprint(), 'target' : fingerprint() } })
+        changedetect.save_fingerprints(self.fingerprint_file, 'b/', { 't' : { 'source' : None, 'target' : None } })
+        self.assertEquals(changedetect.load_fingerprints(self.fingerprint_file, 'a/'),
+                          { 't' : { 'source' : fingerprint(), 'target' : fingerprint() } })
+        self.assertEquals(changedetect.load_fingerprints(self.fingerprint_file, 'b/'), { 't' : { 'source' : None, 'target' : None } })
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import tempfile
+import shutil
+import os
+import checkpoint
+
+
+class CheckpointTest(unittest.TestCase):
+    """
+        Tests the checkpoint manifest, these tests do not need a database.
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.manifest = checkpoint.CheckpointManifest(os.path.join(self.dir, 'checkpoint.json'), 'src/db>dst/db/')
+        self.plan = { 'column' : 'id', 'bounds' : [None, 100, None], 'shadow' : None, 'deferred_keys' : [], \
+                      'structure' : checkpoint.structure_checksum('CREATE TABLE `t` (`id` int)') }
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, content):
+        filename = os.path.join(self.dir, name)
+        f = open(filename, 'w')
+        f.write(content)
+        f.close()
+        return filename
+
+    def testStartAndComplete(self):
+        self.assertEquals(None, self.manifest.get_table('t'))
+        self.manifest.start_table('t', self.plan)
+        self.assertEquals(self.plan, self.manifest.get_table('t')['plan'])
+        self.assertFalse(self.manifest.is_resumable('t'))
+
+        chunk = checkpoint.ChunkCheckpoint(self.manifest, 't', 1)
+        chunk.stage(self.write('t.csv', 'a\nb\n'))
+        self.assertTrue(self.manifest.is_resumable('t'))
+        chunk.complete(2)
+
+        stored = self.manifest.get_table('t')
+        self.assertEquals({}, stored['staged'])
+        self.assertEquals(2, stored['chunks']['1']['rows'])
+        self.assertEquals(checkpoint.file_checksum(os.path.join(self.dir, 't.csv')), stored['chunks']['1']['checksum'])
+
+    def testPrefixesAreKeptApart(self):
+        other = checkpoint.CheckpointManifest(self.manifest.filename, 'src/db>other/db/')
+        self.manifest.start_table('t', self.plan)
+        other.start_table('t', self.plan)
+        self.manifest.clear_table('t')
+        self.assertEquals(None, self.manifest.get_table('t'))
+        self.assertEquals(self.plan, other.get_table('t')['plan'])
+
+        other.clear_tables(['t', 'u'])
+        self.assertEquals({}, other.load())
+
+    def testStagedFileIsValidated(self):
+        self.manifest.start_table('t', self.plan)
+        filename = self.write('t.csv', 'a\nb\n')
+        checkpoint.ChunkCheckpoint(self.manifest, 't', 0).stage(filename)
+        self.assertEquals(filename, checkpoint.ChunkCheckpoint(self.manifest, 't', 0).staged_file())
+        self.assertEquals(None, checkpoint.ChunkCheckpoint(self.manifest, 't', 1).staged_file())
+
+        self.write('t.csv', 'a\nc\n')
+        self.assertEquals(None, checkpoint.ChunkCheckpoint(self.manifest, 't', 0).staged_file())
+        os.remove(filename)
+        self.assertEquals(None, checkpoint.ChunkCheckpoint(self.manifest, 't', 0).staged_file())
+
+    def testUnreadableManifest(self):
+        self.write('checkpoint.json', '{ not json')
+        self.assertEquals(None, self.manifest.get_table('t'))
+        self.manifest.start_table('t', self.plan)
+        self.assertEquals(self.plan, self.manifest.get_table('t')['plan'])
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
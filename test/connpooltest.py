@@ -0,0 +1,56 @@
+import unittest
+from connpool import ConnectionPool
+from config import settings
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    """
+        Checks connections to the source of the test configuration in and out of a pool.
+    """
+
+    def setUp(self):
+        settings.read_properties("pydbcopy.conf")
+        self.pool = ConnectionPool({ 'source' : (settings.source_host, settings.source_user, \
+                                                 settings.source_password, settings.source_database) })
+
+    def testReuse(self):
+        host = self.pool.checkout('source')
+        self.pool.checkin('source', host)
+        self.assertTrue(self.pool.checkout('source') is host)
+        self.assertEquals(self.pool.connects, 1)
+        self.assertEquals(self.pool.reuses, 1)
+
+    def testExtraConnections(self):
+        first = self.pool.checkout('source')
+        second = self.pool.checkout('source')
+        self.assertFalse(first is second)
+        self.assertEquals(self.pool.connects, 2)
+
+    def testDeadConnection(self):
+        host = self.pool.checkout('source')
+        self.pool.checkin('source', host)
+        host.conn.close()
+        self.assertFalse(self.pool.checkout('source') is host)
+        self.assertEquals(self.pool.connects, 2)
+
+    def testResetSession(self):
+        host = self.pool.checkout('source')
+        c = host.conn.cursor()
+        c.execute("SET AUTOCOMMIT=1")
+        c.close()
+        self.pool.checkin('source', host)
+        
+        c = self.pool.checkout('source').conn.cursor()
+        c.execute("select @@autocommit")
+        self.assertEquals(c.fetchone()[0], 0)
+        c.close()
+
+    def testNoIdle(self):
+        self.pool.max_idle = 0
+        host = self.pool.checkout('source')
+        self.pool.checkin('source', host)
+        self.assertFalse(self.pool.checkout('source') is host)
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
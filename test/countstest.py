@@ -0,0 +1,82 @@
+import unittest
+import counts
+
+
+class FakeHost(object):
+    """
+        Stands in for a MySQLHost with a table of the given rows keyed by an integer id.
+    """
+    def __init__(self, ids, engine='InnoDB', estimate=None):
+        self.host = 'fake'
+        self.ids = ids
+        self.engine = engine
+        self.estimate = estimate
+        self.counts = 0
+
+    def get_row_estimate(self, table):
+        return self.estimate
+
+    def get_table_engine_info(self, table):
+        return (self.engine, True)
+
+    def get_primary_key_columns(self, table):
+        return ['id']
+
+    def get_key_range(self, table, column):
+        return (min(self.ids), max(self.ids))
+
+    def get_row_count(self, table, key_range=None):
+        self.counts += 1
+        if key_range is None:
+            return len(self.ids)
+        column, lower, upper = key_range
+        return len([id for id in self.ids if (lower is None or id >= lower) and (upper is None or id < upper)])
+
+
+class FakePool(object):
+    def __init__(self, host):
+        self.host = host
+        self.checked_out = 0
+
+    def checkout(self, role):
+        self.checked_out += 1
+        return self.host
+
+    def checkin(self, role, host):
+        self.checked_out -= 1
+
+
+class CountsTest(unittest.TestCase):
+    """
+        Tests the row count strategies, these tests do not need a database.
+    """
+
+    def testPassesThreshold(self):
+        self.assertTrue(counts.passes_threshold(100, 100, 10))
+        self.assertTrue(counts.passes_threshold(91, 100, 10))
+        self.assertFalse(counts.passes_threshold(90, 100, 10))
+
+    def testCheckThreshold(self):
+        self.assertEquals(counts.check_threshold((95, 105), (95, 105), 20), True)
+        self.assertEquals(counts.check_threshold((40, 60), (95, 105), 20), False)
+        self.assertEquals(counts.check_threshold((80, 120), (80, 120), 20), None)
+
+    def testEstimateBounds(self):
+        self.assertEquals(counts.estimate_bounds(FakeHost([], estimate=1000), 't', 0.5), (500, 1501, 1000))
+        self.assertEquals(counts.estimate_bounds(FakeHost([], 'MyISAM', estimate=1000), 't', 0.5), (1000, 1001, 1000))
+        self.assertEquals(counts.estimate_bounds(FakeHost([]), 't', 0.5), None)
+
+    def testSplitKeyRange(self):
+        self.assertEquals(counts.split_key_range(1, 100, 4), [None, 26, 51, 76, None])
+        self.assertEquals(counts.split_key_range(1, 2, 4), [None, 2, None])
+
+    def testParallelRowCount(self):
+        host = FakeHost(range(1, 1001, 3))
+        pool = FakePool(host)
+        self.assertEquals(counts.parallel_row_count(host, 't', pool, 'source', 4), len(host.ids))
+        self.assertEquals(host.counts, 4)
+        self.assertEquals(pool.checked_out, 0)
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
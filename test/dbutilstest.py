@@ -1,7 +1,8 @@
 import unittest
 import datetime
-from dbutils import MySQLHost
+from dbutils import MySQLHost, choose_delete_strategy, packet_batches, split_secondary_keys
 from config import settings 
+from catalog import catalog
 import os
 import multiprocessing
 import logging
@@ -160,6 +161,21 @@ class MySQLHostTest(unittest.TestCase):
         expected = set([ "123", "234", "345" ])
         self.assertEquals(self.source_host.get_current_hash_set("tmp_hashed_pydbcopy_test"), expected)
 
+    def testGetHashBucketDigests(self):
+        digests = self.source_host.get_hash_bucket_digests("tmp_hashed_pydbcopy_test", 1)
+        self.assertEquals(sorted(digests.keys()), ["1", "2", "3"])
+        self.assertEquals(digests["1"][0], 1)
+        
+        digests = self.source_host.get_hash_bucket_digests("tmp_hashed_pydbcopy_test", 2, ["2", "3"])
+        self.assertEquals(sorted(digests.keys()), ["23", "34"])
+        
+    def testGetHashSetForPrefixes(self):
+        self.assertEquals(self.source_host.get_hash_set_for_prefixes("tmp_hashed_pydbcopy_test", ["1", "34"]), set([ "123", "345" ]))
+        
+    def testIterHashBatchesOrdered(self):
+        batches = list(self.source_host.iter_hash_batches("tmp_hashed_pydbcopy_test", 2, ordered=True))
+        self.assertEquals([hash for batch in batches for (hash,) in batch], [ "123", "234", "345" ])
+        
     def testDeleteRecords(self):
         c = self.dest_host.conn.cursor()
         c.execute("SET AUTOCOMMIT=1")
@@ -209,9 +225,173 @@ class MySQLHostTest(unittest.TestCase):
         
         c.close()
         
+    def testDeleteRecordsStrategies(self):
+        c = self.dest_host.conn.cursor()
+        c.execute("SET AUTOCOMMIT=1")
+        
+        c.execute("create table if not exists tmp_hashed_pydbcopy_test ( id integer primary key, test_string varchar(50), fieldHash varchar(50) )")
+        for strategy in ('batch', 'join', 'rebuild'):
+            c.execute("delete from tmp_hashed_pydbcopy_test")
+            c.execute("insert into tmp_hashed_pydbcopy_test (id,test_string,fieldHash) values (1,'test','123')")
+            c.execute("insert into tmp_hashed_pydbcopy_test (id,test_string,fieldHash) values (2,'test1','234')")
+            c.execute("insert into tmp_hashed_pydbcopy_test (id,test_string,fieldHash) values (3,'test2','345')")
+            
+            deleted = self.dest_host.delete_records("tmp_hashed_pydbcopy_test", set([ "123", "345", "999" ]), strategy=strategy)
+            
+            c.execute("select id from tmp_hashed_pydbcopy_test")
+            self.assertEquals(deleted, 2)
+            self.assertEquals([row[0] for row in c.fetchall()], [ 2 ])
+        
+        self.assertFalse(self.dest_host.table_exists("tmp_hashed_pydbcopy_test__pydbcopy_old"))
+        c.close()
+        
+    def testSelectIntoOutfileKeyRange(self):
+        filename = self.source_host.select_into_outfile("tmp_hashed_pydbcopy_test", None, settings.dump_dir, ("id", 2, None))
+        f = open(filename)
+        filecontents = f.read()
+        f.close()
+        os.remove(filename)
+        self.assertEquals(filecontents, "2\ttest1\t234\n3\ttest2\t345\n")
+        
+    def testSelectIntoOutfileHashSet(self):
+        filename = self.source_host.select_into_outfile("tmp_hashed_pydbcopy_test", set([ "123", "345", "999" ]), settings.dump_dir)
+        f = open(filename)
+        filecontents = f.read()
+        f.close()
+        os.remove(filename)
+        self.assertEquals(sorted(filecontents.splitlines()), ["1\ttest\t123", "3\ttest2\t345"])
+        
+    def testStageHashes(self):
+        staging_table = self.source_host.stage_hashes("tmp_hashed_pydbcopy_test", [ "123", "345", "123" ])
+        c = self.source_host.conn.cursor()
+        c.execute("select fieldHash from %s order by fieldHash" % staging_table)
+        self.assertEquals([row[0] for row in c.fetchall()], [ "123", "345" ])
+        c.close()
+        self.source_host.drop_staged_hashes(staging_table)
+        
+    def testIterRowBatchesHashSet(self):
+        batches = list(self.source_host.iter_row_batches("tmp_hashed_pydbcopy_test", set([ "234" ])))
+        self.assertEquals([row for batch in batches for row in batch], [ (2, "test1", "234") ])
+        
+    def testLoadDataInFileSessionVariables(self):
+        c = self.dest_host.conn.cursor()
+        c.execute("SET AUTOCOMMIT=1")
+        c.execute("create table if not exists tmp_pydbcopy_test ( id integer primary key, test_string varchar(50) )")
+        
+        rows = self.dest_host.load_data_in_file("tmp_pydbcopy_test", "fixtures/testLoadDataInFile.csv", \
+                                                session_variables={ 'unique_checks' : 0, 'foreign_key_checks' : 0 })
+        self.assertEquals(rows, 1)
+        
+        c.execute("select @@session.unique_checks, @@session.foreign_key_checks")
+        self.assertEquals(c.fetchone(), (1, 1))
+        c.close()
+        
+    def testSelectIntoOutfileOrdered(self):
+        filename = self.source_host.select_into_outfile("tmp_hashed_pydbcopy_test", set([ "345", "123" ]), settings.dump_dir, order_by_key=True)
+        f = open(filename)
+        filecontents = f.read()
+        f.close()
+        os.remove(filename)
+        self.assertEquals(filecontents, "1\ttest\t123\n3\ttest2\t345\n")
+        
+    def testDropSecondaryKeys(self):
+        c = self.source_host.conn.cursor()
+        c.execute("alter table tmp_hashed_pydbcopy_test add key hash_idx (fieldHash)")
+        c.close()
+        structure = self.source_host.get_table_structure("tmp_hashed_pydbcopy_test")
+        
+        keys = self.source_host.drop_secondary_keys("tmp_hashed_pydbcopy_test")
+        self.assertEquals(keys, [ "KEY `hash_idx` (`fieldHash`)" ])
+        self.assertEquals(self.source_host.drop_secondary_keys("tmp_hashed_pydbcopy_test"), [])
+        
+        self.source_host.add_secondary_keys("tmp_hashed_pydbcopy_test", keys)
+        self.assertEquals(self.source_host.get_table_structure("tmp_hashed_pydbcopy_test"), structure)
+        
+    def testGetPrimaryKeyColumns(self):
+        self.assertEquals(self.source_host.get_primary_key_columns("tmp_hashed_pydbcopy_test"), ["id"])
+        
+    def testGetKeyRange(self):
+        self.assertEquals(self.source_host.get_key_range("tmp_hashed_pydbcopy_test", "id"), (1, 3))
+        
+    def testGetTableSizes(self):
+        sizes = self.source_host.get_table_sizes(["tmp_pydbcopy_test", "tmp_hashed_pydbcopy_test", "no_such_table"])
+        self.assertEquals(sorted(sizes.keys()), ["tmp_hashed_pydbcopy_test", "tmp_pydbcopy_test"])
+        self.assertTrue(sizes["tmp_hashed_pydbcopy_test"][0] > 0)
+        
     def testGetRowCount(self):
         self.assertEquals(self.source_host.get_row_count("tmp_hashed_pydbcopy_test"), 3)
 
+    def testGetRowCountKeyRange(self):
+        self.assertEquals(self.source_host.get_row_count("tmp_hashed_pydbcopy_test", ('id', 2, None)), 2)
+        self.assertEquals(self.source_host.get_row_count("tmp_hashed_pydbcopy_test", ('id', 2, 3)), 1)
+
+    def testGetTableFingerprints(self):
+        fingerprints = self.source_host.get_table_fingerprints(['tmp_pydbcopy_test', 'tmp_pydbcopy_missing_test'])
+        self.assertEquals(fingerprints.keys(), ['tmp_pydbcopy_test'])
+        self.assertTrue(fingerprints['tmp_pydbcopy_test']['create_time'] is not None)
+        self.assertTrue(fingerprints['tmp_pydbcopy_test']['taken_at'] is not None)
+        self.assertEquals(self.source_host.get_table_fingerprints([]), dict())
+        
+    def testPrefetchCatalog(self):
+        try:
+            self.assertEquals(self.source_host.prefetch_catalog([]), 0)
+            self.assertEquals(self.source_host.prefetch_catalog(['tmp_pydbcopy_test', 'tmp_pydbcopy_missing_test']), 1)
+            self.assertTrue(self.source_host.table_exists('tmp_pydbcopy_test'))
+            self.assertFalse(self.source_host.table_exists('tmp_pydbcopy_missing_test'))
+            self.assertEquals(self.source_host.get_primary_key_columns('tmp_pydbcopy_test'), ['id'])
+            
+            self.source_host.get_table_structure('tmp_pydbcopy_test')
+            self.assertTrue(catalog.lookup(self.source_host.host, self.source_host.database, 'tmp_pydbcopy_test', 'structure')[0])
+            self.source_host.drop_table('tmp_pydbcopy_test')
+            self.assertFalse(self.source_host.table_exists('tmp_pydbcopy_test'))
+        finally:
+            catalog.clear()
+
+class DeleteStrategyTest(unittest.TestCase):
+    """
+        Tests the choice of delete strategy, these tests do not need a database.
+    """
+    
+    def testChooseDeleteStrategy(self):
+        self.assertEquals(choose_delete_strategy(10, 100, 1000, 'InnoDB', 1000, True), 'batch')
+        self.assertEquals(choose_delete_strategy(100, 10000, 1000, 'InnoDB', 1000, True), 'join')
+        self.assertEquals(choose_delete_strategy(400, 10000, 1000, 'InnoDB', 1000, True), 'rebuild')
+        self.assertEquals(choose_delete_strategy(400, 10000, 1000, 'MyISAM', 1000, True), 'join')
+        self.assertEquals(choose_delete_strategy(400, 10000, 1000, 'InnoDB', 1000, False), 'join')
+        self.assertEquals(choose_delete_strategy(400, 10000, None, 'InnoDB', 1000, True), 'rebuild')
+        
+    def testPacketBatches(self):
+        batches = list(packet_batches(["1234567"] * 25, 100))
+        self.assertEquals([len(batch) for batch in batches], [ 10, 10, 5 ])
+        self.assertEquals(list(packet_batches([], 100)), [])
+
+class SplitSecondaryKeysTest(unittest.TestCase):
+    """
+        Tests splitting the secondary keys off a schema, these tests do not need a database.
+    """
+    
+    def testSplitSecondaryKeys(self):
+        schema = "CREATE TABLE `t` (\n" \
+                 "  `id` int(11) NOT NULL,\n" \
+                 "  `name` varchar(50) DEFAULT NULL,\n" \
+                 "  PRIMARY KEY (`id`),\n" \
+                 "  UNIQUE KEY `name_idx` (`name`),\n" \
+                 "  KEY `id_name_idx` (`id`,`name`)\n" \
+                 ") ENGINE=InnoDB DEFAULT CHARSET=latin1\n" \
+                 "/*!50100 PARTITION BY HASH (id) PARTITIONS 2 */"
+        stripped, keys = split_secondary_keys(schema)
+        self.assertEquals(stripped, "CREATE TABLE `t` (\n" \
+                                    "  `id` int(11) NOT NULL,\n" \
+                                    "  `name` varchar(50) DEFAULT NULL,\n" \
+                                    "  PRIMARY KEY (`id`)\n" \
+                                    ") ENGINE=InnoDB DEFAULT CHARSET=latin1\n" \
+                                    "/*!50100 PARTITION BY HASH (id) PARTITIONS 2 */")
+        self.assertEquals(keys, [ "UNIQUE KEY `name_idx` (`name`)", "KEY `id_name_idx` (`id`,`name`)" ])
+        
+    def testSplitSecondaryKeysNone(self):
+        schema = "CREATE TABLE `t` (\n  `id` int(11) NOT NULL\n) ENGINE=MyISAM"
+        self.assertEquals(split_secondary_keys(schema), (schema, []))
+
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import tempfile
+import shutil
+import os
+import delta
+
+
+class FakeDeltaTransport(delta.DeltaTransport):
+    """
+        Rewrites the local file instead of running rsync, like rsync does: into a new file renamed
+        over the local one.
+    """
+    def __init__(self, content, fails=False):
+        delta.DeltaTransport.__init__(self, 'guest')
+        self.content = content
+        self.fails = fails
+
+    def fetch(self, host, remote_filename, local_filename):
+        if self.fails:
+            return False
+        f = open(local_filename + '.new', 'w')
+        f.write(self.content)
+        f.close()
+        os.rename(local_filename + '.new', local_filename)
+        return True
+
+
+class DeltaTest(unittest.TestCase):
+    """
+        Tests the delta spool and transport, these tests do not need a remote host.
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.spool = delta.DeltaSpool(os.path.join(self.dir, 'spool'))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, content):
+        filename = os.path.join(self.dir, name)
+        f = open(filename, 'w')
+        f.write(content)
+        f.close()
+        return filename
+
+    def testSpool(self):
+        self.assertEquals(self.spool.basis('t'), None)
+        self.spool.keep('t', self.write('dump1.csv', '1,a\n'))
+        self.spool.keep('t', self.write('dump2.csv', '1,b\n'))
+        self.assertEquals(open(self.spool.basis('t')).read(), '1,b\n')
+        self.assertFalse(os.path.exists(os.path.join(self.dir, 'dump2.csv')))
+
+    def testTransferDelta(self):
+        self.spool.keep('t', self.write('dump1.csv', '1,a\n'))
+        local_filename = os.path.join(self.dir, 'dump2.csv')
+        self.assertTrue(FakeDeltaTransport('1,a\n2,b\n').transfer_delta('source', 'remote.csv', local_filename, self.spool.basis('t')))
+        self.assertEquals(open(local_filename).read(), '1,a\n2,b\n')
+        self.assertEquals(open(self.spool.basis('t')).read(), '1,a\n')
+
+    def testTransferDeltaFails(self):
+        self.spool.keep('t', self.write('dump1.csv', '1,a\n'))
+        local_filename = os.path.join(self.dir, 'dump2.csv')
+        self.assertFalse(FakeDeltaTransport('', fails=True).transfer_delta('source', 'remote.csv', local_filename, self.spool.basis('t')))
+        self.assertFalse(os.path.exists(local_filename))
+        self.assertEquals(open(self.spool.basis('t')).read(), '1,a\n')
+
+    def testParseReceivedBytes(self):
+        stats = "Number of files: 1\nTotal bytes sent: 1,024\nTotal bytes received: 12,345\n"
+        self.assertEquals(delta.parse_received_bytes(stats), 12345)
+        self.assertEquals(delta.parse_received_bytes(''), None)
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+import tempfile
+import shutil
+import os
+import fanout
+
+
+class FanoutTest(unittest.TestCase):
+    """
+        Tests the fan-out helpers, these tests do not need a database.
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testParseTargets(self):
+        self.assertEquals([('db1', 'reports'), ('db2', 'test_copy'), ('db3', 'other')],
+                          fanout.parse_targets(['db1/reports', 'db2', 'db3/other'], 'test_copy'))
+        self.assertEquals('db1/reports', fanout.target_name('db1', 'reports'))
+
+    def testColumnIndex(self):
+        structure = "CREATE TABLE `t` (\n  `id` int(11) NOT NULL,\n  `name` varchar(10),\n  `fieldHash` char(32),\n" \
+                    "  PRIMARY KEY (`id`),\n  KEY `fieldHash` (`fieldHash`)\n) ENGINE=InnoDB"
+        self.assertEquals(2, fanout.column_index(structure, 'fieldhash'))
+        self.assertEquals(0, fanout.column_index(structure, 'id'))
+        self.assertEquals(None, fanout.column_index(structure, 'missing'))
+
+    def testFilterDump(self):
+        dump = os.path.join(self.dir, 'dump.csv')
+        f = open(dump, 'w')
+        f.write("1\tplain\taaa\n")
+        f.write("2\ttab\\\there\tbbb\n")
+        f.write("3\tnew\\\nline\tccc\n")
+        f.write("4\tslash\\\\\tddd\n")
+        f.close()
+
+        filtered, rows = fanout.filter_dump(dump, 2, set(['bbb', 'ccc', 'ddd']), self.dir)
+        f = open(filtered, 'r')
+        content = f.read()
+        f.close()
+        self.assertEquals(3, rows)
+        self.assertEquals("2\ttab\\\there\tbbb\n3\tnew\\\nline\tccc\n4\tslash\\\\\tddd\n", content)
+
+    def testRunThreads(self):
+        def work(item):
+            if item == 2:
+                raise ValueError("failed")
+            return item * 10
+        self.assertEquals([10, None, 30], fanout.run_threads(work, [1, 2, 3]))
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
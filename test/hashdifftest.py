@@ -0,0 +1,152 @@
+import unittest
+import random
+import zlib
+import hashlib
+import hashdiff
+
+
+class FakeHost(object):
+    """
+        Stands in for a MySQLHost, computing what the SQL of the hash diff methods would return 
+        from a plain list of hashes.
+    """
+    def __init__(self, hashes, collation=None):
+        self.host = 'fake'
+        self.hashes = list(hashes)
+        self.hashes_fetched = 0
+        self.collation = collation
+
+    def get_current_hash_set(self, table):
+        self.hashes_fetched += len(self.hashes)
+        return set(self.hashes)
+
+    def iter_hash_batches(self, table, batch_size=100000, ordered=False, binary=False):
+        hashes = self.hashes
+        if ordered:
+            hashes = sorted(hashes, key=None if binary else self.collation)
+        for i in range(0, len(hashes), batch_size):
+            self.hashes_fetched += len(hashes[i:i + batch_size])
+            yield [(hash,) for hash in hashes[i:i + batch_size]]
+
+    def get_hash_bucket_digests(self, table, prefix_length, prefixes=None):
+        digests = dict()
+        for hash in self.hashes:
+            if prefixes is not None and not [p for p in prefixes if hash.startswith(p)]:
+                continue
+            crc = zlib.crc32(hash) & 0xffffffff
+            count, xor, sum = digests.get(hash[:prefix_length], (0, 0, 0))
+            digests[hash[:prefix_length]] = (count + 1, xor ^ crc, sum + crc)
+        return digests
+
+    def get_hash_set_for_prefixes(self, table, prefixes):
+        hashes = set(hash for hash in self.hashes if [p for p in prefixes if hash.startswith(p)])
+        self.hashes_fetched += len(hashes)
+        return hashes
+
+
+def make_hashes(start, end):
+    return [hashlib.md5(str(i)).hexdigest() for i in range(start, end)]
+
+
+class HashDiffTest(unittest.TestCase):
+    """
+        Tests the hash diff methods against fake hosts, these tests do not need a database.
+    """
+
+    def assertDiff(self, method, source_hashes, target_hashes):
+        source = FakeHost(source_hashes)
+        target = FakeHost(target_hashes)
+        to_add, to_del, target_count = hashdiff.diff_hashes(method, 'table', source, target)
+        self.assertEquals(set(to_add), set(source_hashes).difference(target_hashes))
+        self.assertEquals(set(to_del), set(target_hashes).difference(source_hashes))
+        self.assertEquals(len(to_add), len(set(source_hashes).difference(target_hashes)))
+        self.assertEquals(target_count, len(set(target_hashes)))
+        return source, target
+
+    def testSetDiff(self):
+        self.assertDiff('set', make_hashes(0, 100), make_hashes(10, 120))
+
+    def testBucketDiff(self):
+        self.assertDiff('bucket', make_hashes(0, 100), make_hashes(10, 120))
+        self.assertDiff('bucket', make_hashes(0, 100), make_hashes(0, 100))
+        self.assertDiff('bucket', make_hashes(0, 100), [])
+        self.assertDiff('bucket', [], make_hashes(0, 100))
+
+    def testBucketDiffShortHashes(self):
+        self.assertDiff('bucket', ['1', '12', '123', '2'], ['1', '12', '1234', '3'])
+
+    def testBucketDiffFetchesOnlyChangedBuckets(self):
+        hashes = make_hashes(0, 50000)
+        changed = list(hashes)
+        random.seed(1)
+        for i in random.sample(range(len(changed)), 5):
+            changed[i] = hashlib.md5('changed %d' % i).hexdigest()
+        
+        source = FakeHost(changed)
+        target = FakeHost(hashes)
+        to_add, to_del, target_count = hashdiff.bucket_diff('table', source, target, leaf_rows=100)
+        self.assertEquals(to_add, set(changed).difference(hashes))
+        self.assertEquals(to_del, set(hashes).difference(changed))
+        self.assertEquals(len(to_add), 5)
+        self.assertTrue(source.hashes_fetched < 1000)
+        self.assertTrue(target.hashes_fetched < 1000)
+
+    @unittest.skipIf(hashdiff.numpy is None, "numpy is not installed")
+    def testCompactDiff(self):
+        self.assertDiff('compact', make_hashes(0, 100), make_hashes(10, 120))
+        self.assertDiff('compact', make_hashes(0, 100), [])
+        self.assertDiff('compact', [], make_hashes(0, 100))
+        # digests ending in NUL bytes
+        self.assertDiff('compact', ['ab00', 'ab01', '0000'], ['ab00', '0100'])
+        
+    @unittest.skipIf(hashdiff.numpy is None, "numpy is not installed")
+    def testCompactDiffNonHexHashes(self):
+        # switches to raw storage part way through and on one side only
+        self.assertDiff('compact', make_hashes(0, 10) + ['not hex', 'ABCD'], make_hashes(5, 15))
+        self.assertDiff('compact', ['1', '12', '123'], ['12', '1234'])
+        
+    @unittest.skipIf(hashdiff.numpy is None, "numpy is not installed")
+    def testCompactHashArray(self):
+        hashes = hashdiff.CompactHashArray()
+        hashes.add_batch(make_hashes(0, 10))
+        hashes.add_batch(make_hashes(5, 15))
+        hashes.finish()
+        self.assertEquals(len(hashes), 15)
+        self.assertEquals(hashes.array.dtype.itemsize, 16)
+        self.assertEquals(hashes.decode(hashes.array), sorted(make_hashes(0, 15)))
+        
+    def testMergeDiff(self):
+        source, target = self.assertDiff('merge', make_hashes(0, 1000), make_hashes(500, 1500))
+        self.assertEquals(source.hashes_fetched, 1000)
+        self.assertEquals(target.hashes_fetched, 1000)
+        self.assertDiff('merge', make_hashes(0, 10), [])
+        self.assertDiff('merge', [], make_hashes(0, 10))
+        self.assertDiff('merge', make_hashes(0, 10) * 2, make_hashes(5, 10))
+
+    def testMergeDiffCaseInsensitiveCollation(self):
+        source = FakeHost(['a0', 'A1', 'b'], collation=str.lower)
+        target = FakeHost(['A1', 'B'], collation=str.lower)
+        to_add, to_del, target_count = hashdiff.merge_diff('table', source, target)
+        self.assertEquals(set(to_add), set(['a0', 'b']))
+        self.assertEquals(set(to_del), set(['B']))
+        self.assertEquals(target_count, 2)
+
+    def testHashSpool(self):
+        spool = hashdiff.HashSpool(max_buffered=3)
+        for hash in make_hashes(0, 10):
+            spool.add(hash)
+        self.assertEquals(len(spool), 10)
+        self.assertTrue(spool.file is not None)
+        self.assertEquals(len(spool.buffer), 1)
+        self.assertEquals(list(spool), make_hashes(0, 10))
+        spool.add('last')
+        self.assertEquals(list(spool), make_hashes(0, 10) + ['last'])
+        self.assertRaises(TypeError, lambda: 'last' in spool)
+        spool.close()
+
+    def testUnknownMethod(self):
+        self.assertRaises(ValueError, hashdiff.diff_hashes, 'nope', 'table', FakeHost([]), FakeHost([]))
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+import tempfile
+import shutil
+import os
+import jsonstore
+
+
+class JsonStoreTest(unittest.TestCase):
+    """
+        Tests the JSON files of the state kept between runs, these tests do not need a database.
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'store.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testLoadAndSave(self):
+        self.assertEquals(jsonstore.load(self.filename, 'test file'), None)
+        jsonstore.save(self.filename, { 'a' : 1 })
+        self.assertEquals(jsonstore.load(self.filename, 'test file'), { 'a' : 1 })
+        self.assertEquals(os.listdir(self.dir), ['store.json'])
+
+        f = open(self.filename, 'w')
+        f.write('not json')
+        f.close()
+        self.assertEquals(jsonstore.load(self.filename, 'test file'), None)
+
+    def testPrefixes(self):
+        jsonstore.save_prefixed(self.filename, 'one/', { 't1' : 1, 't2' : 2 }, 'test file')
+        jsonstore.save_prefixed(self.filename, 'two/', { 't1' : 3 }, 'test file')
+        jsonstore.save_prefixed(self.filename, 'one/', { 't2' : 4 }, 'test file')
+        self.assertEquals(jsonstore.load_prefixed(self.filename, 'one/', 'test file'), { 't1' : 1, 't2' : 4 })
+        self.assertEquals(jsonstore.load_prefixed(self.filename, 'two/', 'test file'), { 't1' : 3 })
+        self.assertEquals(jsonstore.load_prefixed(self.filename, 'three/', 'test file'), dict())
+        self.assertEquals(jsonstore.load_prefixed(None, 'one/', 'test file'), dict())
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+import tempfile
+import shutil
+import pickle
+import json
+import time
+import os
+import metrics
+
+
+class MetricsTest(unittest.TestCase):
+    """
+        Tests the metrics of a run, these tests do not need a database.
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        metrics.deactivate()
+        shutil.rmtree(self.dir)
+
+    def testRecordAndRates(self):
+        table_metrics = metrics.TableMetrics('t1')
+        table_metrics.record('load', 2.0, bytes=1000, rows=100)
+        table_metrics.record('load', 2.0, bytes=1000, rows=100)
+        table_metrics.record('export', 1.0)
+        stages = table_metrics.to_dict()['stages']
+        self.assertEquals(4.0, stages['load']['seconds'])
+        self.assertEquals(200, stages['load']['rows'])
+        self.assertEquals(50.0, stages['load']['rows_per_second'])
+        self.assertEquals(500.0, stages['load']['bytes_per_second'])
+        self.assertEquals(None, stages['export']['rows_per_second'])
+        self.assertEquals(5.0, table_metrics.to_dict()['seconds'])
+
+    def testActivate(self):
+        metrics.record('load', time.time(), rows=1)
+        metrics.choose('full', 'forced')
+        table_metrics = metrics.activate(metrics.TableMetrics('t1'))
+        metrics.record('load', time.time(), rows=1)
+        metrics.choose('full', 'forced')
+        metrics.deactivate()
+        metrics.record('load', time.time(), rows=1)
+        self.assertEquals(1, table_metrics.stages['load']['rows'])
+        self.assertEquals(('full', 'forced'), (table_metrics.strategy, table_metrics.reason))
+
+    def testMergeAndPickle(self):
+        planned = metrics.TableMetrics('t1')
+        planned.record('verify', 1.0)
+        planned.choose('full', 'no target table')
+        chunk = pickle.loads(pickle.dumps(metrics.TableMetrics('t1')))
+        chunk.record('load', 1.0, rows=10)
+        chunk.record('verify', 1.0)
+        planned.merge(chunk)
+        self.assertEquals(2.0, planned.stages['verify']['seconds'])
+        self.assertEquals(10, planned.stages['load']['rows'])
+        self.assertEquals('full', planned.strategy)
+
+    def testWriteJsonLines(self):
+        filename = os.path.join(self.dir, 'metrics.json')
+        table_metrics = metrics.TableMetrics('t1')
+        table_metrics.record('load', 1.0, rows=10)
+        table_metrics.result = 0
+        metrics.write_json_lines(filename, { 'source' : 'src/db' }, [table_metrics])
+        metrics.write_json_lines(filename, { 'source' : 'src/db' }, [table_metrics, metrics.TableMetrics('t2')])
+        f = open(filename, 'r')
+        try:
+            lines = [json.loads(line) for line in f]
+        finally:
+            f.close()
+        self.assertEquals(['t1', 't1', 't2'], [line['table'] for line in lines])
+        self.assertEquals('src/db', lines[0]['source'])
+        self.assertEquals(10, lines[0]['stages']['load']['rows'])
+
+    def testFormatPrometheus(self):
+        table_metrics = metrics.TableMetrics('t1')
+        table_metrics.record('load', 1.5, rows=10)
+        table_metrics.choose('incremental', '10 rows to add, 0 to delete')
+        table_metrics.result = 0
+        text = metrics.format_prometheus([table_metrics])
+        self.assertTrue('pydbcopy_stage_seconds{table="t1",stage="load"} 1.5\n' in text)
+        self.assertTrue('pydbcopy_stage_rows{table="t1",stage="load"} 10\n' in text)
+        self.assertTrue('pydbcopy_stage_bytes{' not in text)
+        self.assertTrue('pydbcopy_table_result{table="t1",strategy="incremental"} 0\n' in text)
+
+    def testFormatStatsd(self):
+        table_metrics = metrics.TableMetrics('t1')
+        table_metrics.record('load', 1.5, bytes=2048)
+        self.assertEquals(['pydbcopy.t1.load.seconds:1500|ms', 'pydbcopy.t1.load.bytes:2048|g'], \
+                          metrics.format_statsd([table_metrics]))
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
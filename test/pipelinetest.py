@@ -0,0 +1,98 @@
+import unittest
+import threading
+from pipeline import StagedPipeline, Stage
+
+
+class Job(object):
+    def __init__(self, name):
+        self.name = name
+        self.error = None
+        self.stages = []
+
+
+class StagedPipelineTest(unittest.TestCase):
+    """
+        Tests the staged pipeline with plain python jobs, these tests do not need a database.
+    """
+
+    def testJobsGoThroughEveryStage(self):
+        def stage(name):
+            def function(job):
+                job.stages.append(name)
+                return [job]
+            return function
+        
+        stages = [Stage('export', stage('export'), 2),
+                  Stage('transfer', stage('transfer'), 3, 1),
+                  Stage('load', stage('load'), 1, 1)]
+        finished = StagedPipeline(stages, 0).run(Job(i) for i in range(20))
+        
+        self.assertEquals(sorted(job.name for job in finished), range(20))
+        for job in finished:
+            self.assertEquals(job.stages, ['export', 'transfer', 'load'])
+            
+    def testFanOutAndEarlyFinish(self):
+        def plan(job):
+            if job.name == 'skip':
+                return []
+            return [Job('%s.%d' % (job.name, i)) for i in range(3)]
+        
+        stages = [Stage('plan', plan, 1), Stage('load', lambda job: [job], 2, 1)]
+        finished = StagedPipeline(stages, 0).run([Job('a'), Job('skip'), Job('b')])
+        
+        self.assertEquals(sorted(job.name for job in finished), 
+                          ['a.0', 'a.1', 'a.2', 'b.0', 'b.1', 'b.2', 'skip'])
+        
+    def testFailedJobsFinishWithError(self):
+        def export(job):
+            if job.name == 2:
+                raise ValueError('export failed')
+            return [job]
+        
+        stages = [Stage('export', export, 2), Stage('load', lambda job: [job], 2)]
+        finished = StagedPipeline(stages, 0).run(Job(i) for i in range(5))
+        
+        self.assertEquals(len(finished), 5)
+        failed = [job for job in finished if job.error is not None]
+        self.assertEquals(len(failed), 1)
+        self.assertEquals(failed[0].name, 2)
+        self.assertEquals(str(failed[0].error), 'export failed')
+
+    def testOnFinishSeesEveryEnding(self):
+        def export(job):
+            if job.name == 1:
+                raise ValueError('export failed')
+            if job.name == 2:
+                return []
+            return [job]
+
+        def on_finish(job):
+            if job.name == 3:
+                raise ValueError('finish failed')
+            ended.append(job.name)
+
+        ended = []
+        stages = [Stage('export', export, 2), Stage('load', lambda job: [job], 2)]
+        finished = StagedPipeline(stages, 0, on_finish).run(Job(i) for i in range(5))
+
+        self.assertEquals(sorted(ended), [0, 1, 2, 4])
+        self.assertEquals(sorted(job.name for job in finished if job.error is not None), [1, 3])
+        
+    def testStagesOverlap(self):
+        # the second job can only be exported while the first is being loaded
+        loading = threading.Event()
+        def export(job):
+            if job.name == 1:
+                self.assertTrue(loading.wait(5))
+            return [job]
+        def load(job):
+            loading.set()
+            return [job]
+        
+        stages = [Stage('export', export, 1), Stage('load', load, 1)]
+        finished = StagedPipeline(stages, 0).run([Job(0), Job(1)])
+        self.assertEquals(len(finished), 2)
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -371,6 +371,111 @@ class PyDBCopyTest(unittest.TestCase):
         sc.close()
         dc.close()
         
+    def testPerformFullCopyStream(self):
+        dc = self.dest_host.conn.cursor()
+        dc.execute("SET AUTOCOMMIT=1")
+        
+        settings.copy_method = 'stream'
+        try:
+            self.assertTrue(pydbcopy.perform_full_copy('tmp_hashed_pydbcopy_test', self.source_host, self.dest_host, settings.scp_user, settings.dump_dir))
+        finally:
+            settings.copy_method = 'outfile'
+
+        dc.execute("select * from tmp_hashed_pydbcopy_test")
+        rows = dc.fetchall()
+        
+        self.assertEquals(len(rows), 3)
+        
+        self.assertEquals(rows[0][0], 1)
+        self.assertEquals(rows[0][1], 'test')
+        self.assertEquals(rows[0][2], '123')
+        self.assertEquals(rows[2][0], 3)
+        self.assertEquals(rows[2][1], 'test2')
+        self.assertEquals(rows[2][2], '345')
+        
+        dc.close()
+        
+    def testPerformFullCopyShadow(self):
+        sc = self.source_host.conn.cursor()
+        sc.execute("SET AUTOCOMMIT=1")
+        sc.execute("alter table tmp_hashed_pydbcopy_test add key test_string_idx (test_string)")
+        sc.close()
+        
+        dc = self.dest_host.conn.cursor()
+        dc.execute("SET AUTOCOMMIT=1")
+        
+        settings.shadow_load = True
+        try:
+            self.assertTrue(pydbcopy.perform_full_copy('tmp_hashed_pydbcopy_test', self.source_host, self.dest_host, settings.scp_user, settings.dump_dir))
+        finally:
+            settings.shadow_load = False
+
+        dc.execute("select id from tmp_hashed_pydbcopy_test order by id")
+        self.assertEquals([row[0] for row in dc.fetchall()], [ 1, 2, 3 ])
+        self.assertTrue(pydbcopy.schema_compare('tmp_hashed_pydbcopy_test', self.source_host, self.dest_host, True))
+        self.assertFalse(self.dest_host.table_exists('tmp_hashed_pydbcopy_test__pydbcopy_new'))
+        self.assertFalse(self.dest_host.table_exists('tmp_hashed_pydbcopy_test__pydbcopy_old'))
+        
+        dc.close()
+        
+    def testPerformWatermarkCopy(self):
+        sc = self.source_host.conn.cursor()
+        sc.execute("SET AUTOCOMMIT=1")
+        sc.execute("insert into tmp_pydbcopy_modified_test (id,test_string,lastModifiedDate) values (2,'test2','2010-11-24 05:00:00')")
+        sc.close()
+        
+        dc = self.dest_host.conn.cursor()
+        dc.execute("SET AUTOCOMMIT=1")
+        dc.execute("insert into tmp_pydbcopy_modified_test (id,test_string,lastModifiedDate) values (3,'test3','2010-11-20 05:00:00')")
+        
+        self.assertFalse(pydbcopy.perform_watermark_copy('tmp_pydbcopy_modified_test', self.source_host, self.dest_host, settings.scp_user, settings.dump_dir))
+        settings.watermark_copy = True
+        try:
+            self.assertTrue(pydbcopy.perform_watermark_copy('tmp_pydbcopy_modified_test', self.source_host, self.dest_host, settings.scp_user, settings.dump_dir))
+        finally:
+            settings.watermark_copy = False
+        
+        dc.execute("select id, test_string, lastModifiedDate from tmp_pydbcopy_modified_test order by id")
+        rows = dc.fetchall()
+        self.assertEquals([row[0] for row in rows], [ 1, 2 ])
+        self.assertEquals(str(rows[0][2]), '2010-11-23 05:00:00')
+        self.assertEquals(rows[1][1], 'test2')
+        
+        dc.close()
+        
+    def testPlanTableChunks(self):
+        # chunking is off for less than two chunks and for tables with too few rows
+        self.assertEquals(pydbcopy.plan_table_chunks('tmp_hashed_pydbcopy_test', self.source_host, 1, 0), None)
+        self.assertEquals(pydbcopy.plan_table_chunks('tmp_hashed_pydbcopy_test', self.source_host, 2, 1000), None)
+        
+        chunks = pydbcopy.plan_table_chunks('tmp_hashed_pydbcopy_test', self.source_host, 2, 0)
+        self.assertEquals(len(chunks), 2)
+        self.assertEquals(chunks[0].key_range(), ('id', None, 2))
+        self.assertEquals(chunks[1].key_range(), ('id', 2, None))
+        
+        # never more chunks than there are keys
+        chunks = pydbcopy.plan_table_chunks('tmp_hashed_pydbcopy_test', self.source_host, 10, 0)
+        self.assertEquals(len(chunks), 3)
+        
+    def testCopyTableChunks(self):
+        dc = self.dest_host.conn.cursor()
+        dc.execute("SET AUTOCOMMIT=1")
+        dc.execute("create table if not exists tmp_hashed_pydbcopy_test ( id integer primary key, test_string varchar(50), fieldHash varchar(50) )")
+        
+        chunks = pydbcopy.plan_table_chunks('tmp_hashed_pydbcopy_test', self.source_host, 2, 0)
+        for chunk in chunks:
+            self.assertEquals(pydbcopy.copy_table_chunk(chunk).result, 0)
+        
+        dc.execute("select * from tmp_hashed_pydbcopy_test order by id")
+        rows = dc.fetchall()
+        
+        self.assertEquals(len(rows), 3)
+        self.assertEquals(rows[0][0], 1)
+        self.assertEquals(rows[1][0], 2)
+        self.assertEquals(rows[2][0], 3)
+        
+        dc.close()
+        
     def testPerformValidityCheck(self):
         c = self.dest_host.conn.cursor()
         c.execute("SET AUTOCOMMIT=1")
@@ -395,6 +500,17 @@ class PyDBCopyTest(unittest.TestCase):
         
         c.close()
     
+    def testVerifyTables(self):
+        # neither table is up to date on the target, both are left to be copied without being 
+        # verified again
+        try:
+            results = pydbcopy.verify_tables(['tmp_hashed_pydbcopy_test', 'tmp_pydbcopy_modified_test'])
+            self.assertEquals(results, {})
+            self.assertEquals(pydbcopy.verified_tables, set(['tmp_hashed_pydbcopy_test', 'tmp_pydbcopy_modified_test']))
+            self.assertEquals(pydbcopy.verify_table('tmp_hashed_pydbcopy_test', self.source_host, self.dest_host), None)
+        finally:
+            pydbcopy.verified_tables.clear()
+    
     def testSchemaCompare(self):
         c = self.dest_host.conn.cursor()
         c.execute("SET AUTOCOMMIT=1")
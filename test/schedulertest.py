@@ -0,0 +1,57 @@
+import unittest
+import tempfile
+import shutil
+import os
+import scheduler
+
+
+class SchedulerTest(unittest.TestCase):
+    """
+        Tests the ordering of tables for copying, these tests do not need a database.
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.history_file = os.path.join(self.dir, 'history.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testOrderBySize(self):
+        sizes = { 'small' : (10, 1), 'large' : (1000, 100), 'medium' : (100, 10) }
+        self.assertEquals(scheduler.order_longest_first(['small', 'medium', 'large'], sizes), 
+                          ['large', 'medium', 'small'])
+        
+    def testUnknownTablesKeepOrderAtTheEnd(self):
+        sizes = { 'large' : (1000, 100) }
+        self.assertEquals(scheduler.order_longest_first(['a', 'b', 'large', 'c'], sizes), 
+                          ['large', 'a', 'b', 'c'])
+        
+    def testHistoryOverridesSize(self):
+        # slow has few bytes but took longest last time, new is estimated from the throughput
+        # of the tables with a history (1000 bytes in 10 seconds)
+        sizes = { 'slow' : (10, 1), 'fast' : (990, 100), 'new' : (500, 50) }
+        history = { 'slow' : 9.0, 'fast' : 1.0 }
+        self.assertEquals(scheduler.estimate_durations(['slow', 'fast', 'new'], sizes, history)['new'], 5.0)
+        self.assertEquals(scheduler.order_longest_first(['fast', 'new', 'slow'], sizes, history), 
+                          ['slow', 'new', 'fast'])
+        
+    def testHistoryRoundTrip(self):
+        self.assertEquals(scheduler.load_history(self.history_file, 'host/db/'), {})
+        
+        scheduler.save_history(self.history_file, 'host/db/', { 'a' : 1.5, 'b' : 2.0 })
+        scheduler.save_history(self.history_file, 'other/db/', { 'a' : 7.0 })
+        scheduler.save_history(self.history_file, 'host/db/', { 'b' : 3.0 })
+        
+        self.assertEquals(scheduler.load_history(self.history_file, 'host/db/'), { 'a' : 1.5, 'b' : 3.0 })
+        self.assertEquals(scheduler.load_history(self.history_file, 'other/db/'), { 'a' : 7.0 })
+        
+    def testUnreadableHistoryIsIgnored(self):
+        f = open(self.history_file, 'w')
+        f.write('not json')
+        f.close()
+        self.assertEquals(scheduler.load_history(self.history_file, 'host/db/'), {})
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+import tempfile
+import shutil
+import time
+import os
+import spool
+
+
+class DumpSpoolTest(unittest.TestCase):
+    """
+        Tests the dump spool, these tests do not need a database.
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.spool = spool.DumpSpool(os.path.join(self.dir, 'dumps'), 1000000)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, content):
+        filename = os.path.join(self.dir, name)
+        f = open(filename, 'w')
+        f.write(content)
+        f.close()
+        return filename
+
+    def read(self, filename):
+        f = open(filename, 'r')
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    def testDumpKey(self):
+        key = spool.dump_key('db1', 'test', 't', 'CREATE TABLE t', { 'update_time' : '2011-01-01 00:00:00' })
+        self.assertEquals(key, spool.dump_key('db1', 'test', 't', 'CREATE TABLE t', { 'update_time' : '2011-01-01 00:00:00' }))
+        self.assertNotEquals(key, spool.dump_key('db2', 'test', 't', 'CREATE TABLE t', { 'update_time' : '2011-01-01 00:00:00' }))
+        self.assertNotEquals(key, spool.dump_key('db1', 'test', 't', 'CREATE TABLE t', { 'update_time' : '2011-01-01 00:00:01' }))
+
+    def testStoreAndFetch(self):
+        self.assertEquals(None, self.spool.fetch('a', self.dir))
+        filename = self.write('t.csv', '1,a\n2,b\n')
+        self.spool.store('a', filename, { 'table' : 't' })
+        self.assertTrue(os.path.exists(filename))
+
+        fetched = self.spool.fetch('a', self.dir)
+        self.assertNotEquals(filename, fetched)
+        self.assertEquals('1,a\n2,b\n', self.read(fetched))
+
+    def testCorruptDumpIsRemoved(self):
+        self.spool.store('a', self.write('t.csv', '1,a\n2,b\n'))
+        self.spool.store('b', self.write('u.csv', '3,c\n'))
+        shutil.copyfile(self.spool.dumps('b')[0], self.spool.dumps('a')[0])
+
+        self.assertEquals(None, self.spool.fetch('a', self.dir))
+        self.assertEquals([], self.spool.dumps('a'))
+        self.assertFalse(os.path.exists(self.spool.meta_path('a')))
+
+    def testStoreOverConcurrentFetch(self):
+        self.spool.store('a', self.write('t.csv', '1,a\n'))
+        shutil.copyfile(self.spool.meta_path('a'), os.path.join(self.dir, 'old.json'))
+        self.spool.store('a', self.write('t.csv', '1,b\n'))
+        self.assertEquals(1, len(self.spool.dumps('a')))
+        self.assertEquals('1,b\n', self.read(self.spool.fetch('a', self.dir)))
+
+        # a fetch that read the description of the previous dump misses, without removing the new one
+        shutil.copyfile(os.path.join(self.dir, 'old.json'), self.spool.meta_path('a'))
+        self.assertEquals(None, self.spool.fetch('a', self.dir))
+        self.assertEquals(1, len(self.spool.dumps('a')))
+
+    def testEvictsLeastRecentlyUsed(self):
+        for key in ('a', 'b', 'c'):
+            self.spool.store(key, self.write('t.csv', os.urandom(1000)))
+        now = time.time()
+        os.utime(self.spool.dumps('a')[0], (now - 30, now - 30))
+        os.utime(self.spool.dumps('b')[0], (now - 20, now - 20))
+        os.utime(self.spool.dumps('c')[0], (now - 10, now - 10))
+        os.remove(self.spool.fetch('a', self.dir))
+
+        self.spool.budget = os.path.getsize(self.spool.dumps('a')[0]) * 2
+        self.assertEquals(1, self.spool.evict())
+        self.assertEquals(1, len(self.spool.dumps('a')))
+        self.assertEquals([], self.spool.dumps('b'))
+        self.assertEquals(1, len(self.spool.dumps('c')))
+
+        self.spool.budget = 0
+        self.assertEquals(1, self.spool.evict('c'))
+        self.assertEquals(1, len(self.spool.dumps('c')))
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
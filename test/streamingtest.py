@@ -0,0 +1,35 @@
+import unittest
+import datetime
+import decimal
+import streaming
+
+
+class StreamingTest(unittest.TestCase):
+    """
+        Tests the encoding of rows for LOAD DATA INFILE, these tests do not need a database.
+    """
+
+    def testEscapeValue(self):
+        self.assertEquals(streaming.escape_value(None), '\\N')
+        self.assertEquals(streaming.escape_value(12), '12')
+        self.assertEquals(streaming.escape_value(12L), '12')
+        self.assertEquals(streaming.escape_value(1.5), '1.5')
+        self.assertEquals(streaming.escape_value(decimal.Decimal('1.50')), '1.50')
+        self.assertEquals(streaming.escape_value('a\tb\nc\\d\0'), 'a\\tb\\nc\\\\d\\0')
+        self.assertEquals(streaming.escape_value(u'caf\xe9'), 'caf\xc3\xa9')
+        self.assertEquals(streaming.escape_value(set(['b', 'a'])), 'a,b')
+        
+    def testEscapeDates(self):
+        self.assertEquals(streaming.escape_value(datetime.datetime(2010, 11, 23, 5, 0)), '2010-11-23 05:00:00')
+        self.assertEquals(streaming.escape_value(datetime.date(2010, 11, 23)), '2010-11-23')
+        self.assertEquals(streaming.escape_value(datetime.timedelta(hours=30, minutes=2, seconds=3)), '30:02:03')
+        self.assertEquals(streaming.escape_value(-datetime.timedelta(minutes=1)), '-00:01:00')
+        self.assertEquals(streaming.escape_value(datetime.timedelta(seconds=1, microseconds=5)), '00:00:01.000005')
+
+    def testEncodeRows(self):
+        self.assertEquals(streaming.encode_rows([(1, 'test', None), (2, 'te\tst', '234')]), 
+                          "1\ttest\t\\N\n2\tte\\tst\t234\n")
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+import tempfile
+import shutil
+import os
+import subprocess
+import transport
+
+
+class FakeTransport(transport.Transport):
+    """
+        Pretends to fetch files in the given number of seconds, or to fail.
+    """
+    def __init__(self, name, seconds, fails=False, failures=0):
+        transport.Transport.__init__(self)
+        self.name = name
+        self.seconds = seconds
+        self.fails = fails
+        self.failures = failures
+        self.fetched = 0
+
+    def fetch(self, host, remote_filename, local_filename):
+        if self.fails:
+            return False
+        if self.failures > 0:
+            self.failures -= 1
+            return False
+        self.fetched += 1
+        return True
+
+    def transfer(self, host, remote_filename, local_filename):
+        if not self.fetch(host, remote_filename, local_filename):
+            return False
+        self.stats.setdefault(host, transport.TransferStats()).record(1000, self.seconds)
+        return True
+
+
+class LocalStreamTransport(transport.StreamTransport):
+    """
+        Runs the remote commands of the stream transport on the local host instead of over ssh.
+    """
+    def ssh(self, host, command, **kwargs):
+        return subprocess.Popen(['sh', '-c', command], **kwargs)
+
+
+class TransportTest(unittest.TestCase):
+    """
+        Tests picking transports, these tests do not need a remote host.
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testPickFastest(self):
+        slow = FakeTransport('slow', 2.0)
+        fast = FakeTransport('fast', 1.0)
+        selector = transport.TransportSelector([slow, fast])
+        for i in range(4):
+            self.assertTrue(selector.transfer('source', 'file', 'file'))
+        self.assertEquals((slow.fetched, fast.fetched), (1, 3))
+
+    def testFallback(self):
+        broken = FakeTransport('broken', 1.0, fails=True)
+        working = FakeTransport('working', 2.0)
+        selector = transport.TransportSelector([broken, working], explore=False)
+        self.assertTrue(selector.transfer('source', 'file', 'file'))
+        self.assertTrue(selector.transfer('source', 'file', 'file'))
+        self.assertEquals(working.fetched, 2)
+        self.assertEquals([t.name for t in selector.candidates('source')], ['working'])
+
+    def testTransientFailure(self):
+        # a single failure is retried
+        flaky = FakeTransport('flaky', 1.0, failures=1)
+        working = FakeTransport('working', 2.0)
+        selector = transport.TransportSelector([flaky, working], explore=False)
+        self.assertTrue(selector.transfer('source', 'file', 'file'))
+        self.assertEquals((flaky.fetched, working.fetched), (1, 0))
+        self.assertEquals([t.name for t in selector.candidates('source')], ['flaky', 'working'])
+
+        # a transport failing twice is not used until retry_after has passed
+        flaky.failures = 2
+        self.assertTrue(selector.transfer('source', 'file', 'file'))
+        self.assertEquals((flaky.fetched, working.fetched), (1, 1))
+        self.assertEquals([t.name for t in selector.candidates('source')], ['working'])
+        selector.retry_after = 0
+        self.assertEquals([t.name for t in selector.candidates('source')], ['flaky', 'working'])
+
+    def testLastTransportIsKept(self):
+        flaky = FakeTransport('flaky', 1.0, failures=2)
+        selector = transport.TransportSelector([flaky], explore=False)
+        self.assertFalse(selector.transfer('source', 'file', 'file'))
+        self.assertTrue(selector.transfer('source', 'file', 'file'))
+        self.assertEquals(flaky.fetched, 1)
+
+    def testCreateSelector(self):
+        selector = transport.create_selector('stream', 'guest')
+        self.assertEquals([t.name for t in selector.transports], ['local', 'stream', 'ssh'])
+        self.assertEquals([t.name for t in selector.candidates('localhost')], ['local'])
+        self.assertEquals(len(transport.create_selector('auto', 'guest').transports), 3)
+
+    def testLocalTransport(self):
+        remote_filename = os.path.join(self.dir, 'remote.csv')
+        local_filename = os.path.join(self.dir, 'local.csv')
+        f = open(remote_filename, 'w')
+        f.write('1,test\n')
+        f.close()
+        self.assertTrue(transport.LocalTransport().transfer('localhost', remote_filename, local_filename))
+        self.assertFalse(os.path.exists(remote_filename))
+        self.assertEquals(os.path.getsize(local_filename), 7)
+
+    @unittest.skipIf(transport.find_executable('zstd') is None, "zstd is not installed")
+    def testStreamTransport(self):
+        remote_filename = os.path.join(self.dir, 'remote.csv')
+        local_filename = os.path.join(self.dir, 'local.csv')
+        f = open(remote_filename, 'w')
+        f.write(''.join('%d,test%d\n' % (i, i) for i in range(10000)))
+        f.close()
+        expected = open(remote_filename).read()
+        
+        self.assertTrue(LocalStreamTransport('guest', streams=3).transfer('source', remote_filename, local_filename))
+        self.assertFalse(os.path.exists(remote_filename))
+        self.assertEquals(open(local_filename).read(), expected)
+
+    def testSshOptions(self):
+        options = transport.SshTransport('guest').ssh_options()
+        self.assertTrue('ControlMaster=auto' in options)
+        self.assertFalse('-c' in options)
+        self.assertTrue('aes128-gcm@openssh.com' in transport.SshTransport('guest', cipher='aes128-gcm@openssh.com').ssh_options())
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import watermark
+
+
+class FakeHost(object):
+    """
+        Stands in for a MySQLHost with a table structure, a primary key and the values of its 
+        columns.
+    """
+    def __init__(self, structure, pk_columns, values):
+        self.host = 'fake'
+        self.structure = structure
+        self.pk_columns = pk_columns
+        self.values = values
+
+    def get_table_structure(self, table):
+        return self.structure
+
+    def get_primary_key_columns(self, table):
+        return self.pk_columns
+
+    def get_key_range(self, table, column):
+        values = self.values.get(column) or [None]
+        return (min(values), max(values))
+
+    def iter_key_batches(self, table, columns, batch_size=100000):
+        keys = sorted(zip(*[self.values[column] for column in columns]))
+        for i in range(0, len(keys), 2):
+            yield keys[i:i + 2]
+
+
+MODIFIED_STRUCTURE = "CREATE TABLE `t` (\n" \
+                     "  `id` int(11) NOT NULL,\n" \
+                     "  `lastModifiedDate` timestamp NOT NULL,\n" \
+                     "  PRIMARY KEY (`id`)\n" \
+                     ") ENGINE=InnoDB"
+
+AUTO_INCREMENT_STRUCTURE = "CREATE TABLE `t` (\n" \
+                           "  `id` int(11) NOT NULL AUTO_INCREMENT,\n" \
+                           "  `name` varchar(50) DEFAULT NULL,\n" \
+                           "  PRIMARY KEY (`id`)\n" \
+                           ") ENGINE=InnoDB"
+
+class WatermarkTest(unittest.TestCase):
+    """
+        Tests the watermark incremental copy helpers against fake hosts, these tests do not need
+        a database.
+    """
+
+    def testFindWatermarkLastModified(self):
+        source = FakeHost(MODIFIED_STRUCTURE, ['id'], {})
+        target = FakeHost(MODIFIED_STRUCTURE, ['id'], { 'lastModifiedDate' : [5, 7], 'id' : [1, 2] })
+        self.assertEquals(watermark.find_watermark('t', source, target), ('lastModifiedDate', 7))
+
+    def testFindWatermarkAutoIncrement(self):
+        source = FakeHost(AUTO_INCREMENT_STRUCTURE, ['id'], {})
+        target = FakeHost(AUTO_INCREMENT_STRUCTURE, ['id'], { 'id' : [1, 2] })
+        self.assertEquals(watermark.find_watermark('t', source, target), ('id', 3))
+
+    def testFindWatermarkNone(self):
+        structure = AUTO_INCREMENT_STRUCTURE.replace(' AUTO_INCREMENT', '')
+        source = FakeHost(structure, ['id'], {})
+        target = FakeHost(structure, ['id'], { 'id' : [1, 2] })
+        self.assertEquals(watermark.find_watermark('t', source, target), None)
+        
+        # an empty target has no watermark
+        source = FakeHost(MODIFIED_STRUCTURE, ['id'], {})
+        target = FakeHost(MODIFIED_STRUCTURE, ['id'], { 'lastModifiedDate' : [] })
+        self.assertEquals(watermark.find_watermark('t', source, target), None)
+
+    def testFindDeletedKeys(self):
+        self.assertEquals(watermark.find_deleted_keys([(1,), (3,), (5,)], [(1,), (2,), (3,), (4,), (6,)]), 
+                          [(2,), (4,), (6,)])
+        self.assertEquals(watermark.find_deleted_keys([], [(1,)]), [(1,)])
+        self.assertEquals(watermark.find_deleted_keys([(1,)], []), [])
+        self.assertEquals(watermark.find_deleted_keys([(1, 'a'), (2, 'b')], [(1, 'a'), (1, 'b'), (2, 'b')]), [(1, 'b')])
+
+    def testIterOrderedKeys(self):
+        host = FakeHost(MODIFIED_STRUCTURE, ['id'], { 'id' : [3, 1, 2] })
+        self.assertEquals(list(watermark.iter_ordered_keys(host, 't', ['id'])), [(1,), (2,), (3,)])
+        
+        host = FakeHost(MODIFIED_STRUCTURE, ['id'], { 'id' : [1, 1] })
+        self.assertRaises(watermark.KeyOrderError, list, watermark.iter_ordered_keys(host, 't', ['id']))
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,324 @@
+"""
+  Transfer of the dump files written by select into outfile on the source to the same path on the
+  target host. Several transports are available:
+
+    local -- the source is the local host, the file is already in place
+    ssh -- scp over a multiplexed ssh connection (ControlMaster) kept open across files, so only
+           the first file to a host pays for the ssh handshake
+    stream -- the file is split into byte ranges streamed over parallel channels of the same ssh
+              connection, each compressed with zstd or lz4 on the source
+
+  Each transport measures the bytes and seconds of its transfers so the fastest one for a host can
+  be picked (see TransportSelector).
+"""
+import os
+import pipes
+import tempfile
+import threading
+import subprocess
+import time
+import multiprocessing
+from distutils.spawn import find_executable
+
+logger = multiprocessing.get_logger()
+
+# the compressors the stream transport can use, with their compress and decompress arguments
+compressors = { 'zstd' : (['zstd', '-1', '-q', '-c'], ['zstd', '-d', '-q', '-c']),
+                'lz4' : (['lz4', '-1', '-q', '-c'], ['lz4', '-d', '-q', '-c']) }
+
+transfer_methods = ('auto', 'local', 'ssh', 'stream')
+
+class TransferStats(object):
+    """
+        The bytes and seconds of the transfers of a transport to a host.
+    """
+    def __init__(self):
+        self.transfers = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def record(self, bytes, seconds):
+        self.transfers += 1
+        self.bytes += bytes
+        self.seconds += seconds
+
+    def rate(self):
+        """
+            returns -- the bytes per second of the transfers, None if there were none
+        """
+        if self.transfers == 0:
+            return None
+        return self.bytes / self.seconds if self.seconds > 0 else float('inf')
+
+class Transport(object):
+    """
+        Base class of the transports. Subclasses define fetch(host, remote_filename, 
+        local_filename), which fetches a file from the host, removes it there and returns True if
+        the file was fetched.
+    """
+    name = None
+
+    def __init__(self):
+        self.stats = dict()
+
+    def usable(self, host):
+        """
+            returns -- True if the transport can fetch files from the host
+        """
+        return True
+
+    def transfer(self, host, remote_filename, local_filename):
+        """
+            Fetches a file (see fetch) and records its size and the time it took.
+
+            returns -- True if the file was fetched
+        """
+        start = time.time()
+        if not self.fetch(host, remote_filename, local_filename):
+            return False
+        elapsed = time.time() - start
+        bytes = os.path.getsize(local_filename)
+        self.stats.setdefault(host, TransferStats()).record(bytes, elapsed)
+        logger.debug("Transferred %d bytes from %s with %s in %.1f seconds (%.0f Kb/s)" % \
+                     (bytes, host, self.name, elapsed, bytes / elapsed / 1024 if elapsed > 0 else 0))
+        return True
+
+    def rate(self, host):
+        """
+            returns -- the measured bytes per second of the transport from the host, None if unknown
+        """
+        return self.stats[host].rate() if host in self.stats else None
+
+class LocalTransport(Transport):
+    """
+        The source shares the file system of the target, the file only has to be moved if its
+        local path differs.
+    """
+    name = 'local'
+
+    def usable(self, host):
+        return host == 'localhost'
+
+    def fetch(self, host, remote_filename, local_filename):
+        if remote_filename != local_filename:
+            os.rename(remote_filename, local_filename)
+        return True
+
+class SshTransport(Transport):
+    """
+        Copies files with scp over a multiplexed ssh connection per host, which stays open for
+        control_persist seconds after its last use. The remote file is removed over the same
+        connection.
+    """
+    name = 'ssh'
+
+    def __init__(self, user, cipher=None, control_dir=None, control_persist=60, quiet=True):
+        Transport.__init__(self)
+        self.user = user
+        self.cipher = cipher
+        self.control_path = os.path.join(control_dir or tempfile.gettempdir(), 'pydbcopy-ssh-%r@%h:%p')
+        self.control_persist = control_persist
+        self.quiet = quiet
+
+    def usable(self, host):
+        return host != 'localhost'
+
+    def ssh_options(self):
+        """
+            returns -- the options shared by ssh and scp
+        """
+        options = ['-o', 'BatchMode=yes', '-o', 'ControlMaster=auto', '-o', 'ControlPath=%s' % self.control_path, \
+                   '-o', 'ControlPersist=%d' % self.control_persist]
+        if self.cipher:
+            options += ['-c', self.cipher]
+        if self.quiet:
+            options += ['-q']
+        return options
+
+    def ssh(self, host, command, **kwargs):
+        """
+            Runs a command on the host over the multiplexed connection.
+
+            returns -- the subprocess.Popen of the local ssh process
+        """
+        return subprocess.Popen(['ssh'] + self.ssh_options() + ['%s@%s' % (self.user, host), command], **kwargs)
+
+    def fetch(self, host, remote_filename, local_filename):
+        exit_status = subprocess.call(['scp'] + self.ssh_options() + \
+                                      ['%s@%s:%s' % (self.user, host, remote_filename), local_filename])
+        if exit_status != 0:
+            logger.debug("Error retrieving remote file with scp, check ssh config!")
+            return False
+        self.remove(host, remote_filename)
+        return True
+
+    def remove(self, host, remote_filename):
+        """
+            Removes a file on the host, a failure is only logged.
+        """
+        logger.debug("Removing remote file %s from %s" % (remote_filename, host))
+        if self.ssh(host, 'rm -f %s' % pipes.quote(remote_filename)).wait() != 0:
+            logger.warn("Error removing remote dump file %s, check remote permissions for %s on %s!" % \
+                        (remote_filename, self.user, host))
+
+class StreamTransport(SshTransport):
+    """
+        Splits a file into as many byte ranges as streams, each read with dd on the host,
+        compressed there and decompressed locally by its own thread into its place in the local
+        file. All the streams run over the multiplexed ssh connection (see SshTransport).
+    """
+    name = 'stream'
+
+    def __init__(self, user, streams=4, compression='zstd', **kwargs):
+        SshTransport.__init__(self, user, **kwargs)
+        self.streams = streams
+        self.compression = compression
+
+    def usable(self, host):
+        return SshTransport.usable(self, host) and self.compression in compressors and \
+               find_executable(compressors[self.compression][1][0]) is not None
+
+    def fetch(self, host, remote_filename, local_filename):
+        size_process = self.ssh(host, 'stat -c %%s %s' % pipes.quote(remote_filename), stdout=subprocess.PIPE)
+        size = size_process.communicate()[0].strip()
+        if size_process.returncode != 0 or not size.isdigit():
+            logger.debug("Error getting the size of remote file %s" % remote_filename)
+            return False
+        size = int(size)
+
+        f = open(local_filename, 'wb')
+        f.truncate(size)
+        f.close()
+
+        range_size = max(1, -(-size // self.streams))
+        ranges = [(offset, min(range_size, size - offset)) for offset in range(0, size, range_size)]
+        errors = []
+        threads = [threading.Thread(target=self.fetch_range, args=(host, remote_filename, local_filename, offset, length, errors)) \
+                   for offset, length in ranges]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            logger.debug("Error streaming remote file %s: %s" % (remote_filename, errors[0]))
+            os.remove(local_filename)
+            return False
+
+        self.remove(host, remote_filename)
+        return True
+
+    def fetch_range(self, host, remote_filename, local_filename, offset, length, errors):
+        """
+            Streams a byte range of a remote file into its place in the local file. Errors are
+            appended to errors.
+        """
+        compress, decompress = compressors[self.compression]
+        command = "dd if=%s bs=1M iflag=skip_bytes,count_bytes skip=%d count=%d 2>/dev/null | %s" % \
+                  (pipes.quote(remote_filename), offset, length, ' '.join(compress))
+        try:
+            ssh_process = self.ssh(host, command, stdout=subprocess.PIPE)
+            decompress_process = subprocess.Popen(decompress, stdin=ssh_process.stdout, stdout=subprocess.PIPE)
+            ssh_process.stdout.close()
+
+            written = 0
+            f = open(local_filename, 'r+b')
+            try:
+                f.seek(offset)
+                block = decompress_process.stdout.read(1048576)
+                while block:
+                    f.write(block)
+                    written += len(block)
+                    block = decompress_process.stdout.read(1048576)
+            finally:
+                f.close()
+
+            if decompress_process.wait() != 0 or ssh_process.wait() != 0 or written != length:
+                errors.append("range %d+%d: %d bytes written" % (offset, length, written))
+        except Exception, e:
+            errors.append(e)
+
+class TransportSelector(object):
+    """
+        Picks the transport for each file. When exploring, a transport not yet measured for the
+        host is tried first, after which the one with the highest measured rate is used; otherwise
+        the transports are tried in the order given. A transport is tried twice before it counts
+        as failed, the file is then fetched with the next one. A failed transport is not used for
+        the host until retry_after seconds have passed, unless no other transport is left.
+    """
+    def __init__(self, transports, explore=True, retry_after=300):
+        self.transports = transports
+        self.explore = explore
+        self.retry_after = retry_after
+        # (transport name, host) to the time the transport failed
+        self.failed = dict()
+
+    def has_failed(self, transport, host):
+        """
+            returns -- True if the transport failed for the host less than retry_after seconds ago
+        """
+        failed_at = self.failed.get((transport.name, host))
+        if failed_at is None:
+            return False
+        if time.time() - failed_at >= self.retry_after:
+            del self.failed[(transport.name, host)]
+            return False
+        return True
+
+    def candidates(self, host):
+        """
+            returns -- the transports usable for the host, in the order to try them
+        """
+        usable = [transport for transport in self.transports if transport.usable(host)]
+        # the failed transports are left out, but not all of them: a failure may be transient
+        usable = [transport for transport in usable if not self.has_failed(transport, host)] or usable
+        if not self.explore:
+            return usable
+        untried = [transport for transport in usable if transport.rate(host) is None]
+        tried = sorted([transport for transport in usable if transport.rate(host) is not None], \
+                       key=lambda transport: transport.rate(host), reverse=True)
+        return untried + tried
+
+    def transfer(self, host, remote_filename, local_filename):
+        """
+            Fetches a file from the host with the best transport (see candidates).
+
+            returns -- True if the file was fetched
+        """
+        for transport in self.candidates(host):
+            for attempt in range(2):
+                try:
+                    if transport.transfer(host, remote_filename, local_filename):
+                        self.failed.pop((transport.name, host), None)
+                        return True
+                except Exception:
+                    logger.debug("Error transferring %s with %s" % (remote_filename, transport.name), exc_info=1)
+            logger.warn("Transfer of %s from %s with %s failed twice, not using %s for %s for %d seconds" % \
+                        (remote_filename, host, transport.name, transport.name, host, self.retry_after))
+            self.failed[(transport.name, host)] = time.time()
+        return False
+
+def create_selector(method, user, streams=4, compression='zstd', cipher=None, quiet=True):
+    """
+        Creates the TransportSelector for a transfer method.
+
+        Keyword arguments:
+            method -- one of transfer_methods, auto picks among all transports
+            user -- the user to ssh to the source as
+            streams -- the number of parallel streams of the stream transport (defaults to 4)
+            compression -- the compressor of the stream transport, zstd or lz4 (defaults to zstd)
+            cipher -- the ssh cipher to use (defaults to None, the ssh default)
+            quiet -- keep ssh and scp quiet (defaults to True)
+
+        returns -- a TransportSelector
+    """
+    transports = [LocalTransport(), \
+                  SshTransport(user, cipher=cipher, quiet=quiet), \
+                  StreamTransport(user, streams, compression, cipher=cipher, quiet=quiet)]
+    if method == 'auto':
+        return TransportSelector(transports)
+    
+    # the file is already in place when the source is local whatever the method, and a failed 
+    # stream falls back to scp
+    fallbacks = { 'local' : ['local'], 'ssh' : ['local', 'ssh'], 'stream' : ['local', 'stream', 'ssh'] }[method]
+    return TransportSelector(sorted([transport for transport in transports if transport.name in fallbacks], \
+                                    key=lambda transport: fallbacks.index(transport.name)), explore=False)
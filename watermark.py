@@ -0,0 +1,127 @@
+"""
+  Watermark incremental copies for tables without a fieldHash column: only the rows above the
+  target's current watermark (its max lastModifiedDate, or its max auto increment primary key
+  for append only tables) are copied and upserted, deleted rows are caught by reconciling the
+  primary keys of both tables.
+"""
+import re
+import multiprocessing
+
+logger = multiprocessing.get_logger()
+
+class KeyOrderError(Exception):
+    """
+        Raised when a stream of primary keys is not in the order expected by find_deleted_keys.
+    """
+    pass
+
+def find_watermark(table, source_host, dest_host):
+    """
+        Finds the column and lower bound of the rows to copy for a watermark incremental copy.
+        A lastModifiedDate column is preferred: every row modified at or after the target's
+        max lastModifiedDate is copied (rows modified in the same second as the last copy may not
+        all have been copied yet). Otherwise a single column auto increment primary key is used
+        and every row above the target's max key is copied, which only catches inserts.
+
+        Keyword arguments:
+            table -- String name of the table
+            source_host -- MySQLHost source host
+            dest_host -- MySQLHost destination host
+
+        returns -- a (column, lower bound) tuple, or None if the table has no usable watermark or
+                   the target table is empty
+    """
+    structure = source_host.get_table_structure(table)
+    if re.search(r'^\s*`lastModifiedDate`', structure, re.I | re.M) is not None:
+        lower = dest_host.get_key_range(table, 'lastModifiedDate')[1]
+        if lower is not None:
+            return ('lastModifiedDate', lower)
+        return None
+
+    pk_columns = source_host.get_primary_key_columns(table)
+    if len(pk_columns) == 1 and \
+       re.search(r'^\s*`%s` .*AUTO_INCREMENT' % re.escape(pk_columns[0]), structure, re.I | re.M) is not None:
+        upper = dest_host.get_key_range(table, pk_columns[0])[1]
+        if upper is not None:
+            return (pk_columns[0], upper + 1)
+    return None
+
+def iter_ordered_keys(host, table, columns):
+    """
+        Reads the primary keys of a table in increasing order.
+
+        Keyword arguments:
+            host -- MySQLHost to read the keys from
+            table -- String name of the table
+            columns -- list of the primary key columns
+
+        returns -- a generator of key tuples, raises KeyOrderError if the server's order of the
+                   keys (a collation for instance) differs from python's
+    """
+    previous = None
+    batches = host.iter_key_batches(table, columns)
+    try:
+        for batch in batches:
+            for key in batch:
+                if previous is not None and key <= previous:
+                    raise KeyOrderError("Primary key of %s on %s is not in python order: %s after %s" % \
+                                        (table, host.host, key, previous))
+                previous = key
+                yield key
+    finally:
+        batches.close()
+
+def find_deleted_keys(source_keys, target_keys):
+    """
+        Walks two ordered streams of primary keys in lockstep, collecting the keys only found in
+        the target.
+
+        Keyword arguments:
+            source_keys -- an iterable of the source keys in increasing order
+            target_keys -- an iterable of the target keys in increasing order
+
+        returns -- a list of the keys to delete from the target
+    """
+    deleted_keys = []
+    source_keys = iter(source_keys)
+    source_key = next(source_keys, None)
+    for target_key in target_keys:
+        while source_key is not None and source_key < target_key:
+            source_key = next(source_keys, None)
+        if source_key != target_key:
+            deleted_keys.append(target_key)
+    return deleted_keys
+
+def reconcile_deletes(table, source_host, dest_host):
+    """
+        Deletes the rows of the target table whose primary key is no longer found in the source
+        table. Only the primary keys of both tables are read, through unbuffered cursors.
+
+        Keyword arguments:
+            table -- String name of the table
+            source_host -- MySQLHost source host
+            dest_host -- MySQLHost destination host
+
+        returns -- the number of rows deleted, or None if the table has no primary key or its keys
+                   can not be compared
+    """
+    columns = source_host.get_primary_key_columns(table)
+    if len(columns) == 0:
+        return None
+
+    source_keys = iter_ordered_keys(source_host, table, columns)
+    target_keys = iter_ordered_keys(dest_host, table, columns)
+    try:
+        deleted_keys = find_deleted_keys(source_keys, target_keys)
+    except KeyOrderError, e:
+        logger.warn("Can not reconcile %s: %s" % (table, e))
+        return None
+    finally:
+        source_keys.close()
+        target_keys.close()
+
+    deleted = 0
+    if len(deleted_keys) > 0:
+        deleted = dest_host.delete_keys(table, columns, deleted_keys)
+    logger.info("Reconciled %s: deleted %d rows no longer on the source" % (table, deleted))
+    return deleted